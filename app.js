@@ -28,22 +28,210 @@ async function apiFetch(path, opts = {}) {
   return json
 }
 
-function renderUsers(items) {
+let usersCursor = null
+
+function userFilters() {
+  const params = new URLSearchParams()
+  const minBalance = $('minBalance').value.trim()
+  const maxBalance = $('maxBalance').value.trim()
+  if (minBalance) params.set('min_balance', minBalance)
+  if (maxBalance) params.set('max_balance', maxBalance)
+  if ($('onlyBanned').checked) params.set('banned', 'true')
+  if ($('onlyRemanga').checked) params.set('has_remanga', 'true')
+  return params
+}
+
+async function loadUsersPage(append) {
+  const params = userFilters()
+  params.set('limit', '100')
+  if (append && usersCursor) params.set('cursor', usersCursor)
+
+  const data = await apiFetch(`/api/users?${params}`)
+  usersCursor = data.next_cursor || null
+  $('moreUsers').hidden = !usersCursor
+  renderUsers(data.items || [], append)
+}
+
+function renderUsers(items, append = false) {
   const root = $('users')
-  root.innerHTML = ''
+  if (!append) root.innerHTML = ''
 
   for (const u of items) {
     const el = document.createElement('div')
     el.className = 'user'
+    el.dataset.uid = u.discord_user_id
     el.innerHTML = `
       <div class="id">${u.discord_user_id}</div>
-      <div class="meta">Баланс: ${u.balance}</div>
+      <div class="meta">Баланс: <span class="balance">${u.balance}</span></div>
       <div class="meta">Remanga: ${u.remanga_profile_url || '—'}</div>
     `
     root.appendChild(el)
   }
 }
 
+const LIVE_MAX = 200
+let liveSource = null
+// Id of the last event shown; a new stream resumes after it.
+let liveLastId = ''
+
+function liveText(kind, data) {
+  const who = data.discord_user_id ?? 'панель'
+  if (kind === 'economy') {
+    const amount = data.amount === null ? '' : ` ${data.amount > 0 ? '+' : ''}${data.amount}`
+    return `${who}: ${data.action}${amount}`
+  }
+  if (kind === 'balance') return `${who}: баланс = ${data.balance}`
+  if (kind === 'ban') {
+    if (!data.banned_until_ts) return `${who}: разбан`
+    return `${who}: бан до ${data.banned_until}${data.reason ? ` (${data.reason})` : ''}`
+  }
+  if (kind === 'gap') return 'часть событий пропущена — обнови данные'
+  return `${who}: ${kind}`
+}
+
+function addLiveItem(kind, data) {
+  const root = $('liveFeed')
+  const el = document.createElement('div')
+  el.className = `liveItem ${kind}`
+  const time = new Date((data.created_ts || Date.now() / 1000) * 1000).toLocaleTimeString()
+  // textContent: reasons and log meta come from users.
+  el.textContent = `${time}  ${liveText(kind, data)}`
+  root.prepend(el)
+  while (root.childElementCount > LIVE_MAX) root.lastElementChild.remove()
+
+  // Keep the loaded user cards current instead of re-querying the list.
+  // Bot commands arrive as 'economy' rows carrying the delta; panel writes
+  // as 'balance' rows carrying the new value (they come after their log rows).
+  const balance = document.querySelector(`.user[data-uid="${data.discord_user_id}"] .balance`)
+  if (!balance) return
+  if (kind === 'balance') {
+    balance.textContent = data.balance
+  } else if (kind === 'economy' && typeof data.amount === 'number') {
+    balance.textContent = Number(balance.textContent) + data.amount
+  }
+}
+
+async function startLive() {
+  stopLive()
+  // EventSource can't send headers, and the key must not go in a URL (it
+  // ends up in access logs); a short-lived token is used instead.
+  let token
+  try {
+    token = (await apiFetch('/api/live/token', { method: 'POST' })).token
+  } catch (e) {
+    $('liveStatus').textContent = 'ошибка подключения'
+    return
+  }
+  const params = new URLSearchParams({ token })
+  if (liveLastId) params.set('after', liveLastId)
+  const source = new EventSource(`/api/live?${params}`)
+  source.onopen = () => { $('liveStatus').textContent = 'подключено' }
+  source.onerror = () => {
+    if (source.readyState !== EventSource.CLOSED) {
+      $('liveStatus').textContent = 'переподключение…'
+      return
+    }
+    // The server refused the browser's own reconnect: the token has expired.
+    $('liveStatus').textContent = 'переподключение…'
+    setTimeout(() => { if (liveSource === source) startLive() }, 3000)
+  }
+  const track = (e) => { if (e.lastEventId) liveLastId = e.lastEventId }
+  for (const kind of ['economy', 'balance', 'ban']) {
+    source.addEventListener(kind, (e) => { track(e); addLiveItem(kind, JSON.parse(e.data)) })
+  }
+  source.addEventListener('hello', track)
+  source.addEventListener('gap', () => addLiveItem('gap', {}))
+  liveSource = source
+}
+
+function stopLive() {
+  if (liveSource) liveSource.close()
+  liveSource = null
+  $('liveStatus').textContent = 'отключено'
+}
+
+const CHART_COLORS = ['#7c5cff', '#ff4d6d', '#35d0a5', '#ffb84d', '#4dc3ff', '#e9ecf5']
+
+// Lines over a shared time axis. series: [{ name, points: [[ts, value], ...] }]
+function drawChart(svg, series) {
+  const w = 400
+  const h = 140
+  const pad = 4
+  const all = series.flatMap((s) => s.points)
+  if (!all.length) {
+    svg.innerHTML = `<text x="${w / 2}" y="${h / 2}" text-anchor="middle" class="empty">нет данных</text>`
+    return
+  }
+  const xs = all.map((p) => p[0])
+  const ys = all.map((p) => p[1]).concat([0])
+  const [x0, x1] = [Math.min(...xs), Math.max(...xs)]
+  const [y0, y1] = [Math.min(...ys), Math.max(...ys)]
+  const sx = (x) => pad + (x1 === x0 ? 0.5 : (x - x0) / (x1 - x0)) * (w - 2 * pad)
+  const sy = (y) => h - pad - (y1 === y0 ? 0.5 : (y - y0) / (y1 - y0)) * (h - 2 * pad)
+
+  let out = `<line x1="0" x2="${w}" y1="${sy(0)}" y2="${sy(0)}" class="axis" />`
+  series.forEach((s, i) => {
+    const d = s.points.map((p) => `${sx(p[0]).toFixed(1)},${sy(p[1]).toFixed(1)}`).join(' ')
+    out += `<polyline points="${d}" fill="none" stroke="${CHART_COLORS[i % CHART_COLORS.length]}" stroke-width="2" vector-effect="non-scaling-stroke"><title>${s.name}</title></polyline>`
+  })
+  svg.innerHTML = out
+}
+
+function renderStatsSummary(summary) {
+  const rows = Object.entries(summary.actions).map(([action, a]) =>
+    `<tr><td>${action}</td><td>${a.n}</td><td>${a.total}</td><td>${a.volume}</td></tr>`).join('')
+  const edge = summary.coinflip_edge === null ? '—' : `${(summary.coinflip_edge * 100).toFixed(2)}%`
+  $('statsSummary').innerHTML = `
+    <div class="meta">Монет у игроков: <b>${summary.supply}</b> (${summary.holders} игроков) ·
+      преимущество казино: <b>${edge}</b></div>
+    <table>
+      <tr><th>Действие</th><th>Событий</th><th>Итог</th><th>Оборот</th></tr>
+      ${rows || '<tr><td colspan="4">нет событий</td></tr>'}
+    </table>`
+}
+
+async function loadStats() {
+  const [hours, bucket] = $('statsPeriod').value.split(':')
+  const [summary, data] = await Promise.all([
+    apiFetch(`/api/stats/summary?hours=${hours}`),
+    apiFetch(`/api/stats/series?bucket=${bucket}&hours=${hours}`),
+  ])
+  renderStatsSummary(summary)
+
+  drawChart($('supplyChart'), [{ name: 'монет', points: data.supply.map((p) => [p.bucket_ts, p.supply]) }])
+
+  const byAction = {}
+  for (const p of data.points) (byAction[p.action] ||= []).push([p.bucket_ts, p.volume])
+  drawChart($('volumeChart'), Object.entries(byAction).map(([name, points]) => ({ name, points })))
+
+  const edge = data.points.filter((p) => p.action === 'coinflip' && p.edge !== null)
+  drawChart($('edgeChart'), [{ name: 'edge', points: edge.map((p) => [p.bucket_ts, p.edge]) }])
+}
+
+async function bulkAction(op) {
+  $('bulkOut').textContent = '...'
+  const params = new URLSearchParams()
+  const days = $('bulkDays').value.trim()
+  const delta = $('bulkDelta').value.trim()
+  const reason = $('bulkReason').value.trim()
+  if (op === 'ban' && days) params.set('days', days)
+  if (op === 'adjust' && delta) params.set('delta', delta)
+  if (reason) params.set('reason', reason)
+
+  try {
+    const data = await apiFetch(`/api/users/bulk/${op}?${params}`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'text/csv' },
+      body: $('bulkIds').value,
+    })
+    const failed = (data.results || []).filter((r) => !r.ok)
+    $('bulkOut').textContent = `Готово: ${data.results.length - failed.length}, ошибок: ${failed.length}\n` +
+      JSON.stringify(failed.length ? failed : data.results, null, 2)
+  } catch (e) {
+    $('bulkOut').textContent = String(e)
+  }
+}
+
 window.addEventListener('DOMContentLoaded', () => {
   $('apiKey').value = getKey()
 
@@ -51,6 +239,9 @@ window.addEventListener('DOMContentLoaded', () => {
     setKey($('apiKey').value.trim())
   })
 
+  $('liveStart').addEventListener('click', () => { liveLastId = ''; startLive() })
+  $('liveStop').addEventListener('click', stopLive)
+
   $('healthBtn').addEventListener('click', async () => {
     $('healthOut').textContent = '...'
     try {
@@ -61,11 +252,45 @@ window.addEventListener('DOMContentLoaded', () => {
     }
   })
 
+  $('loadStats').addEventListener('click', async () => {
+    $('statsSummary').textContent = '...'
+    try {
+      await loadStats()
+    } catch (e) {
+      $('statsSummary').textContent = String(e)
+    }
+  })
+
   $('loadUsers').addEventListener('click', async () => {
     $('users').textContent = '...'
+    usersCursor = null
+    try {
+      await loadUsersPage(false)
+    } catch (e) {
+      $('users').textContent = String(e)
+    }
+  })
+
+  $('moreUsers').addEventListener('click', async () => {
     try {
-      const data = await apiFetch('/api/users?limit=100')
-      renderUsers(data.items || [])
+      await loadUsersPage(true)
+    } catch (e) {
+      $('users').textContent = String(e)
+    }
+  })
+
+  $('exportUsers').addEventListener('click', async () => {
+    const params = userFilters()
+    params.set('format', 'csv')
+    try {
+      const res = await fetch(`/api/users/export?${params}`, { headers: { 'X-API-Key': getKey() } })
+      if (!res.ok) throw new Error(`HTTP ${res.status}`)
+      const url = URL.createObjectURL(await res.blob())
+      const a = document.createElement('a')
+      a.href = url
+      a.download = 'users.csv'
+      a.click()
+      URL.revokeObjectURL(url)
     } catch (e) {
       $('users').textContent = String(e)
     }
@@ -88,6 +313,10 @@ window.addEventListener('DOMContentLoaded', () => {
     }
   })
 
+  $('bulkBan').addEventListener('click', () => bulkAction('ban'))
+  $('bulkUnban').addEventListener('click', () => bulkAction('unban'))
+  $('bulkAdjust').addEventListener('click', () => bulkAction('adjust'))
+
   $('unbanBtn').addEventListener('click', async () => {
     $('banOut').textContent = '...'
     try {
@@ -0,0 +1,429 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+from urllib.parse import urlencode
+
+# Allow running as a file: `python bot/bench.py`.
+# (Preferred is `python -m bot.bench` from project root.)
+if __package__ is None or __package__ == "":
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot import db as dbmod
+from bot import economy as economy_mod
+from bot import games as games_mod
+from bot.ledger import BalanceLedger
+
+
+# Synthetic users get ids from here up, so they never collide with real snowflakes' low range.
+FIRST_USER_ID = 10**15
+
+Op = Callable[[int], Awaitable[Any]]
+
+
+def _seed(path: Path, users: int, log_rows: int, seed: int) -> None:
+    rng = random.Random(seed)
+    now = int(time.time())
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("BEGIN")
+        chunk = 50_000
+        for start in range(0, users, chunk):
+            ids = range(FIRST_USER_ID + start, FIRST_USER_ID + min(users, start + chunk))
+            conn.executemany(
+                "INSERT INTO users(discord_user_id, remanga_profile_url, created_ts) VALUES (?, ?, ?)",
+                [
+                    (uid, f"https://remanga.org/user/{uid - FIRST_USER_ID}" if rng.random() < 0.1 else None, now - rng.randrange(365 * 86400))
+                    for uid in ids
+                ],
+            )
+            conn.executemany(
+                "INSERT INTO balances(discord_user_id, balance) VALUES (?, ?)",
+                [(uid, int(rng.paretovariate(1.2) * 100)) for uid in ids],
+            )
+            banned = [uid for uid in ids if rng.random() < 0.01]
+            conn.executemany(
+                "INSERT INTO game_bans(discord_user_id, banned_until, banned_until_ts, reason) VALUES (?, ?, ?, 'bench')",
+                [(uid, "2100-01-01 00:00:00", 4102444800) for uid in banned],
+            )
+        # Log history spread over the last 30 days, ids in time order like the real table.
+        stamps = sorted(now - rng.randrange(30 * 86400) for _ in range(log_rows))
+        actions = ("daily", "coinflip", "coinflip", "give")
+        for start in range(0, log_rows, chunk):
+            rows = []
+            for ts in stamps[start : start + chunk]:
+                action = rng.choice(actions)
+                amount = 100 if action == "daily" else rng.choice((-1, 1)) * rng.randint(1, 50)
+                rows.append((FIRST_USER_ID + rng.randrange(users), action, amount, ts))
+            conn.executemany("INSERT INTO economy_logs(discord_user_id, action, amount, created_ts) VALUES (?, ?, ?, ?)", rows)
+        conn.execute("INSERT INTO db_meta(key, value) VALUES ('bench', ?)", (f"{users}:{log_rows}:{seed}",))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+async def prepare_db(path: Path, *, users: int, log_rows: int, seed: int) -> None:
+    """Create (or reuse, if built with the same parameters) a synthetic database."""
+    tag = f"{users}:{log_rows}:{seed}"
+    if path.exists():
+        db = dbmod.Db(path)
+        await db.init()
+        conn = await db.connect()
+        try:
+            current = await dbmod.get_meta(conn, "bench")
+        finally:
+            await conn.close()
+        if current == tag:
+            return
+        _remove_db(path)
+    await dbmod.Db(path).init()
+    started = time.perf_counter()
+    await asyncio.to_thread(_seed, path, users, log_rows, seed)
+    print(f"seeded {users} users / {log_rows} log rows in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+
+
+def _copy_db(src: Path, dst: Path) -> None:
+    # Backup API rather than a file copy: also picks up anything still in the WAL.
+    _remove_db(dst)
+    with sqlite3.connect(src) as source, sqlite3.connect(dst) as target:
+        source.backup(target)
+    source.close()
+    target.close()
+
+
+def _archive_dir(path: Path) -> str:
+    # economy_logs archived by the panel's retention pass (see Panel.open).
+    return f"{path}.archive"
+
+
+def _remove_db(path: Path) -> None:
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+@dataclass
+class Result:
+    ops: int
+    errors: int
+    seconds: float
+    latencies: list[float] = field(repr=False)
+
+    def report(self) -> dict[str, Any]:
+        lat = sorted(self.latencies)
+        ms = lambda v: round(v * 1000, 3)  # noqa: E731
+        return {
+            "ops": self.ops,
+            "errors": self.errors,
+            "seconds": round(self.seconds, 3),
+            "ops_per_sec": round(self.ops / self.seconds, 1) if self.seconds else None,
+            "p50_ms": ms(_percentile(lat, 0.50)),
+            "p90_ms": ms(_percentile(lat, 0.90)),
+            "p99_ms": ms(_percentile(lat, 0.99)),
+            "max_ms": ms(lat[-1]) if lat else 0.0,
+        }
+
+
+async def drive(op: Op, *, ops: int, concurrency: int) -> Result:
+    """Run `op(i)` for i in range(ops) from `concurrency` simulated users."""
+    latencies: list[float] = []
+    errors = 0
+    next_i = 0
+
+    async def worker() -> None:
+        nonlocal next_i, errors
+        while next_i < ops:
+            i = next_i
+            next_i += 1
+            started = time.perf_counter()
+            try:
+                await op(i)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return Result(ops, errors, time.perf_counter() - started, latencies)
+
+
+class Bot:
+    """The bot's economy path (Db pool + ledger) without a Discord connection."""
+
+    def __init__(self, path: Path, users: int, rng: random.Random):
+        self.db = dbmod.Db(path, readers=4)
+        self.ledger = BalanceLedger(self.db)
+        self.users = users
+        self.rng = rng
+        # /daily: every op claims for a different user, so it is a real payout.
+        self.daily_order = rng.sample(range(users), users)
+
+    def user(self) -> int:
+        return FIRST_USER_ID + self.rng.randrange(self.users)
+
+    async def open(self) -> None:
+        await self.db.open()
+        # Cooldowns from an earlier run on the same file would turn payouts into rejections.
+        async with self.db.write() as conn:
+            await conn.execute("DELETE FROM cooldowns WHERE discord_user_id >= ?", (FIRST_USER_ID,))
+
+    async def close(self) -> None:
+        await self.ledger.close()
+        await self.db.close()
+
+    async def daily(self, i: int) -> None:
+        uid = FIRST_USER_ID + self.daily_order[i % self.users]
+        await economy_mod.claim_daily(self.db, self.ledger, uid)
+
+    async def coinflip(self, i: int) -> None:
+        await games_mod.coinflip(self.ledger, self.user(), 1)
+
+    async def add_balance(self, i: int) -> None:
+        async with self.db.write() as conn:
+            await dbmod.add_balance(conn, self.user(), 1, "bench")
+
+    async def is_game_banned(self, i: int) -> None:
+        async with self.db.read() as conn:
+            await dbmod.is_game_banned(conn, self.user())
+
+
+class Panel:
+    """Calls the FastAPI app in-process through ASGI (routing, validation and middleware included)."""
+
+    def __init__(self, path: Path, users: int, rng: random.Random):
+        os.environ["DATABASE_PATH"] = str(path)
+        os.environ["LOG_ARCHIVE_DIR"] = _archive_dir(path)
+        os.environ.setdefault("PANEL_API_KEY", "bench")
+        from panel import server
+
+        self.server = server
+        self.users = users
+        self.rng = rng
+        self._cursors: dict[int, str | None] = {}
+
+    async def open(self) -> dict[str, Any]:
+        """Open the panel's storage but not its background workers. Returns the setup done."""
+        # The lifespan would start rollups, retention and the live feed, and
+        # the rollup worker folds the seeded log right away, in the middle of
+        # the measurements. That work is done here instead, before timing.
+        await self.server.storage.open()
+        passes = 1
+        while await self.server.rollups.run_once():
+            passes += 1
+        archived = await self.server.retention.run_once()
+        return {"workers": "off", "rollup_passes": passes, "archived_rows": archived}
+
+    async def close(self) -> None:
+        await self.server.storage.close()
+
+    async def get(self, path: str, params: dict[str, Any] | None = None) -> tuple[int, bytes]:
+        query = urlencode(params or {}).encode()
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query,
+            "root_path": "",
+            "headers": [(b"host", b"bench"), (b"x-api-key", self.server.PANEL_API_KEY.encode())],
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+        }
+        status = 0
+        body: list[bytes] = []
+
+        async def receive() -> dict[str, Any]:
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message: dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                body.append(message.get("body", b""))
+
+        await self.server.app(scope, receive, send)
+        if status != 200:
+            raise RuntimeError(f"GET {path} -> {status}")
+        return status, b"".join(body)
+
+    async def users_page(self, i: int) -> None:
+        # Each simulated moderator walks the keyset to the end, then starts over.
+        worker = i % 64
+        params: dict[str, Any] = {"limit": 50}
+        cursor = self._cursors.get(worker)
+        if cursor:
+            params["cursor"] = cursor
+        _, body = await self.get("/api/users", params)
+        self._cursors[worker] = json.loads(body)["next_cursor"]
+
+    async def users_filtered(self, i: int) -> None:
+        await self.get("/api/users", {"limit": 50, "min_balance": self.rng.randint(100, 1000), "has_remanga": "true"})
+
+    async def leaderboard(self, i: int) -> None:
+        await self.get("/api/leaderboard", {"limit": 25, "offset": self.rng.randrange(max(1, self.users - 25))})
+
+    async def stats_summary(self, i: int) -> None:
+        await self.get("/api/stats/summary", {"hours": 24})
+
+
+BOT_SCENARIOS = ("daily", "coinflip", "add_balance", "is_game_banned")
+PANEL_SCENARIOS = {
+    "api_users": "users_page",
+    "api_users_filtered": "users_filtered",
+    "api_leaderboard": "leaderboard",
+    "api_stats_summary": "stats_summary",
+}
+SCENARIOS = (*BOT_SCENARIOS, *PANEL_SCENARIOS)
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    rng = random.Random(args.seed)
+    db_dir = Path(args.db_dir) if args.db_dir else Path(tempfile.gettempdir()) / "bot-bench"
+    db_dir.mkdir(parents=True, exist_ok=True)
+    seeded = db_dir / f"bench-{args.users}.sqlite"
+    await prepare_db(seeded, users=args.users, log_rows=args.log_rows, seed=args.seed)
+    # Write scenarios change balances and add log rows; they run on a copy so
+    # the seeded database stays identical across runs.
+    path = db_dir / f"bench-{args.users}.run.sqlite"
+    await asyncio.to_thread(_copy_db, seeded, path)
+    try:
+        return await _run_scenarios(args, path, rng)
+    finally:
+        _remove_db(path)
+        shutil.rmtree(_archive_dir(path), ignore_errors=True)
+
+
+async def _run_scenarios(args: argparse.Namespace, path: Path, rng: random.Random) -> dict[str, Any]:
+    wanted = [s for s in args.scenarios.split(",") if s]
+    unknown = sorted(set(wanted) - set(SCENARIOS))
+    if unknown:
+        raise SystemExit(f"unknown scenarios: {', '.join(unknown)} (known: {', '.join(SCENARIOS)})")
+
+    scenarios: dict[str, Any] = {}
+    panel_setup: dict[str, Any] | None = None
+    bot_wanted = [s for s in wanted if s in BOT_SCENARIOS]
+    if bot_wanted:
+        bot = Bot(path, args.users, rng)
+        await bot.open()
+        try:
+            for name in bot_wanted:
+                result = await drive(getattr(bot, name), ops=args.ops, concurrency=args.concurrency)
+                # Pending ledger events belong to this scenario's cost.
+                await bot.ledger.flush()
+                scenarios[name] = result.report()
+                print(f"{name}: {scenarios[name]}", file=sys.stderr)
+        finally:
+            await bot.close()
+
+    panel_wanted = [s for s in wanted if s in PANEL_SCENARIOS]
+    if panel_wanted:
+        panel = Panel(path, args.users, rng)
+        panel_setup = await panel.open()
+        print(f"panel setup: {panel_setup}", file=sys.stderr)
+        try:
+            for name in panel_wanted:
+                result = await drive(getattr(panel, PANEL_SCENARIOS[name]), ops=args.ops, concurrency=args.concurrency)
+                scenarios[name] = result.report()
+                print(f"{name}: {scenarios[name]}", file=sys.stderr)
+        finally:
+            await panel.close()
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created_ts": int(time.time()),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "users": args.users,
+            "log_rows": args.log_rows,
+            "ops": args.ops,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "panel_setup": panel_setup,
+        },
+        "scenarios": scenarios,
+    }
+
+
+def compare(report: dict[str, Any], baseline: dict[str, Any]) -> list[str]:
+    """One line per scenario: throughput and latency change vs. `baseline` (in %)."""
+    lines = []
+    for name, cur in report["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        parts = []
+        for key in ("ops_per_sec", "p50_ms", "p99_ms"):
+            if old.get(key) and cur.get(key) is not None:
+                parts.append(f"{key} {(cur[key] - old[key]) / old[key] * 100:+.1f}%")
+        lines.append(f"{name}: {', '.join(parts)}")
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the economy and panel paths on a synthetic database.")
+    parser.add_argument("--users", type=int, default=10_000, help="synthetic users in the database")
+    parser.add_argument("--log-rows", type=int, default=None, help="economy_logs rows (default: = users, at most 1M)")
+    parser.add_argument("--ops", type=int, default=2_000, help="operations per scenario")
+    parser.add_argument("--concurrency", type=int, default=50, help="simulated concurrent users")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db-dir", default=None, help="where synthetic databases are kept (reused across runs)")
+    parser.add_argument("--out", default=None, help="write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", default=None, help="earlier JSON report to diff against")
+    args = parser.parse_args()
+    if args.log_rows is None:
+        args.log_rows = min(args.users, 1_000_000)
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        for line in compare(report, baseline):
+            print(line, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from bot import db as dbmod
+
+
+log = logging.getLogger(__name__)
+
+# Cached "no game_bans row" marker.
+_NO_BAN: tuple[float | None, str | None] = (None, None)
+
+
+class BanCache:
+    """Process-local LRU of game bans.
+
+    Entries hold the ban expiry as an epoch timestamp, so a hit is a dict
+    lookup plus a float comparison.
+    Entries are dropped through `invalidate`, which `ChangeFeed` calls for
+    "ban" rows. A load that an invalidation overtakes is returned but not
+    cached, so the next check reads the row again.
+    """
+
+    def __init__(self, db: dbmod.Db, *, max_size: int = 10_000):
+        self.db = db
+        self.max_size = max_size
+
+        self._entries: OrderedDict[int, tuple[float | None, str | None]] = OrderedDict()
+        # Bumped by every invalidate(); _load compares it across its await.
+        self._generation = 0
+
+    async def check(self, discord_user_id: int) -> tuple[bool, str | None]:
+        """Same contract as `db.is_game_banned`."""
+        entry = self._entries.get(discord_user_id)
+        if entry is None:
+            entry = await self._load(discord_user_id)
+        else:
+            self._entries.move_to_end(discord_user_id)
+
+        until, reason = entry
+        if until is None:
+            return False, reason
+        return time.time() < until, reason
+
+    def invalidate(self, discord_user_id: int) -> None:
+        self._entries.pop(discord_user_id, None)
+        self._generation += 1
+
+    async def _load(self, discord_user_id: int) -> tuple[float | None, str | None]:
+        generation = self._generation
+        async with self.db.read() as conn:
+            row = await dbmod.get_game_ban(conn, discord_user_id)
+        if row is None:
+            entry = _NO_BAN
+        else:
+            banned_until, reason = row
+            entry = (float(banned_until) if banned_until is not None else None, reason)
+
+        if generation != self._generation:
+            # Invalidated while we were reading; the row may predate the change.
+            return entry
+        self._entries[discord_user_id] = entry
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return entry
+
+
+class ChangeFeed:
+    """Polls the `change_feed` table and hands new rows to subscribers.
+
+    Writes made outside this process (the panel) append rows via
+    `db.notify_change`; subscribers drop whatever they cached for the user.
+    """
+
+    def __init__(self, db: dbmod.Db, *, poll_interval: float = 2.0):
+        self.db = db
+        self.poll_interval = poll_interval
+
+        self._subscribers: dict[str, list[Callable[[int], None]]] = {}
+        self._feed_id: int | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    def subscribe(self, kind: str, callback: Callable[[int], None]) -> None:
+        self._subscribers.setdefault(kind, []).append(callback)
+
+    async def poll(self) -> int:
+        """Dispatch new change_feed rows. Returns how many were seen."""
+        async with self.db.read() as conn:
+            if self._feed_id is None:
+                # Nothing is cached yet, so older changes are irrelevant.
+                cur = await conn.execute("SELECT COALESCE(MAX(id), 0) FROM change_feed")
+                row = await cur.fetchone()
+                self._feed_id = int(row[0]) if row else 0
+                return 0
+            cur = await conn.execute(
+                "SELECT id, kind, discord_user_id FROM change_feed WHERE id > ? ORDER BY id",
+                (self._feed_id,),
+            )
+            rows = await cur.fetchall()
+
+        for feed_id, kind, discord_user_id in rows:
+            self._feed_id = int(feed_id)
+            if discord_user_id is None:
+                continue
+            for callback in self._subscribers.get(kind, ()):
+                callback(int(discord_user_id))
+        return len(rows)
+
+    async def prune(self, keep_hours: int = 24) -> None:
+        async with self.db.write() as conn:
+            await conn.execute(
+                "DELETE FROM change_feed WHERE created_at < datetime('now', ?)",
+                (f"-{keep_hours} hours",),
+            )
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name="change-feed-poll")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self) -> None:
+        last_prune = time.monotonic()
+        while True:
+            try:
+                await self.poll()
+                if time.monotonic() - last_prune > 3600:
+                    await self.prune()
+                    last_prune = time.monotonic()
+            except Exception:
+                # Stale entries are better than a dead poller; retry next tick.
+                log.exception("change_feed poll failed")
+            await asyncio.sleep(self.poll_interval)
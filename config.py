@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -19,6 +19,90 @@ class Settings:
 
     remanga_user_agent: str
 
+    # Remanga card sync: API base (point it at a stub server for testing),
+    # parallel requests, requests per second per host, parsed profile cache TTL.
+    remanga_base_url: str = "https://api.remanga.org"
+    remanga_concurrency: int = 8
+    remanga_rate_per_host: float = 5.0
+    remanga_cache_ttl: float = 600.0
+
+    # Background re-verification of linked profiles (see bot/jobs.py).
+    verify_period_hours: float = 24.0
+    verify_active_period_hours: float = 4.0
+    verify_tick_seconds: float = 30.0
+    verify_batch: int = 50
+
+    # economy_logs rows older than this many days move to gzip JSONL files in
+    # `log_archive_dir` (see bot/retention.py).
+    log_hot_days: int = 90
+    log_archive_dir: Path = Path("./data/archive")
+
+    # Sharding: total shard count (None = ask Discord) and the shards this
+    # process runs (None = all of them).
+    shard_count: int | None = None
+    shard_ids: list[int] | None = None
+    # "shared": one database for all guilds; "per_guild": one SQLite file per
+    # guild in `guild_db_dir`, each with its own writer.
+    guild_storage: str = "shared"
+    guild_db_dir: Path = Path("./data/guilds")
+    guild_db_readers: int = 2
+
+    # Sync slash commands to these guilds only (instant, for development)
+    # instead of globally.
+    sync_guild_ids: list[int] = field(default_factory=list)
+
+    # Open duel/card-bet challenges are refunded after this long.
+    match_timeout_seconds: float = 300.0
+
+    # Commands not answered within this budget are deferred ("thinking…") and
+    # answered with a follow-up. Economy writes run on a bounded worker pool.
+    response_budget_ms: int = 1500
+    economy_workers: int = 16
+    economy_queue: int = 512
+
+    # Prometheus metrics endpoint of the bot process (port 0 = off).
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 0
+
+    # Balance ledger group commit: flush window and max events per transaction.
+    ledger_flush_ms: int = 2
+    ledger_max_batch: int = 256
+
+    # How often the bot polls change_feed to invalidate cached bans.
+    cache_poll_seconds: float = 2.0
+
+    # Per-user command limits: command -> (uses, per seconds).
+    rate_limits: dict[str, tuple[int, float]] = field(
+        default_factory=lambda: {"coinflip": (5, 10.0), "give": (3, 30.0), "daily": (2, 60.0), "duel": (3, 30.0), "accept": (5, 30.0)}
+    )
+    # Economy actions one user may have running or waiting at once.
+    user_max_pending: int = 2
+
+
+def parse_rate_limits(spec: str) -> dict[str, tuple[int, float]]:
+    """Parse "coinflip=5/10,give=3/30" into {"coinflip": (5, 10.0), ...}."""
+    limits: dict[str, tuple[int, float]] = {}
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, value = part.partition("=")
+        uses, _, per = value.partition("/")
+        limits[name.strip()] = (int(uses), float(per))
+    return limits
+
+
+def parse_shard_ids(spec: str) -> list[int] | None:
+    """Parse "0-3" or "0,2,5" (or a mix) into shard ids; empty means all."""
+    ids: list[int] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        ids.extend(range(int(start), int(end or start) + 1))
+    return sorted(set(ids)) or None
+
 
 def load_settings() -> Settings:
     token = os.getenv("DISCORD_TOKEN", "").strip()
@@ -32,10 +116,72 @@ def load_settings() -> Settings:
         raise RuntimeError("PANEL_API_KEY is required. Put it in .env")
 
     ua = os.getenv("REMANGA_USER_AGENT", "Mozilla/5.0").strip()
+    remanga_base_url = os.getenv("REMANGA_BASE_URL", "https://api.remanga.org").strip()
+    remanga_concurrency = int(os.getenv("REMANGA_CONCURRENCY", "8"))
+    remanga_rate_per_host = float(os.getenv("REMANGA_RATE_PER_HOST", "5"))
+    remanga_cache_ttl = float(os.getenv("REMANGA_CACHE_TTL", "600"))
+    verify_period_hours = float(os.getenv("VERIFY_PERIOD_HOURS", "24"))
+    verify_active_period_hours = float(os.getenv("VERIFY_ACTIVE_PERIOD_HOURS", "4"))
+    verify_tick_seconds = float(os.getenv("VERIFY_TICK_SECONDS", "30"))
+    verify_batch = int(os.getenv("VERIFY_BATCH", "50"))
+    log_hot_days = int(os.getenv("LOG_HOT_DAYS", "90"))
+    log_archive_dir = Path(os.getenv("LOG_ARCHIVE_DIR", "./data/archive")).resolve()
+
+    shard_count_env = os.getenv("SHARD_COUNT", "").strip()
+    shard_count = int(shard_count_env) if shard_count_env else None
+    shard_ids = parse_shard_ids(os.getenv("SHARD_IDS", ""))
+    if shard_ids is not None and shard_count is None:
+        raise RuntimeError("SHARD_IDS needs SHARD_COUNT")
+    guild_storage = os.getenv("GUILD_STORAGE", "shared").strip()
+    if guild_storage not in ("shared", "per_guild"):
+        raise RuntimeError("GUILD_STORAGE must be 'shared' or 'per_guild'")
+    guild_db_dir = Path(os.getenv("GUILD_DB_DIR", "./data/guilds")).resolve()
+    guild_db_readers = int(os.getenv("GUILD_DB_READERS", "2"))
+    sync_guild_ids = [int(x) for x in os.getenv("SYNC_GUILD_IDS", "").replace(" ", "").split(",") if x]
+    match_timeout_seconds = float(os.getenv("MATCH_TIMEOUT_SECONDS", "300"))
+    response_budget_ms = int(os.getenv("RESPONSE_BUDGET_MS", "1500"))
+    economy_workers = int(os.getenv("ECONOMY_WORKERS", "16"))
+    economy_queue = int(os.getenv("ECONOMY_QUEUE", "512"))
+    metrics_host = os.getenv("METRICS_HOST", "127.0.0.1").strip()
+    metrics_port = int(os.getenv("METRICS_PORT", "0"))
+
+    ledger_flush_ms = int(os.getenv("LEDGER_FLUSH_MS", "2"))
+    ledger_max_batch = int(os.getenv("LEDGER_MAX_BATCH", "256"))
+    cache_poll_seconds = float(os.getenv("CACHE_POLL_SECONDS", "2"))
+
+    rate_limits = parse_rate_limits(os.getenv("RATE_LIMITS", "coinflip=5/10,give=3/30,daily=2/60,duel=3/30,accept=5/30"))
+    user_max_pending = int(os.getenv("USER_MAX_PENDING", "2"))
 
     return Settings(
         discord_token=token,
         database_path=db_path,
         panel_api_key=panel_key,
         remanga_user_agent=ua,
+        remanga_base_url=remanga_base_url,
+        remanga_concurrency=remanga_concurrency,
+        remanga_rate_per_host=remanga_rate_per_host,
+        remanga_cache_ttl=remanga_cache_ttl,
+        verify_period_hours=verify_period_hours,
+        verify_active_period_hours=verify_active_period_hours,
+        verify_tick_seconds=verify_tick_seconds,
+        verify_batch=verify_batch,
+        log_hot_days=log_hot_days,
+        log_archive_dir=log_archive_dir,
+        shard_count=shard_count,
+        shard_ids=shard_ids,
+        guild_storage=guild_storage,
+        guild_db_dir=guild_db_dir,
+        guild_db_readers=guild_db_readers,
+        sync_guild_ids=sync_guild_ids,
+        match_timeout_seconds=match_timeout_seconds,
+        response_budget_ms=response_budget_ms,
+        economy_workers=economy_workers,
+        economy_queue=economy_queue,
+        metrics_host=metrics_host,
+        metrics_port=metrics_port,
+        ledger_flush_ms=ledger_flush_ms,
+        ledger_max_batch=ledger_max_batch,
+        cache_poll_seconds=cache_poll_seconds,
+        rate_limits=rate_limits,
+        user_max_pending=user_max_pending,
     )
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import time
+
+import aiosqlite
+
+
+async def claim(conn: aiosqlite.Connection, discord_user_id: int, action: str, cooldown_seconds: int, *, now: int | None = None) -> int:
+    """Start `action`'s cooldown if it has expired.
+
+    Check and update are one upsert, so two concurrent claims cannot both win.
+    Returns 0 when claimed, otherwise the seconds left until the next claim.
+    """
+    now = int(time.time()) if now is None else now
+    cur = await conn.execute(
+        "INSERT INTO cooldowns(discord_user_id, action, last_at) VALUES (?, ?, ?) "
+        "ON CONFLICT(discord_user_id, action) DO UPDATE SET last_at = excluded.last_at "
+        "WHERE cooldowns.last_at <= excluded.last_at - ? "
+        "RETURNING last_at",
+        (discord_user_id, action, now, cooldown_seconds),
+    )
+    if await cur.fetchone():
+        return 0
+    return await remaining(conn, discord_user_id, action, cooldown_seconds, now=now)
+
+
+async def remaining(conn: aiosqlite.Connection, discord_user_id: int, action: str, cooldown_seconds: int, *, now: int | None = None) -> int:
+    """Seconds until `action` is available again (0 if it is available)."""
+    now = int(time.time()) if now is None else now
+    cur = await conn.execute(
+        "SELECT last_at FROM cooldowns WHERE discord_user_id=? AND action=?",
+        (discord_user_id, action),
+    )
+    row = await cur.fetchone()
+    if not row:
+        return 0
+    return max(0, int(row[0]) + cooldown_seconds - now)
+
+
+async def release(conn: aiosqlite.Connection, discord_user_id: int, action: str, claimed_at: int) -> None:
+    """Undo a `claim` made at `claimed_at` (e.g. the reward could not be paid)."""
+    await conn.execute(
+        "DELETE FROM cooldowns WHERE discord_user_id=? AND action=? AND last_at=?",
+        (discord_user_id, action, claimed_at),
+    )
@@ -1,9 +1,17 @@
 from __future__ import annotations
 
 import asyncio
+import json
+import sqlite3
 import sys
-from dataclasses import dataclass
+import time
+import weakref
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import AsyncIterator, Iterable, Sequence
+
 import aiosqlite
 
 # Allow running as a file: `python bot/db.py`.
@@ -11,81 +19,225 @@ import aiosqlite
 if __package__ is None or __package__ == "":
     sys.path.append(str(Path(__file__).resolve().parents[1]))
 
+from bot import metrics
+from bot.migrations import migrate
+
 
-SCHEMA_SQL = """
-PRAGMA journal_mode=WAL;
-
-CREATE TABLE IF NOT EXISTS users (
-  discord_user_id INTEGER PRIMARY KEY,
-  remanga_profile_url TEXT,
-  created_at TEXT NOT NULL DEFAULT (datetime('now'))
-);
-
-CREATE TABLE IF NOT EXISTS balances (
-  discord_user_id INTEGER PRIMARY KEY,
-  balance INTEGER NOT NULL DEFAULT 0,
-  updated_at TEXT NOT NULL DEFAULT (datetime('now')),
-  FOREIGN KEY (discord_user_id) REFERENCES users(discord_user_id)
-);
-
-CREATE TABLE IF NOT EXISTS game_bans (
-  discord_user_id INTEGER PRIMARY KEY,
-  banned_until TEXT,
-  reason TEXT,
-  updated_at TEXT NOT NULL DEFAULT (datetime('now')),
-  FOREIGN KEY (discord_user_id) REFERENCES users(discord_user_id)
-);
-
-CREATE TABLE IF NOT EXISTS economy_logs (
-  id INTEGER PRIMARY KEY AUTOINCREMENT,
-  discord_user_id INTEGER,
-  action TEXT NOT NULL,
-  amount INTEGER,
-  meta_json TEXT,
-  created_at TEXT NOT NULL DEFAULT (datetime('now'))
-);
-
-CREATE TABLE IF NOT EXISTS cards (
-  id INTEGER PRIMARY KEY AUTOINCREMENT,
-  owner_discord_user_id INTEGER NOT NULL,
-  external_source TEXT,
-  external_id TEXT,
-  name TEXT NOT NULL,
-  verified INTEGER NOT NULL DEFAULT 0,
-  created_at TEXT NOT NULL DEFAULT (datetime('now')),
-  FOREIGN KEY (owner_discord_user_id) REFERENCES users(discord_user_id)
-);
-
-CREATE INDEX IF NOT EXISTS idx_cards_owner ON cards(owner_discord_user_id);
-"""
+# Format of SQLite's datetime('now') (UTC).
+SQLITE_TS_FORMAT = "%Y-%m-%d %H:%M:%S"
 
 
 @dataclass
 class Db:
-    path: Path
+    """SQLite access for the bot.
 
-    async def connect(self) -> aiosqlite.Connection:
+    Besides one-off `connect()` calls, the Db owns a small long-lived pool:
+    a single writer connection (mutations are serialized behind a lock, which
+    is what SQLite does anyway) and `readers` read-only connections. Thanks to
+    WAL, readers never block on the writer.
+    """
+
+    path: Path
+    readers: int = 4
+    # Idle connections are pinged with `SELECT 1` at most this often before reuse.
+    health_check_interval: float = 30.0
+
+    _writer: aiosqlite.Connection | None = field(default=None, init=False, repr=False)
+    _write_lock: asyncio.Lock = field(default_factory=asyncio.Lock, init=False, repr=False)
+    _idle_readers: asyncio.Queue[aiosqlite.Connection] | None = field(default=None, init=False, repr=False)
+    _checked_at: dict[int, float] = field(default_factory=dict, init=False, repr=False)
+    _open_lock: asyncio.Lock = field(default_factory=asyncio.Lock, init=False, repr=False)
+    _closed: bool = field(default=False, init=False, repr=False)
+    # Coroutines currently waiting for a reader / for the write lock.
+    _read_waiting: int = field(default=0, init=False, repr=False)
+    _write_waiting: int = field(default=0, init=False, repr=False)
+
+    async def connect(self, *, label: str = "direct") -> aiosqlite.Connection:
         self.path.parent.mkdir(parents=True, exist_ok=True)
-        conn = await aiosqlite.connect(str(self.path))
+        conn = metrics.instrument(await aiosqlite.connect(str(self.path)), label)
         await conn.execute("PRAGMA foreign_keys=ON;")
         await conn.execute("PRAGMA busy_timeout=5000;")
         return conn
 
-    async def init(self) -> None:
-        async with await self.connect() as conn:
-            await conn.executescript(SCHEMA_SQL)
+    async def init(self) -> int:
+        """Apply pending migrations. Returns the schema version."""
+        conn = await self.connect()
+        try:
+            # Only takes effect on a new, empty file; existing databases are
+            # switched over once by `python -m bot.retention`.
+            await conn.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+            await conn.execute("PRAGMA journal_mode=WAL;")
+            return await migrate(conn)
+        finally:
+            await conn.close()
+
+    async def _open_pooled(self, *, readonly: bool) -> aiosqlite.Connection:
+        # PRAGMAs are applied once per pooled connection, not per command.
+        conn = await self.connect(label="reader" if readonly else "writer")
+        if readonly:
+            await conn.execute("PRAGMA query_only=ON;")
+        # Warm up: parse the schema now rather than on the first real query.
+        # (Results are always drained: a half-read cursor pins a WAL snapshot.)
+        await conn.execute_fetchall("SELECT 1 FROM sqlite_master LIMIT 1")
+        self._checked_at[id(conn)] = time.monotonic()
+        return conn
+
+    async def open(self) -> None:
+        """Open the pool. Safe to call more than once."""
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+            self._closed = False
+            self._writer = await self._open_pooled(readonly=False)
+            self._idle_readers = asyncio.Queue()
+            for _ in range(max(1, self.readers)):
+                self._idle_readers.put_nowait(await self._open_pooled(readonly=True))
+
+    async def close(self) -> None:
+        """Close all pooled connections. Waits for an in-flight write to finish."""
+        self._closed = True
+        async with self._write_lock:
+            if self._writer is not None:
+                await self._writer.close()
+                self._writer = None
+        if self._idle_readers is not None:
+            # Readers that are checked out are closed when they are released.
+            while not self._idle_readers.empty():
+                await self._idle_readers.get_nowait().close()
+        self._checked_at.clear()
+
+    def stats(self) -> dict[str, int | float | bool]:
+        """Pool occupancy, e.g. for a health endpoint."""
+        idle = self._idle_readers.qsize() if self._idle_readers is not None else 0
+        total = max(1, self.readers)
+        in_use = total - idle if self._writer is not None else 0
+        return {
+            "open": self._writer is not None,
+            "readers": total,
+            "readers_in_use": in_use,
+            "read_waiting": self._read_waiting,
+            "writer_busy": self._write_lock.locked(),
+            "write_waiting": self._write_waiting,
+            "saturation": round(in_use / total, 3),
+        }
+
+    async def _healthy(self, conn: aiosqlite.Connection, *, readonly: bool) -> aiosqlite.Connection:
+        now = time.monotonic()
+        if now - self._checked_at.get(id(conn), 0.0) < self.health_check_interval:
+            return conn
+        try:
+            await conn.execute_fetchall("SELECT 1")
+        except (sqlite3.Error, ValueError):
+            # ValueError: aiosqlite's worker thread is gone ("Connection closed").
+            self._checked_at.pop(id(conn), None)
+            try:
+                await conn.close()
+            except (sqlite3.Error, ValueError):
+                pass
+            return await self._open_pooled(readonly=readonly)
+        self._checked_at[id(conn)] = now
+        return conn
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a read-only connection from the pool."""
+        if self._closed:
+            raise RuntimeError("Db pool is closed")
+        if self._writer is None:
+            await self.open()
+        assert self._idle_readers is not None
+        self._read_waiting += 1
+        started = time.perf_counter()
+        try:
+            conn = await self._idle_readers.get()
+        finally:
+            self._read_waiting -= 1
+            metrics.lock_wait("reader", time.perf_counter() - started)
+        conn = await self._healthy(conn, readonly=True)
+        try:
+            yield conn
+        finally:
+            if self._closed:
+                await conn.close()
+            else:
+                self._idle_readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Run a transaction on the writer connection.
+
+        Commits when the block exits normally and rolls back on error. The
+        write lock is taken up front (BEGIN IMMEDIATE), so statements inside
+        the block never hit SQLITE_BUSY half-way through.
+        """
+        if self._closed:
+            raise RuntimeError("Db pool is closed")
+        if self._writer is None:
+            await self.open()
+        self._write_waiting += 1
+        started = time.perf_counter()
+        try:
+            await self._write_lock.acquire()
+        finally:
+            self._write_waiting -= 1
+            metrics.lock_wait("writer", time.perf_counter() - started)
+        try:
+            if self._writer is None:
+                raise RuntimeError("Db pool is closed")
+            self._writer = conn = await self._healthy(self._writer, readonly=False)
+            started = time.perf_counter()
+            # Waits out other processes' writers (busy_timeout).
+            await conn.execute("BEGIN IMMEDIATE")
+            metrics.lock_wait("sqlite", time.perf_counter() - started)
+            try:
+                yield conn
+            except BaseException:
+                await conn.rollback()
+                raise
             await conn.commit()
+        finally:
+            self._write_lock.release()
+
 
+# Users whose rows were already created by this process, per writer connection
+# (each guild partition is its own file); ensure_user skips them. If the
+# creating transaction was rolled back the entry is stale, which change_balance
+# detects (no row to update) and repairs.
+_known_users: weakref.WeakKeyDictionary[aiosqlite.Connection, set[int]] = weakref.WeakKeyDictionary()
 
-async def ensure_user(conn: aiosqlite.Connection, discord_user_id: int) -> None:
+
+def _known(conn: aiosqlite.Connection) -> set[int]:
+    known = _known_users.get(conn)
+    if known is None:
+        known = _known_users[conn] = set()
+    return known
+
+
+async def ensure_user(conn: aiosqlite.Connection, discord_user_id: int, *, force: bool = False) -> None:
+    known = _known(conn)
+    if discord_user_id in known and not force:
+        return
     await conn.execute(
-        "INSERT OR IGNORE INTO users(discord_user_id) VALUES (?)",
-        (discord_user_id,),
+        "INSERT OR IGNORE INTO users(discord_user_id, created_ts) VALUES (?, ?)",
+        (discord_user_id, int(time.time())),
     )
     await conn.execute(
         "INSERT OR IGNORE INTO balances(discord_user_id, balance) VALUES (?, 0)",
         (discord_user_id,),
     )
+    known.add(discord_user_id)
+
+
+async def ensure_users(conn: aiosqlite.Connection, discord_user_ids: Iterable[int]) -> None:
+    """Bulk `ensure_user` for a batch of ids."""
+    known = _known(conn)
+    ids = [uid for uid in discord_user_ids if uid not in known]
+    if not ids:
+        return
+    now = int(time.time())
+    await conn.executemany("INSERT OR IGNORE INTO users(discord_user_id, created_ts) VALUES (?, ?)", [(uid, now) for uid in ids])
+    await conn.executemany("INSERT OR IGNORE INTO balances(discord_user_id, balance) VALUES (?, 0)", [(uid,) for uid in ids])
+    known.update(ids)
 
 
 async def get_balance(conn: aiosqlite.Connection, discord_user_id: int) -> int:
@@ -98,16 +250,8 @@ async def get_balance(conn: aiosqlite.Connection, discord_user_id: int) -> int:
     return int(row[0]) if row else 0
 
 
-async def add_balance(conn: aiosqlite.Connection, discord_user_id: int, delta: int, action: str, meta_json: str | None = None) -> int:
-    await ensure_user(conn, discord_user_id)
-    await conn.execute(
-        "UPDATE balances SET balance = balance + ?, updated_at = datetime('now') WHERE discord_user_id = ?",
-        (delta, discord_user_id),
-    )
-    await conn.execute(
-        "INSERT INTO economy_logs(discord_user_id, action, amount, meta_json) VALUES (?, ?, ?, ?)",
-        (discord_user_id, action, delta, meta_json),
-    )
+async def peek_balance(conn: aiosqlite.Connection, discord_user_id: int) -> int:
+    """Read-only balance lookup; unknown users simply have 0."""
     cur = await conn.execute(
         "SELECT balance FROM balances WHERE discord_user_id = ?",
         (discord_user_id,),
@@ -116,33 +260,244 @@ async def add_balance(conn: aiosqlite.Connection, discord_user_id: int, delta: i
     return int(row[0]) if row else 0
 
 
-async def is_game_banned(conn: aiosqlite.Connection, discord_user_id: int) -> tuple[bool, str | None]:
+async def change_balance(conn: aiosqlite.Connection, discord_user_id: int, delta: int, *, need: int | None = None) -> int | None:
+    """Atomically add `delta` to a balance in a single statement (no log row).
+
+    With `need`, the update only happens if the balance is at least `need`;
+    otherwise nothing changes and None is returned. Returns the new balance.
+    """
     await ensure_user(conn, discord_user_id)
+    for attempt in range(2):
+        if need is None:
+            cur = await conn.execute(
+                "UPDATE balances SET balance = balance + ?, updated_at = datetime('now') "
+                "WHERE discord_user_id = ? RETURNING balance",
+                (delta, discord_user_id),
+            )
+        else:
+            cur = await conn.execute(
+                "UPDATE balances SET balance = balance + ?, updated_at = datetime('now') "
+                "WHERE discord_user_id = ? AND balance >= ? RETURNING balance",
+                (delta, discord_user_id, need),
+            )
+        row = await cur.fetchone()
+        if row:
+            return int(row[0])
+        if attempt == 0:
+            # Either not enough coins, or a stale _known_users entry and no row.
+            await ensure_user(conn, discord_user_id, force=True)
+    return None
+
+
+async def log_economy(conn: aiosqlite.Connection, rows: Iterable[tuple[int, str, int, str | None]]) -> None:
+    """Append (discord_user_id, action, amount, meta_json) rows to economy_logs."""
+    now = int(time.time())
+    await conn.executemany(
+        "INSERT INTO economy_logs(discord_user_id, action, amount, meta_json, created_ts) VALUES (?, ?, ?, ?, ?)",
+        [(*row, now) for row in rows],
+    )
+
+
+async def credit(conn: aiosqlite.Connection, discord_user_id: int, amount: int, action: str, meta_json: str | None = None) -> int:
+    bal = await change_balance(conn, discord_user_id, amount)
+    assert bal is not None  # unconditional updates always find the row
+    await log_economy(conn, [(discord_user_id, action, amount, meta_json)])
+    return bal
+
+
+async def try_debit(conn: aiosqlite.Connection, discord_user_id: int, amount: int, action: str, meta_json: str | None = None) -> int | None:
+    """Take `amount` coins if the user has them. Returns the new balance or None."""
+    bal = await change_balance(conn, discord_user_id, -amount, need=amount)
+    if bal is None:
+        return None
+    await log_economy(conn, [(discord_user_id, action, -amount, meta_json)])
+    return bal
+
+
+async def add_balance(conn: aiosqlite.Connection, discord_user_id: int, delta: int, action: str, meta_json: str | None = None) -> int:
+    return await credit(conn, discord_user_id, delta, action, meta_json)
+
+
+def parse_ts(value: str) -> datetime:
+    """Parse a timestamp written by SQLite's datetime() as an aware UTC datetime."""
+    return datetime.strptime(value, SQLITE_TS_FORMAT).replace(tzinfo=timezone.utc)
+
+
+def format_ts(value: datetime) -> str:
+    """Inverse of parse_ts: format an aware datetime the way datetime() does."""
+    return value.astimezone(timezone.utc).strftime(SQLITE_TS_FORMAT)
+
+
+async def get_game_ban(conn: aiosqlite.Connection, discord_user_id: int) -> tuple[int | None, str | None] | None:
+    """Returns (banned_until epoch seconds, reason), or None if there is no row."""
+    # Rows written by an older panel build may lack banned_until_ts.
     cur = await conn.execute(
-        "SELECT banned_until, reason FROM game_bans WHERE discord_user_id = ?",
+        "SELECT COALESCE(banned_until_ts, CAST(strftime('%s', banned_until) AS INTEGER)), reason "
+        "FROM game_bans WHERE discord_user_id = ?",
         (discord_user_id,),
     )
     row = await cur.fetchone()
+    if not row:
+        return None
+    return (int(row[0]) if row[0] is not None else None), row[1]
+
+
+async def is_game_banned(conn: aiosqlite.Connection, discord_user_id: int) -> tuple[bool, str | None]:
+    # Read-only: a user without a game_bans row is simply not banned.
+    row = await get_game_ban(conn, discord_user_id)
     if not row:
         return False, None
 
-    banned_until, reason = row[0], row[1]
+    banned_until, reason = row
     if banned_until is None:
         return False, reason
-
-    cur2 = await conn.execute("SELECT datetime('now') < datetime(?)", (banned_until,))
-    row2 = await cur2.fetchone()
-    active = bool(row2[0]) if row2 else False
-    return active, reason
+    return time.time() < banned_until, reason
 
 
 async def set_game_ban(conn: aiosqlite.Connection, discord_user_id: int, banned_until: str | None, reason: str | None) -> None:
     await ensure_user(conn, discord_user_id)
+    banned_until_ts = int(parse_ts(banned_until).timestamp()) if banned_until else None
+    await conn.execute(
+        "INSERT INTO game_bans(discord_user_id, banned_until, banned_until_ts, reason) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(discord_user_id) DO UPDATE SET banned_until=excluded.banned_until, "
+        "banned_until_ts=excluded.banned_until_ts, reason=excluded.reason, updated_at=datetime('now')",
+        (discord_user_id, banned_until, banned_until_ts, reason),
+    )
+    await notify_change(conn, "ban", discord_user_id)
+
+
+async def set_game_bans(conn: aiosqlite.Connection, discord_user_ids: Sequence[int], banned_until: str | None, reason: str | None) -> None:
+    """Bulk `set_game_ban`: same ban for every id, as a few executemany calls."""
+    ids = list(dict.fromkeys(discord_user_ids))
+    banned_until_ts = int(parse_ts(banned_until).timestamp()) if banned_until else None
+    await ensure_users(conn, ids)
+    await conn.executemany(
+        "INSERT INTO game_bans(discord_user_id, banned_until, banned_until_ts, reason) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(discord_user_id) DO UPDATE SET banned_until=excluded.banned_until, "
+        "banned_until_ts=excluded.banned_until_ts, reason=excluded.reason, updated_at=datetime('now')",
+        [(uid, banned_until, banned_until_ts, reason) for uid in ids],
+    )
+    await conn.executemany(
+        "INSERT INTO change_feed(kind, discord_user_id) VALUES ('ban', ?)",
+        [(uid,) for uid in ids],
+    )
+
+
+def plan_adjustments(balances: dict[int, int], adjustments: Sequence[tuple[int, int]]) -> tuple[list[int | None], dict[int, int]]:
+    """Apply `adjustments` in order to `balances` (updated in place), skipping any that would go below zero.
+
+    Returns the balance after each adjustment (None where skipped) and the
+    net delta per user to write back.
+    """
+    results: list[int | None] = []
+    totals: dict[int, int] = {}
+    for uid, delta in adjustments:
+        new_balance = balances.get(uid, 0) + delta
+        if new_balance < 0:
+            results.append(None)
+            continue
+        balances[uid] = new_balance
+        totals[uid] = totals.get(uid, 0) + delta
+        results.append(new_balance)
+    return results, totals
+
+
+async def adjust_balances(
+    conn: aiosqlite.Connection,
+    adjustments: Sequence[tuple[int, int]],
+    *,
+    action: str = "mod_adjust",
+    meta_json: str | None = None,
+) -> list[int | None]:
+    """Apply many (discord_user_id, delta) changes, one economy_logs row per applied change.
+
+    Call inside `Db.write()`: balances are read and updated under the write
+    lock. A change that would take a balance below zero is skipped. Returns
+    the resulting balance per adjustment, or None where it was skipped.
+    """
+    ids = list(dict.fromkeys(uid for uid, _ in adjustments))
+    await ensure_users(conn, ids)
+
+    balances: dict[int, int] = {}
+    for i in range(0, len(ids), 500):
+        chunk = ids[i : i + 500]
+        cur = await conn.execute(
+            f"SELECT discord_user_id, balance FROM balances WHERE discord_user_id IN ({','.join('?' * len(chunk))})",
+            chunk,
+        )
+        balances.update((int(uid), int(bal)) for uid, bal in await cur.fetchall())
+
+    results, totals = plan_adjustments(balances, adjustments)
+    await conn.executemany(
+        "UPDATE balances SET balance = balance + ?, updated_at = datetime('now') WHERE discord_user_id = ?",
+        [(delta, uid) for uid, delta in totals.items()],
+    )
+    await conn.executemany(
+        "INSERT INTO change_feed(kind, discord_user_id) VALUES ('balance', ?)",
+        [(uid,) for uid in totals],
+    )
+    await log_economy(
+        conn,
+        [(uid, action, delta, meta_json) for (uid, delta), bal in zip(adjustments, results) if bal is not None],
+    )
+    return results
+
+
+async def log_audit(conn: aiosqlite.Connection, action: str, amount: int | None, meta: dict[str, object]) -> int:
+    """One economy_logs row (no user) describing a whole moderation batch. Returns its id.
+
+    Coins moved by the batch are in its per-user rows; give `amount` only
+    for changes that have none, or the stats count them twice.
+    """
+    cur = await conn.execute(
+        "INSERT INTO economy_logs(discord_user_id, action, amount, meta_json, created_ts) VALUES (NULL, ?, ?, ?, ?) RETURNING id",
+        (action, amount, json.dumps(meta), int(time.time())),
+    )
+    row = await cur.fetchone()
+    assert row is not None
+    return int(row[0])
+
+
+async def get_meta(conn: aiosqlite.Connection, key: str) -> str | None:
+    rows = await conn.execute_fetchall("SELECT value FROM db_meta WHERE key = ?", (key,))
+    return str(rows[0][0]) if rows else None
+
+
+async def set_meta(conn: aiosqlite.Connection, key: str, value: str) -> None:
+    await conn.execute(
+        "INSERT INTO db_meta(key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, value),
+    )
+
+
+async def set_partition_guild(conn: aiosqlite.Connection, guild_id: int) -> None:
+    """Mark this database file as the partition of one guild (set once)."""
     await conn.execute(
-        "INSERT INTO game_bans(discord_user_id, banned_until, reason) VALUES (?, ?, ?) "
-        "ON CONFLICT(discord_user_id) DO UPDATE SET banned_until=excluded.banned_until, reason=excluded.reason, updated_at=datetime('now')",
-        (discord_user_id, banned_until, reason),
+        "INSERT INTO db_meta(key, value) VALUES ('guild_id', ?) ON CONFLICT(key) DO NOTHING",
+        (str(guild_id),),
+    )
+
+
+async def partition_guild(conn: aiosqlite.Connection) -> int:
+    """Guild this database file belongs to; 0 for shared storage."""
+    rows = await conn.execute_fetchall("SELECT value FROM db_meta WHERE key = 'guild_id'")
+    return int(rows[0][0]) if rows else 0
+
+
+async def notify_change(conn: aiosqlite.Connection, kind: str, discord_user_id: int | None) -> None:
+    """Append to change_feed so other processes drop their cached copy."""
+    await conn.execute(
+        "INSERT INTO change_feed(kind, discord_user_id) VALUES (?, ?)",
+        (kind, discord_user_id),
+    )
+
+
+async def high_water(conn: aiosqlite.Connection) -> tuple[int, int]:
+    """(MAX(id) of economy_logs, MAX(id) of change_feed), 0 for an empty table."""
+    rows = await conn.execute_fetchall(
+        "SELECT (SELECT COALESCE(MAX(id), 0) FROM economy_logs), (SELECT COALESCE(MAX(id), 0) FROM change_feed)"
     )
+    return int(rows[0][0]), int(rows[0][1])
 
 
 def main() -> None:
@@ -151,8 +506,8 @@ def main() -> None:
     settings = load_settings()
     db = Db(settings.database_path)
 
-    asyncio.run(db.init())
-    print(f"DB initialized at: {db.path}")
+    version = asyncio.run(db.init())
+    print(f"DB initialized at: {db.path} (schema v{version})")
 
 
 if __name__ == "__main__":
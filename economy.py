@@ -1,36 +1,53 @@
 from __future__ import annotations
 
 import json
-from datetime import datetime, timedelta, timezone
+import time
 
-import aiosqlite
-
-from bot import db as dbmod
+from bot import cooldowns
+from bot.db import Db
+from bot.ledger import BalanceLedger
 
 
 DAILY_COOLDOWN_HOURS = 24
 DAILY_REWARD = 100
 
 
-async def claim_daily(conn: aiosqlite.Connection, user_id: int) -> tuple[bool, int, str]:
+async def claim_daily(db: Db, ledger: BalanceLedger, user_id: int) -> tuple[bool, int, str]:
     """Returns (ok, new_balance, message)."""
-    await dbmod.ensure_user(conn, user_id)
+    now = int(time.time())
+    async with db.write() as conn:
+        remaining = await cooldowns.claim(conn, user_id, "daily", DAILY_COOLDOWN_HOURS * 3600, now=now)
+    if remaining:
+        hours = remaining // 3600
+        mins = (remaining % 3600) // 60
+        bal = await ledger.balance(user_id)
+        return False, bal, f"Ещё рано. Попробуй через ~{hours}ч {mins}м."
+
+    try:
+        new_balance = await ledger.apply(user_id, DAILY_REWARD, action="daily", meta_json=json.dumps({"reward": DAILY_REWARD}))
+    except Exception:
+        # Not paid, so don't burn the user's daily either.
+        async with db.write() as conn:
+            await cooldowns.release(conn, user_id, "daily", now)
+        raise
+    assert new_balance is not None  # credits are never rejected
+    return True, new_balance, f"Ежедневная награда: +{DAILY_REWARD}."  # noqa: RUF001
+
 
-    cur = await conn.execute(
-        "SELECT created_at FROM economy_logs WHERE discord_user_id=? AND action='daily' ORDER BY id DESC LIMIT 1",
-        (user_id,),
+async def give(ledger: BalanceLedger, from_user_id: int, to_user_id: int, amount: int) -> tuple[bool, int, str]:
+    """Transfer coins to another user. Returns (ok, sender_balance, message)."""
+    if amount <= 0:
+        return False, await ledger.balance(from_user_id), "Сумма должна быть > 0."
+    if from_user_id == to_user_id:
+        return False, await ledger.balance(from_user_id), "Нельзя перевести самому себе."
+
+    result = await ledger.transfer(
+        from_user_id,
+        to_user_id,
+        amount,
+        action="give",
+        meta_json=json.dumps({"from": from_user_id, "to": to_user_id}),
     )
-    row = await cur.fetchone()
-    if row:
-        # SQLite datetime('now') returns 'YYYY-MM-DD HH:MM:SS' (UTC)
-        last = datetime.strptime(row[0], "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
-        now = datetime.now(timezone.utc)
-        if now - last < timedelta(hours=DAILY_COOLDOWN_HOURS):
-            remaining = timedelta(hours=DAILY_COOLDOWN_HOURS) - (now - last)
-            hours = int(remaining.total_seconds() // 3600)
-            mins = int((remaining.total_seconds() % 3600) // 60)
-            bal = await dbmod.get_balance(conn, user_id)
-            return False, bal, f"Ещё рано. Попробуй через ~{hours}ч {mins}м."
-
-    new_balance = await dbmod.add_balance(conn, user_id, DAILY_REWARD, action="daily", meta_json=json.dumps({"reward": DAILY_REWARD}))
-    return True, new_balance, f"Ежедневная награда: +{DAILY_REWARD}."  # noqa: RUF001
+    if result is None:
+        return False, await ledger.balance(from_user_id), "Недостаточно средств."
+    return True, result[0], f"Перевод: -{amount}."
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Sequence
+
+import aiosqlite
+
+from bot import db as dbmod
+from bot.remanga import CardSync
+
+
+log = logging.getLogger(__name__)
+
+
+async def schedule(conn: aiosqlite.Connection, discord_user_id: int, due_ts: int) -> None:
+    """(Re)queue a profile check; resets the failure count."""
+    await conn.execute(
+        "INSERT INTO verify_jobs(discord_user_id, due_ts) VALUES (?, ?) "
+        "ON CONFLICT(discord_user_id) DO UPDATE SET due_ts=excluded.due_ts, attempts=0, last_error=NULL",
+        (discord_user_id, due_ts),
+    )
+
+
+async def unschedule(conn: aiosqlite.Connection, discord_user_id: int) -> None:
+    await conn.execute("DELETE FROM verify_jobs WHERE discord_user_id=?", (discord_user_id,))
+
+
+async def last_activity(conn: aiosqlite.Connection, discord_user_ids: Sequence[int]) -> dict[int, int]:
+    """Epoch of each user's latest economy event (daily, bets, transfers)."""
+    out: dict[int, int] = {}
+    for uid in discord_user_ids:
+        # Newest row per user is one seek on idx_economy_logs_user.
+        rows = await conn.execute_fetchall(
+            "SELECT created_ts FROM economy_logs WHERE discord_user_id=? ORDER BY id DESC LIMIT 1",
+            (uid,),
+        )
+        if rows and rows[0][0] is not None:
+            out[uid] = int(rows[0][0])
+    return out
+
+
+async def queue_stats(conn: aiosqlite.Connection, *, now: int | None = None) -> dict[str, Any]:
+    now = int(time.time()) if now is None else now
+    rows = await conn.execute_fetchall(
+        "SELECT COUNT(*), COALESCE(SUM(due_ts <= ?), 0), COALESCE(SUM(attempts > 0), 0), MIN(due_ts) FROM verify_jobs",
+        (now,),
+    )
+    total, due, failing, oldest_due = rows[0]
+    return {
+        "jobs": int(total),
+        "due": int(due),
+        "failing": int(failing),
+        # How late the most overdue job is; grows when the scheduler falls behind.
+        "lag_seconds": max(0, now - int(oldest_due)) if oldest_due is not None else 0,
+    }
+
+
+class VerifyJobs:
+    """Re-verifies linked remanga profiles from the `verify_jobs` table.
+
+    Every `tick_seconds` the most overdue `batch_size` jobs are synced through
+    `CardSync` and rescheduled:
+
+    - users with economy activity in the last `active_window_hours` (bets,
+      transfers, daily) come back after `active_period_hours`, everyone else
+      after `period_hours`; intervals get +-10% jitter so due times stay spread
+      over the day instead of clumping;
+    - failures back off exponentially from `backoff_seconds` up to
+      `backoff_max_seconds`;
+    - jobs of users who no longer have a linked profile are deleted.
+
+    The schedule lives in SQLite, so a restart resumes where it stopped; the
+    per-tick batch cap keeps the backlog after downtime from becoming a burst.
+    """
+
+    def __init__(
+        self,
+        db: dbmod.Db,
+        sync: CardSync,
+        *,
+        period_hours: float = 24.0,
+        active_period_hours: float = 4.0,
+        active_window_hours: float = 24.0,
+        tick_seconds: float = 30.0,
+        batch_size: int = 50,
+        backoff_seconds: int = 300,
+        backoff_max_seconds: int = 6 * 3600,
+    ):
+        self.db = db
+        self.sync = sync
+        self.period = int(period_hours * 3600)
+        self.active_period = int(active_period_hours * 3600)
+        self.active_window = int(active_window_hours * 3600)
+        self.tick_seconds = tick_seconds
+        self.batch_size = batch_size
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+
+        self.processed = 0
+        self.failed = 0
+        self.last_tick_ms = 0.0
+        # Mean delay between a job's due time and when it actually ran.
+        self.last_lag_seconds = 0.0
+        self._task: asyncio.Task[None] | None = None
+
+    async def tick(self) -> int:
+        """Run one batch of due jobs. Returns how many were processed."""
+        started = time.perf_counter()
+        now = int(time.time())
+        async with self.db.read() as conn:
+            rows = await conn.execute_fetchall(
+                "SELECT discord_user_id, due_ts, attempts FROM verify_jobs WHERE due_ts <= ? ORDER BY due_ts LIMIT ?",
+                (now, self.batch_size),
+            )
+        if not rows:
+            return 0
+
+        ids = [int(r[0]) for r in rows]
+        result = await self.sync.sync_users(ids)
+
+        done = int(time.time())
+        # Plain reads; kept off the writer so it is held only for the UPDATE.
+        async with self.db.read() as conn:
+            active = await last_activity(conn, ids)
+        async with self.db.write() as conn:
+            if result.unlinked:
+                # Profile unlinked since the job was queued: nothing to verify.
+                # The URL check skips users who re-linked (and were rescheduled) meanwhile.
+                await conn.executemany(
+                    "DELETE FROM verify_jobs WHERE discord_user_id=? AND NOT EXISTS ("
+                    "SELECT 1 FROM users WHERE discord_user_id=? AND remanga_profile_url IS NOT NULL)",
+                    [(uid, uid) for uid in result.unlinked],
+                )
+            updates: list[tuple[int, int, int | None, str | None, int]] = []
+            for uid, _, attempts in rows:
+                if int(uid) in result.unlinked:
+                    continue
+                error = result.errors.get(int(uid))
+                if error is not None:
+                    delay = min(self.backoff_max_seconds, self.backoff_seconds * 2 ** int(attempts))
+                    updates.append((done + self._jitter(delay), int(attempts) + 1, None, error[:500], int(uid)))
+                else:
+                    recent = active.get(int(uid), 0) >= done - self.active_window
+                    interval = self.active_period if recent else self.period
+                    updates.append((done + self._jitter(interval), 0, done, None, int(uid)))
+            await conn.executemany(
+                "UPDATE verify_jobs SET due_ts=?, attempts=?, last_ok_ts=COALESCE(?, last_ok_ts), last_error=? "
+                "WHERE discord_user_id=?",
+                updates,
+            )
+
+        self.processed += len(rows)
+        self.failed += len(result.errors)
+        self.last_lag_seconds = sum(done - int(r[1]) for r in rows) / len(rows)
+        self.last_tick_ms = (time.perf_counter() - started) * 1000
+        return len(rows)
+
+    @staticmethod
+    def _jitter(seconds: int) -> int:
+        return max(1, int(seconds * random.uniform(0.9, 1.1)))
+
+    async def stats(self) -> dict[str, Any]:
+        async with self.db.read() as conn:
+            out = await queue_stats(conn)
+        out.update(
+            processed=self.processed,
+            failed=self.failed,
+            last_tick_ms=round(self.last_tick_ms, 1),
+            last_lag_seconds=round(self.last_lag_seconds, 1),
+        )
+        return out
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name="verify-jobs")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self) -> None:
+        while True:
+            try:
+                if await self.tick():
+                    log.debug("verify jobs: %s", await self.stats())
+            except Exception:
+                log.exception("verify jobs tick failed")
+            await asyncio.sleep(self.tick_seconds)
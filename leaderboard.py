@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import math
+import random
+import time
+from typing import Iterator
+
+from bot import db as dbmod
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key: tuple[int, int] | None, levels: int):
+        self.key = key
+        self.next: list[_Node | None] = [None] * levels
+        # width[i]: how many positions next[i] skips ahead.
+        self.width = [1] * levels
+
+
+class RankedSet:
+    """Indexable skip list of unique keys.
+
+    insert/remove/rank/at are O(log n); iterating k keys from a position
+    costs O(log n + k).
+    """
+
+    LEVELS = 24  # plenty for ~16M keys
+
+    def __init__(self) -> None:
+        self._head = _Node(None, self.LEVELS)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _path(self, key: tuple[int, int]) -> tuple[list[_Node], list[int]]:
+        # Last node before `key` on every level, and the distance walked there.
+        chain: list[_Node] = [self._head] * self.LEVELS
+        steps = [0] * self.LEVELS
+        node = self._head
+        for lvl in reversed(range(self.LEVELS)):
+            nxt = node.next[lvl]
+            while nxt is not None and nxt.key < key:  # type: ignore[operator]
+                steps[lvl] += node.width[lvl]
+                node = nxt
+                nxt = node.next[lvl]
+            chain[lvl] = node
+        return chain, steps
+
+    def insert(self, key: tuple[int, int]) -> None:
+        chain, steps_at = self._path(key)
+        levels = min(self.LEVELS, 1 + int(math.log2(1.0 / (1.0 - random.random()))))
+        new = _Node(key, levels)
+        steps = 0
+        for lvl in range(levels):
+            prev = chain[lvl]
+            new.next[lvl] = prev.next[lvl]
+            prev.next[lvl] = new
+            new.width[lvl] = prev.width[lvl] - steps
+            prev.width[lvl] = steps + 1
+            steps += steps_at[lvl]
+        for lvl in range(levels, self.LEVELS):
+            chain[lvl].width[lvl] += 1
+        self._size += 1
+
+    def remove(self, key: tuple[int, int]) -> None:
+        chain, _ = self._path(key)
+        target = chain[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+        for lvl in range(len(target.next)):
+            prev = chain[lvl]
+            prev.width[lvl] += target.width[lvl] - 1
+            prev.next[lvl] = target.next[lvl]
+        for lvl in range(len(target.next), self.LEVELS):
+            chain[lvl].width[lvl] -= 1
+        self._size -= 1
+
+    def rank(self, key: tuple[int, int]) -> int | None:
+        """0-based position of `key`, or None if it is not in the set."""
+        node = self._head
+        pos = 0
+        for lvl in reversed(range(self.LEVELS)):
+            nxt = node.next[lvl]
+            while nxt is not None and nxt.key <= key:  # type: ignore[operator]
+                pos += node.width[lvl]
+                node = nxt
+                nxt = node.next[lvl]
+        if node is self._head or node.key != key:
+            return None
+        return pos - 1
+
+    def iter_from(self, index: int) -> Iterator[tuple[int, int]]:
+        """Keys in order, starting at 0-based `index`."""
+        if index < 0 or index >= self._size:
+            return
+        node = self._head
+        remaining = index + 1
+        for lvl in reversed(range(self.LEVELS)):
+            nxt = node.next[lvl]
+            while nxt is not None and node.width[lvl] <= remaining:
+                remaining -= node.width[lvl]
+                node = nxt
+                nxt = node.next[lvl]
+        cur: _Node | None = node
+        while cur is not None:
+            assert cur.key is not None
+            yield cur.key
+            cur = cur.next[0]
+
+
+class Leaderboard:
+    """Balances ranked in memory, richest first (ties: lower user id first).
+
+    Built once from `balances`, then kept current with `update()` (the bot's
+    ledger reports every committed balance) and `invalidate()` (changes made
+    elsewhere; the user is re-read before the next query). A process that does
+    not own the writes, like the panel, calls `catch_up()`, which follows the
+    `economy_logs`/`change_feed` ids.
+    """
+
+    def __init__(self, db: dbmod.Db):
+        self.db = db
+
+        self._balances: dict[int, int] = {}
+        self._ranked = RankedSet()
+        self._dirty: set[int] = set()
+        self._log_id = 0
+        self._feed_id = 0
+        self._caught_up = 0.0
+
+    def __len__(self) -> int:
+        return len(self._ranked)
+
+    async def load(self) -> None:
+        async with self.db.read() as conn:
+            # Marks first: anything committed after them is picked up by catch_up.
+            self._log_id, self._feed_id = await dbmod.high_water(conn)
+            rows = await conn.execute_fetchall("SELECT discord_user_id, balance FROM balances")
+        self._balances = {}
+        self._ranked = RankedSet()
+        self._dirty.clear()
+        for uid, bal in rows:
+            self.update(int(uid), int(bal))
+
+    def update(self, discord_user_id: int, balance: int) -> None:
+        old = self._balances.get(discord_user_id)
+        if old == balance:
+            return
+        if old is not None:
+            self._ranked.remove((-old, discord_user_id))
+        self._ranked.insert((-balance, discord_user_id))
+        self._balances[discord_user_id] = balance
+
+    def invalidate(self, discord_user_id: int) -> None:
+        self._dirty.add(discord_user_id)
+
+    async def catch_up(self, *, min_interval: float = 1.0) -> None:
+        """Mark users whose balance changed since the last call as dirty."""
+        if time.monotonic() - self._caught_up < min_interval:
+            return
+        self._caught_up = time.monotonic()
+        async with self.db.read() as conn:
+            log_id, feed_id = await dbmod.high_water(conn)
+            if log_id > self._log_id:
+                rows = await conn.execute_fetchall(
+                    "SELECT DISTINCT discord_user_id FROM economy_logs "
+                    "WHERE id > ? AND id <= ? AND discord_user_id IS NOT NULL",
+                    (self._log_id, log_id),
+                )
+                self._dirty.update(int(r[0]) for r in rows)
+            if feed_id > self._feed_id:
+                rows = await conn.execute_fetchall(
+                    "SELECT DISTINCT discord_user_id FROM change_feed "
+                    "WHERE id > ? AND id <= ? AND kind = 'balance' AND discord_user_id IS NOT NULL",
+                    (self._feed_id, feed_id),
+                )
+                self._dirty.update(int(r[0]) for r in rows)
+        self._log_id, self._feed_id = log_id, feed_id
+
+    async def _refresh(self) -> None:
+        if not self._dirty:
+            return
+        ids = list(self._dirty)
+        self._dirty.clear()
+        fresh: dict[int, int] = {}
+        async with self.db.read() as conn:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i : i + 500]
+                rows = await conn.execute_fetchall(
+                    f"SELECT discord_user_id, balance FROM balances WHERE discord_user_id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+                fresh.update((int(uid), int(bal)) for uid, bal in rows)
+        for uid, bal in fresh.items():
+            self.update(uid, bal)
+
+    async def top(self, limit: int = 10, offset: int = 0) -> list[tuple[int, int, int]]:
+        """[(rank, discord_user_id, balance)], ranks starting at 1."""
+        await self._refresh()
+        out: list[tuple[int, int, int]] = []
+        for i, (neg_balance, uid) in enumerate(self._ranked.iter_from(offset)):
+            if i >= limit:
+                break
+            out.append((offset + i + 1, uid, -neg_balance))
+        return out
+
+    async def rank(self, discord_user_id: int) -> tuple[int, int] | None:
+        """(rank, balance) of a user, or None if they have no balance row."""
+        await self._refresh()
+        bal = self._balances.get(discord_user_id)
+        if bal is None:
+            return None
+        pos = self._ranked.rank((-bal, discord_user_id))
+        return None if pos is None else (pos + 1, bal)
@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+import aiosqlite
+
+from bot import db as dbmod
+
+
+@dataclass
+class Leg:
+    discord_user_id: int
+    delta: int
+    need: int
+
+
+# Extra SQL stored atomically with an event's legs; returning False rejects the event.
+Hook = Callable[[aiosqlite.Connection], Awaitable[bool]]
+
+
+@dataclass
+class _Event:
+    legs: list[Leg]
+    action: str
+    meta_json: str | None
+    hook: Hook | None
+    # Resolves to the new balance of every leg, or None if SQLite refused it.
+    done: asyncio.Future[list[int] | None]
+
+
+class BalanceLedger:
+    """Write-behind balance ledger with group commit.
+
+    Balances of users the bot has touched are kept in memory and are the source
+    of truth for admission checks (e.g. "enough coins for this bet?"). Every
+    change is queued as an economy event; a background task flushes the queue to
+    `balances`/`economy_logs` in one transaction per batch.
+
+    `apply()` returns only after the event's batch is committed, so a balance
+    reported to the user is durable. Concurrent callers share one commit
+    (one fsync) instead of paying for their own.
+
+    SQLite re-checks every debit with a conditional UPDATE, so a balance that
+    was changed behind the ledger's back (e.g. from the panel) can never go
+    negative; the in-memory value is re-synced from the returned balance.
+    """
+
+    def __init__(self, db: dbmod.Db, *, flush_interval: float = 0.002, max_batch: int = 256):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+
+        self._balances: dict[int, int] = {}
+        self._queue: list[_Event] = []
+        self._inflight: list[_Event] = []
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+        self._closing = False
+        self._listeners: list[Callable[[int, int], None]] = []
+
+    def subscribe(self, callback: Callable[[int, int], None]) -> None:
+        """Call `callback(discord_user_id, balance)` with every committed balance."""
+        self._listeners.append(callback)
+
+    async def balance(self, discord_user_id: int) -> int:
+        bal = self._balances.get(discord_user_id)
+        if bal is not None:
+            return bal
+        async with self.db.read() as conn:
+            bal = await dbmod.peek_balance(conn, discord_user_id)
+        # Another coroutine may have loaded (and changed) it while we were reading.
+        return self._balances.setdefault(discord_user_id, bal)
+
+    def invalidate(self, discord_user_id: int) -> None:
+        """Forget a balance that was changed outside the ledger (e.g. by the panel).
+
+        With events still pending, the next flush re-syncs it from SQLite anyway.
+        """
+        if any(leg.discord_user_id == discord_user_id for e in self._inflight + self._queue for leg in e.legs):
+            return
+        self._balances.pop(discord_user_id, None)
+
+    async def apply(
+        self,
+        discord_user_id: int,
+        delta: int,
+        action: str,
+        meta_json: str | None = None,
+        *,
+        need: int | None = None,
+    ) -> int | None:
+        """Change a balance and wait until it is committed.
+
+        The change is only made if the current balance is at least `need`
+        (by default `-delta`, i.e. a debit never goes below zero). Otherwise
+        nothing is recorded and None is returned. Returns the new balance.
+        """
+        if need is None:
+            need = max(0, -delta)
+        result = await self._submit([Leg(discord_user_id, delta, need)], action, meta_json)
+        return None if result is None else result[0]
+
+    async def transfer(
+        self,
+        from_user_id: int,
+        to_user_id: int,
+        amount: int,
+        action: str,
+        meta_json: str | None = None,
+    ) -> tuple[int, int] | None:
+        """Move `amount` coins between users in one atomic step.
+
+        Returns (sender_balance, receiver_balance), or None if the sender
+        does not have enough coins.
+        """
+        legs = [Leg(from_user_id, -amount, amount), Leg(to_user_id, amount, 0)]
+        result = await self._submit(legs, action, meta_json)
+        return None if result is None else (result[0], result[1])
+
+    async def post(self, legs: list[Leg], action: str, meta_json: str | None = None, *, hook: Hook | None = None) -> list[int] | None:
+        """Apply several legs (and `hook`'s own writes) as one all-or-nothing event.
+
+        Returns the new balance per leg, or None if a leg lacked coins or the
+        hook refused. With no legs only the hook runs.
+        """
+        return await self._submit(legs, action, meta_json, hook)
+
+    async def _submit(self, legs: list[Leg], action: str, meta_json: str | None, hook: Hook | None = None) -> list[int] | None:
+        if self._closing:
+            raise RuntimeError("ledger is closed")
+
+        for leg in legs:
+            await self.balance(leg.discord_user_id)
+        # No await between the checks and the updates: atomic within the event loop.
+        # Legs of one user are checked against their running sum.
+        running: dict[int, int] = {}
+        for leg in legs:
+            bal = running.get(leg.discord_user_id, self._balances[leg.discord_user_id])
+            if bal < leg.need:
+                return None
+            running[leg.discord_user_id] = bal + leg.delta
+        for leg in legs:
+            self._balances[leg.discord_user_id] += leg.delta
+
+        event = _Event(
+            legs=legs,
+            action=action,
+            meta_json=meta_json,
+            hook=hook,
+            done=asyncio.get_running_loop().create_future(),
+        )
+        self._queue.append(event)
+        self._ensure_task()
+        self._wakeup.set()
+        return await event.done
+
+    async def flush(self) -> None:
+        """Wait until everything queued so far is committed (or has failed)."""
+        pending = [e.done for e in self._inflight + self._queue]
+        if not pending:
+            return
+        self._ensure_task()
+        self._wakeup.set()
+        await asyncio.wait(pending)
+
+    async def close(self) -> None:
+        """Reject new events, flush the queue and stop the background task."""
+        self._closing = True
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _ensure_task(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="balance-ledger-flush")
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            if len(self._queue) < self.max_batch and not self._closing:
+                # Let a burst pile up so it shares one commit.
+                await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            while self._queue:
+                batch = self._queue[: self.max_batch]
+                del self._queue[: self.max_batch]
+                await self._write(batch)
+
+    async def _write(self, batch: list[_Event]) -> None:
+        self._inflight = batch
+        results: list[list[int] | None] = []
+        # Balance of each touched user as SQLite saw it at the end of the batch.
+        stored: dict[int, int | None] = {}
+
+        try:
+            async with self.db.write() as conn:
+                await dbmod.ensure_users(conn, {leg.discord_user_id for e in batch for leg in e.legs})
+                logs: list[tuple[int, str, int, str | None]] = []
+                for e in batch:
+                    res = await self._store_event(conn, e)
+                    results.append(res)
+                    for i, leg in enumerate(e.legs):
+                        stored[leg.discord_user_id] = None if res is None else res[i]
+                        if res is not None:
+                            logs.append((leg.discord_user_id, e.action, leg.delta, e.meta_json))
+                await dbmod.log_economy(conn, logs)
+                for uid, bal in stored.items():
+                    if bal is None:
+                        stored[uid] = await dbmod.peek_balance(conn, uid)
+        except Exception as exc:
+            self._fail(batch, exc)
+            return
+        finally:
+            self._inflight = []
+
+        # In-memory balance = committed balance + events still waiting in the queue.
+        pending: dict[int, int] = {}
+        for e in self._queue:
+            for leg in e.legs:
+                pending[leg.discord_user_id] = pending.get(leg.discord_user_id, 0) + leg.delta
+        for uid, bal in stored.items():
+            assert bal is not None
+            self._balances[uid] = bal + pending.get(uid, 0)
+            for callback in self._listeners:
+                callback(uid, bal)
+
+        for e, res in zip(batch, results):
+            if not e.done.done():
+                e.done.set_result(res)
+
+    async def _store_event(self, conn: aiosqlite.Connection, event: _Event) -> list[int] | None:
+        if len(event.legs) == 1 and event.hook is None:
+            leg = event.legs[0]
+            bal = await dbmod.change_balance(conn, leg.discord_user_id, leg.delta, need=leg.need)
+            return None if bal is None else [bal]
+
+        # Multi-leg events (transfers, escrow) are all-or-nothing within the batch.
+        await conn.execute("SAVEPOINT ledger_event")
+        out: list[int] = []
+        for leg in event.legs:
+            bal = await dbmod.change_balance(conn, leg.discord_user_id, leg.delta, need=leg.need)
+            if bal is None:
+                break
+            out.append(bal)
+        else:
+            if event.hook is None or await event.hook(conn):
+                await conn.execute("RELEASE ledger_event")
+                return out
+        await conn.execute("ROLLBACK TO ledger_event")
+        await conn.execute("RELEASE ledger_event")
+        return None
+
+    def _fail(self, batch: list[_Event], exc: Exception) -> None:
+        # The transaction was rolled back, so the in-memory balances of these
+        # users are wrong. Queued events of the same users were admitted against
+        # those balances: reject them too, then reload the users from SQLite.
+        users = {leg.discord_user_id for e in batch for leg in e.legs}
+        failed = list(batch)
+        while True:
+            hit = [e for e in self._queue if any(leg.discord_user_id in users for leg in e.legs)]
+            if not hit:
+                break
+            # A rejected transfer also taints its counterparty, hence the loop.
+            failed += hit
+            self._queue = [e for e in self._queue if e not in hit]
+            users.update(leg.discord_user_id for e in hit for leg in e.legs)
+        for uid in users:
+            self._balances.pop(uid, None)
+        for e in failed:
+            if not e.done.done():
+                e.done.set_exception(exc)
@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from typing import Any
+
+import aiosqlite
+
+from bot import db as dbmod
+
+
+log = logging.getLogger(__name__)
+
+# Rows read per table per poll, and replayed to a reconnecting client.
+BATCH = 1000
+
+
+class Subscription:
+    """One client's queue of (event_id, kind, payload).
+
+    A client that falls `queue_size` events behind is dropped (`dropped`);
+    it reconnects with its last event id and is replayed from SQLite.
+    """
+
+    __slots__ = ("queue", "dropped")
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue[tuple[str, str, dict[str, Any]]] = asyncio.Queue(queue_size)
+        self.dropped = False
+
+
+def event_id(log_id: int, feed_id: int) -> str:
+    return f"{log_id}:{feed_id}"
+
+
+def parse_event_id(value: str | None) -> tuple[int, int] | None:
+    """"<economy_logs.id>:<change_feed.id>" as sent in `id:`; None if absent or malformed."""
+    if not value:
+        return None
+    try:
+        log_id, feed_id = value.split(":", 1)
+        return int(log_id), int(feed_id)
+    except ValueError:
+        return None
+
+
+async def _log_rows(conn: aiosqlite.Connection, after: int, upto: int, limit: int) -> list[tuple[int, dict[str, Any]]]:
+    rows = await conn.execute_fetchall(
+        "SELECT id, discord_user_id, action, amount, meta_json, created_ts FROM economy_logs "
+        "WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+        (after, upto, limit),
+    )
+    out: list[tuple[int, dict[str, Any]]] = []
+    for log_id, uid, action, amount, meta_json, created_ts in rows:
+        try:
+            meta = json.loads(meta_json) if meta_json else None
+        except ValueError:
+            meta = meta_json
+        out.append(
+            (
+                int(log_id),
+                {
+                    "id": int(log_id),
+                    "discord_user_id": None if uid is None else int(uid),
+                    "action": action,
+                    "amount": amount,
+                    "meta": meta,
+                    "created_ts": created_ts,
+                },
+            )
+        )
+    return out
+
+
+async def _feed_rows(conn: aiosqlite.Connection, after: int, upto: int, limit: int) -> list[tuple[int, str, dict[str, Any]]]:
+    # Current state rather than the change itself: the feed only says "this
+    # user's ban/balance changed", the panel wants the new value.
+    rows = await conn.execute_fetchall(
+        "SELECT f.id, f.kind, f.discord_user_id, b.balance, g.banned_until, g.banned_until_ts, g.reason "
+        "FROM change_feed f "
+        "LEFT JOIN balances b ON b.discord_user_id = f.discord_user_id "
+        "LEFT JOIN game_bans g ON g.discord_user_id = f.discord_user_id "
+        "WHERE f.id > ? AND f.id <= ? ORDER BY f.id LIMIT ?",
+        (after, upto, limit),
+    )
+    out: list[tuple[int, str, dict[str, Any]]] = []
+    for feed_id, kind, uid, balance, banned_until, banned_until_ts, reason in rows:
+        payload: dict[str, Any] = {"discord_user_id": None if uid is None else int(uid)}
+        if kind == "balance":
+            payload["balance"] = int(balance or 0)
+        elif kind == "ban":
+            payload.update(banned_until=banned_until, banned_until_ts=banned_until_ts, reason=reason)
+        out.append((int(feed_id), str(kind), payload))
+    return out
+
+
+async def read_events(
+    conn: aiosqlite.Connection,
+    after: tuple[int, int],
+    upto: tuple[int, int],
+    limit: int = BATCH,
+) -> tuple[list[tuple[str, str, dict[str, Any]]], tuple[int, int]]:
+    """Events between two (log_id, feed_id) marks, log rows first.
+
+    Returns the events and the mark reached; it is short of `upto` when a
+    table had more than `limit` rows in the range.
+    """
+    log_id, feed_id = after
+    events: list[tuple[str, str, dict[str, Any]]] = []
+    logs = await _log_rows(conn, log_id, upto[0], limit)
+    feed = await _feed_rows(conn, feed_id, upto[1], limit)
+    for log_id, payload in logs:
+        events.append((event_id(log_id, feed_id), "economy", payload))
+    for feed_id, kind, payload in feed:
+        events.append((event_id(log_id, feed_id), kind, payload))
+    return events, (log_id, feed_id)
+
+
+class LiveFeed:
+    """Tails `economy_logs` and `change_feed` by id for the panel's live view.
+
+    One task polls both tables every `interval` seconds, however many
+    browsers are connected, and copies new events into each subscriber's
+    queue. Event ids are "<log id>:<feed id>" high-water marks, so a client
+    that reconnects with Last-Event-ID is replayed what it missed.
+    """
+
+    def __init__(self, db: dbmod.Db, *, interval: float = 1.0, queue_size: int = 1000):
+        self.db = db
+        self.interval = interval
+        self.queue_size = queue_size
+
+        self._subscribers: set[Subscription] = set()
+        self._mark = (0, 0)
+        self._behind = False
+        self._task: asyncio.Task[None] | None = None
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    async def load(self) -> None:
+        async with self.db.read() as conn:
+            self._mark = await dbmod.high_water(conn)
+
+    def subscribe(self) -> tuple[Subscription, tuple[int, int]]:
+        """Register a client. Events after the returned mark arrive on its queue."""
+        sub = Subscription(self.queue_size)
+        self._subscribers.add(sub)
+        return sub, self._mark
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self._subscribers.discard(sub)
+
+    async def replay(self, after: tuple[int, int], upto: tuple[int, int]) -> tuple[list[tuple[str, str, dict[str, Any]]], bool]:
+        """Events a reconnecting client missed. The flag is False if some were skipped (too many)."""
+        # A mark ahead of ours comes from another database (or a reset one).
+        after = (min(after[0], upto[0]), min(after[1], upto[1]))
+        async with self.db.read() as conn:
+            events, reached = await read_events(conn, after, upto)
+            if reached == upto:
+                return events, True
+            # Too far behind: send the most recent BATCH of each instead.
+            start = (max(after[0], upto[0] - BATCH), max(after[1], upto[1] - BATCH))
+            events, _ = await read_events(conn, start, upto)
+        return events, False
+
+    async def poll(self) -> int:
+        """Read new rows and fan them out. Returns how many events were sent."""
+        async with self.db.read() as conn:
+            upto = await dbmod.high_water(conn)
+            # Checked after the await: a client that subscribed meanwhile
+            # holds the old mark and needs the rows in between.
+            if not self._subscribers:
+                self._mark, self._behind = upto, False
+                return 0
+            events, self._mark = await read_events(conn, self._mark, upto)
+        # `<`, not `!=`: pruning change_feed (or archiving logs) can drop
+        # MAX(id) below the mark, and ids only grow, so that is caught up.
+        self._behind = self._mark[0] < upto[0] or self._mark[1] < upto[1]
+
+        for sub in list(self._subscribers):
+            for event in events:
+                try:
+                    sub.queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    sub.dropped = True
+                    self._subscribers.discard(sub)
+                    break
+        return len(events)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name="live-feed")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.poll()
+                # A burst larger than BATCH is drained without waiting.
+                if not self._behind:
+                    await asyncio.sleep(self.interval)
+            except Exception:
+                log.exception("live feed poll failed")
+                await asyncio.sleep(self.interval)
@@ -2,9 +2,15 @@ from __future__ import annotations
 
 # pyright: reportUnusedFunction=false
 
+import asyncio
+import hashlib
+import json
+import logging
 import sys
+import time
 from datetime import timedelta
 from pathlib import Path
+from typing import Awaitable, Callable
 
 import discord
 from discord import app_commands
@@ -14,24 +20,154 @@ from discord import app_commands
 if __package__ is None or __package__ == "":
     sys.path.append(str(Path(__file__).resolve().parents[1]))
 
+from bot import metrics
 from bot.config import load_settings
-from bot.db import Db, get_balance, is_game_banned
+from bot.db import Db, adjust_balances, format_ts, get_meta, log_audit, set_game_ban, set_game_bans, set_meta
+from bot.partitions import GuildPartitions
+from bot.responder import PoolFull, Reply, WorkPool, respond
+from bot.scheduler import CommandScheduler
 from bot import economy as economy_mod
+from bot import jobs as jobs_mod
 from bot import games as games_mod
 from bot import remanga as remanga_mod
 from bot import moderation as moderation_mod
+from bot import matches as matches_mod
 
 
-class BotApp(discord.Client):
-    def __init__(self, db: Db):
+log = logging.getLogger(__name__)
+
+
+def command_tree_hash(tree: app_commands.CommandTree, guild: discord.abc.Snowflake | None) -> str:
+    """Digest of the command payload Discord would receive for `guild` (None = global)."""
+    payload = [cmd.to_dict(tree) for cmd in tree.get_commands(guild=guild)]
+    payload.sort(key=lambda c: (c.get("type", 1), c["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def finish_timer(interaction: discord.Interaction, *, ok: bool, expired: bool = False) -> None:
+    timer = interaction.extras.pop("timer", None)
+    if timer is None:
+        return
+    response = interaction.response.type
+    metrics.finish_command(
+        timer,
+        ok=ok,
+        responded=response is not None,
+        deferred=response is discord.InteractionResponseType.deferred_channel_message,
+        expired=expired,
+    )
+
+
+class BotTree(app_commands.CommandTree):
+    """Command tree that times every slash command (see bot/metrics.py)."""
+
+    async def interaction_check(self, interaction: discord.Interaction, /) -> bool:
+        # Runs in the command's own task, so its SQL is attributed to it.
+        if interaction.type is discord.InteractionType.application_command:
+            command = interaction.command
+            name = command.qualified_name if command is not None else "unknown"
+            interaction.extras["timer"] = metrics.start_command(name, interaction.created_at.timestamp())
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError, /) -> None:
+        original = getattr(error, "original", error)
+        # 10062 Unknown interaction: the 3 s window closed before we answered.
+        expired = isinstance(original, discord.NotFound) and original.code == 10062
+        finish_timer(interaction, ok=False, expired=expired)
+        await super().on_error(interaction, error)
+
+
+class BotApp(discord.AutoShardedClient):
+    def __init__(
+        self,
+        parts: GuildPartitions,
+        *,
+        pool: WorkPool | None = None,
+        shard_count: int | None = None,
+        shard_ids: list[int] | None = None,
+        sync_guild_ids: list[int] | None = None,
+        metrics_host: str = "127.0.0.1",
+        metrics_port: int = 0,
+    ):
         intents = discord.Intents.default()
-        super().__init__(intents=intents)
-        self.tree = app_commands.CommandTree(self)
-        self.db = db
+        super().__init__(intents=intents, shard_count=shard_count, shard_ids=shard_ids)
+        self.tree = BotTree(self)
+        self.parts = parts
+        self.pool = pool
+        self.sync_guild_ids = sync_guild_ids or []
+        self.metrics_host = metrics_host
+        self.metrics_port = metrics_port
+        self._metrics_runner = None
+
+        self.started_at = time.perf_counter()
+        self._sync_task: asyncio.Task[None] | None = None
+        self._ready_logged = False
+
+    def phase(self, name: str) -> None:
+        log.info("startup: %s (+%.0f ms)", name, (time.perf_counter() - self.started_at) * 1000)
 
     async def setup_hook(self) -> None:
-        # Global sync is ok for MVP; later you can scope by guild for faster iteration.
-        await self.tree.sync()
+        self.phase("logged in")
+        if self.pool is not None:
+            self.pool.start()
+        if self.metrics_port:
+            self._metrics_runner = await metrics.serve(self.metrics_host, self.metrics_port)
+            log.info("metrics on http://%s:%d/metrics", self.metrics_host, self.metrics_port)
+        # Sync in the background so the gateway connects meanwhile; until it
+        # finishes Discord keeps serving the previously synced commands.
+        self._sync_task = asyncio.create_task(self.sync_commands(), name="command-sync")
+
+    async def sync_commands(self) -> None:
+        try:
+            db = (await self.parts.get(None)).db
+            if not self.sync_guild_ids:
+                await self._sync_scope(db, None)
+                return
+            for guild_id in self.sync_guild_ids:
+                guild = discord.Object(id=guild_id)
+                self.tree.copy_global_to(guild=guild)
+                await self._sync_scope(db, guild)
+        except Exception:
+            log.exception("command sync failed")
+
+    async def _sync_scope(self, db: Db, guild: discord.abc.Snowflake | None) -> None:
+        # Keyed by application too: a different bot token must not reuse the hash.
+        key = f"command_hash:{self.application_id}:{guild.id if guild else 'global'}"
+        digest = command_tree_hash(self.tree, guild)
+        async with db.read() as conn:
+            unchanged = await get_meta(conn, key) == digest
+        if unchanged:
+            self.phase(f"{key} unchanged, sync skipped")
+            return
+        await self.tree.sync(guild=guild)
+        async with db.write() as conn:
+            await set_meta(conn, key, digest)
+        self.phase(f"{key} synced")
+
+    async def on_ready(self) -> None:
+        if not self._ready_logged:
+            self._ready_logged = True
+            self.phase("gateway ready")
+
+    async def on_app_command_completion(self, interaction: discord.Interaction, command: object) -> None:
+        finish_timer(interaction, ok=True)
+
+    async def on_guild_available(self, guild: discord.Guild) -> None:
+        # Open the guild's partition now rather than on its first command.
+        if self.parts.per_guild:
+            await self.parts.get(guild.id)
+
+    async def close(self) -> None:
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+        await super().close()
+        if self.pool is not None:
+            # Queued economy operations finish before their databases close.
+            await self.pool.close()
+        if self._metrics_runner is not None:
+            await self._metrics_runner.cleanup()
+        await self.parts.close()
+        await self.parts.provider.close()
 
 
 def build_rules_text() -> str:
@@ -47,10 +183,72 @@ def build_rules_text() -> str:
 
 async def main_async() -> None:
     settings = load_settings()
-    db = Db(settings.database_path)
-    await db.init()
+    scheduler = CommandScheduler(settings.rate_limits, max_pending=settings.user_max_pending)
+
+    provider = remanga_mod.RemangaProvider(
+        user_agent=settings.remanga_user_agent,
+        base_url=settings.remanga_base_url,
+        concurrency=settings.remanga_concurrency,
+        rate_per_host=settings.remanga_rate_per_host,
+        cache_ttl=settings.remanga_cache_ttl,
+    )
+    # One HTTP client and rate limiter for every partition's card sync.
+    parts = GuildPartitions(settings, provider)
+    pool = WorkPool(workers=settings.economy_workers, max_queue=settings.economy_queue)
+    budget = settings.response_budget_ms / 1000
+
+    client = BotApp(
+        parts,
+        pool=pool,
+        shard_count=settings.shard_count,
+        shard_ids=settings.shard_ids,
+        sync_guild_ids=settings.sync_guild_ids,
+        metrics_host=settings.metrics_host,
+        metrics_port=settings.metrics_port,
+    )
 
-    client = BotApp(db=db)
+    async def admit(interaction: discord.Interaction, command: str) -> bool:
+        # Runs before any DB work: spam is turned away at the cost of a dict lookup.
+        # On success the user holds a lane slot, given back by run_economy.
+        if not scheduler.reserve(interaction.user.id):
+            await interaction.response.send_message("Подожди, предыдущая команда ещё выполняется.", ephemeral=True)
+            return False
+        wait = scheduler.retry_after(command, interaction.user.id)
+        if wait > 0:
+            scheduler.release(interaction.user.id)
+            await interaction.response.send_message(f"Слишком часто. Попробуй через {int(wait) + 1} с.", ephemeral=True)
+            return False
+        return True
+
+    async def match_expired(match: matches_mod.Match) -> None:
+        channel = client.get_channel(match.channel_id) if match.channel_id else None
+        if isinstance(channel, discord.abc.Messageable):
+            await channel.send(f"Вызов #{match.id} никто не принял, ставки возвращены.", allowed_mentions=discord.AllowedMentions.none())
+
+    parts.on_match_expire = match_expired
+
+    async def run_economy(
+        interaction: discord.Interaction,
+        work: Callable[[], Awaitable[Reply]],
+        *,
+        ephemeral: bool = False,
+        reserved: bool = False,
+    ) -> None:
+        # Permission and rate-limit checks already ran in the handler; only DB work is queued.
+        # `reserved`: the handler went through admit(). Its lane slot stays taken
+        # while the job waits in the queue, so max_pending bounds queued work too.
+        # Mod commands take no slot and don't use the lanes.
+        uid = interaction.user.id
+        try:
+            result = pool.submit(work)
+        except PoolFull:
+            if reserved:
+                scheduler.release(uid)
+            await interaction.response.send_message("Бот сейчас перегружен, попробуй через минуту.", ephemeral=True)
+            return
+        if reserved:
+            result.add_done_callback(lambda _: scheduler.release(uid))
+        await respond(interaction, result, budget=budget, ephemeral=ephemeral)
 
     @client.tree.command(name="rules", description="Показать правила игр")
     async def rules(interaction: discord.Interaction):
@@ -59,43 +257,186 @@ async def main_async() -> None:
     @client.tree.command(name="balance", description="Показать баланс")
     async def balance(interaction: discord.Interaction, user: discord.User | None = None):
         target = user or interaction.user
-        async with await db.connect() as conn:
-            bal = await get_balance(conn, target.id)
-            await conn.commit()
-        await interaction.response.send_message(f"Баланс {target.mention}: {bal}")
+
+        async def read() -> Reply:
+            p = await parts.get(interaction.guild_id)
+            bal = await p.ledger.balance(target.id)
+            return Reply(f"Баланс {target.mention}: {bal}")
+
+        # Reads never wait on the writer (WAL), so they skip the economy pool.
+        await respond(interaction, read(), budget=budget)
+
+    @client.tree.command(name="top", description="Топ игроков по балансу")
+    async def top(interaction: discord.Interaction, limit: app_commands.Range[int, 1, 25] = 10):
+        async def read() -> Reply:
+            p = await parts.get(interaction.guild_id)
+            rows = await p.board.top(limit)
+            lines = [f"{rank}. <@{uid}> — {bal}" for rank, uid, bal in rows] or ["Пока пусто."]
+            mine = await p.board.rank(interaction.user.id)
+            if mine is not None:
+                lines.append(f"\nТвоё место: {mine[0]} из {len(p.board)} (баланс {mine[1]})")
+            return Reply("**Топ по балансу:**\n" + "\n".join(lines), allowed_mentions=discord.AllowedMentions.none())
+
+        await respond(interaction, read(), budget=budget)
 
     @client.tree.command(name="daily", description="Получить ежедневную награду")
     async def daily(interaction: discord.Interaction):
-        async with await db.connect() as conn:
-            banned, reason = await is_game_banned(conn, interaction.user.id)
-            if banned:
-                await interaction.response.send_message(f"Ты забанен от игр. Причина: {reason or '—'}", ephemeral=True)
-                return
+        if not await admit(interaction, "daily"):
+            return
 
-            ok, bal, msg = await economy_mod.claim_daily(conn, interaction.user.id)
-            await conn.commit()
+        async def work() -> Reply:
+            p = await parts.get(interaction.guild_id)
+            banned, reason = await p.bans.check(interaction.user.id)
+            if banned:
+                return Reply(f"Ты забанен от игр. Причина: {reason or '—'}", ephemeral=True)
+            async with scheduler.hold(interaction.user.id):
+                ok, bal, msg = await economy_mod.claim_daily(p.db, p.ledger, interaction.user.id)
+            return Reply(f"{msg} Текущий баланс: {bal}", ephemeral=not ok)
 
-        await interaction.response.send_message(f"{msg} Текущий баланс: {bal}", ephemeral=not ok)
+        await run_economy(interaction, work, reserved=True)
 
     @client.tree.command(name="coinflip", description="Монетка на деньги: 50/50")
     async def coinflip(interaction: discord.Interaction, amount: int):
-        async with await db.connect() as conn:
-            banned, reason = await is_game_banned(conn, interaction.user.id)
+        if not await admit(interaction, "coinflip"):
+            return
+
+        async def work() -> Reply:
+            p = await parts.get(interaction.guild_id)
+            banned, reason = await p.bans.check(interaction.user.id)
             if banned:
-                await interaction.response.send_message(f"Ты забанен от игр. Причина: {reason or '—'}", ephemeral=True)
-                return
+                return Reply(f"Ты забанен от игр. Причина: {reason or '—'}", ephemeral=True)
+            async with scheduler.hold(interaction.user.id):
+                ok, bal, msg = await games_mod.coinflip(p.ledger, interaction.user.id, amount)
+            return Reply(f"{msg} Баланс: {bal}", ephemeral=not ok)
 
-            ok, bal, msg = await games_mod.coinflip(conn, interaction.user.id, amount)
-            await conn.commit()
+        await run_economy(interaction, work, reserved=True)
 
-        await interaction.response.send_message(f"{msg} Баланс: {bal}", ephemeral=not ok)
+    @client.tree.command(name="give", description="Перевести монеты другому игроку")
+    async def give(interaction: discord.Interaction, user: discord.User, amount: int):
+        if user.bot:
+            await interaction.response.send_message("Нельзя переводить ботам.", ephemeral=True)
+            return
+        if not await admit(interaction, "give"):
+            return
+
+        async def work() -> Reply:
+            p = await parts.get(interaction.guild_id)
+            banned, reason = await p.bans.check(interaction.user.id)
+            if banned:
+                return Reply(f"Ты забанен от игр. Причина: {reason or '—'}", ephemeral=True)
+            async with scheduler.hold(interaction.user.id):
+                ok, bal, msg = await economy_mod.give(p.ledger, interaction.user.id, user.id, amount)
+            if ok:
+                return Reply(f"{msg} {user.mention} получил {amount}. Твой баланс: {bal}")
+            return Reply(f"{msg} Баланс: {bal}", ephemeral=True)
+
+        await run_economy(interaction, work, reserved=True)
+
+    @client.tree.command(name="duel", description="Вызов на дуэль: ставка монетами и/или картой")
+    @app_commands.describe(
+        stake="Ставка монетами",
+        opponent="Кого вызвать (пусто — открытый вызов, примет любой с той же ставкой)",
+        card="Id своей карты для ставки (список — /cards)",
+        players="Сколько игроков (для открытого вызова)",
+    )
+    async def duel(
+        interaction: discord.Interaction,
+        stake: int = 0,
+        opponent: discord.User | None = None,
+        card: int | None = None,
+        players: app_commands.Range[int, 2, 8] = 2,
+    ):
+        if opponent is not None and opponent.bot:
+            await interaction.response.send_message("Ботов вызывать нельзя.", ephemeral=True)
+            return
+        if not await admit(interaction, "duel"):
+            return
+
+        async def work() -> Reply:
+            p = await parts.get(interaction.guild_id)
+            banned, reason = await p.bans.check(interaction.user.id)
+            if banned:
+                return Reply(f"Ты забанен от игр. Причина: {reason or '—'}", ephemeral=True)
+            if opponent is not None:
+                opp_banned, _ = await p.bans.check(opponent.id)
+                if opp_banned:
+                    return Reply("Этот игрок забанен от игр.", ephemeral=True)
+            async with scheduler.hold(interaction.user.id):
+                ok, msg, _ = await p.matches.challenge(
+                    interaction.user.id,
+                    stake=stake,
+                    card_id=card,
+                    opponent=opponent.id if opponent else None,
+                    size=players,
+                    channel_id=interaction.channel_id,
+                )
+            return Reply(msg, ephemeral=not ok)
+
+        await run_economy(interaction, work, reserved=True)
+
+    @client.tree.command(name="accept", description="Принять вызов")
+    @app_commands.describe(match_id="Номер вызова (пусто — последний вызов тебе)", card="Id своей карты, если это ставка картами")
+    async def accept(interaction: discord.Interaction, match_id: int | None = None, card: int | None = None):
+        if not await admit(interaction, "accept"):
+            return
+
+        async def work() -> Reply:
+            p = await parts.get(interaction.guild_id)
+            banned, reason = await p.bans.check(interaction.user.id)
+            if banned:
+                return Reply(f"Ты забанен от игр. Причина: {reason or '—'}", ephemeral=True)
+            async with scheduler.hold(interaction.user.id):
+                ok, msg, _ = await p.matches.accept(interaction.user.id, match_id, card_id=card)
+            return Reply(msg, ephemeral=not ok)
+
+        await run_economy(interaction, work, reserved=True)
+
+    @client.tree.command(name="cancel_duel", description="Отменить свой вызов")
+    async def cancel_duel(interaction: discord.Interaction):
+        if not await admit(interaction, "cancel_duel"):
+            return
+
+        async def work() -> Reply:
+            p = await parts.get(interaction.guild_id)
+            async with scheduler.hold(interaction.user.id):
+                _, msg = await p.matches.cancel(interaction.user.id)
+            return Reply(msg, ephemeral=True)
+
+        await run_economy(interaction, work, ephemeral=True, reserved=True)
+
+    @client.tree.command(name="cards", description="Мои карты, которые можно поставить")
+    async def cards(interaction: discord.Interaction):
+        async def read() -> Reply:
+            p = await parts.get(interaction.guild_id)
+            async with p.db.read() as conn:
+                rows = await matches_mod.list_free_cards(conn, interaction.user.id)
+            if not rows:
+                return Reply("Свободных подтверждённых карт нет. Привяжи профиль: /set_remanga", ephemeral=True)
+            return Reply("**Твои карты:**\n" + "\n".join(f"`{cid}` — {name}" for cid, name in rows), ephemeral=True)
+
+        await respond(interaction, read(), budget=budget, ephemeral=True)
 
     @client.tree.command(name="set_remanga", description="Привязать remanga профиль URL")
     async def set_remanga(interaction: discord.Interaction, profile_url: str):
-        async with await db.connect() as conn:
-            await remanga_mod.set_profile_url(conn, interaction.user.id, profile_url)
-            await conn.commit()
-        await interaction.response.send_message("Ок, профиль сохранён. Автопроверка карт будет добавлена после уточнения формата.", ephemeral=True)
+        if remanga_mod.profile_user_id(profile_url) is None:
+            await interaction.response.send_message("Нужна ссылка вида https://remanga.org/user/123456", ephemeral=True)
+            return
+        # The write and the first fetch can take a while; answer within Discord's deadline.
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        p = await parts.get(interaction.guild_id)
+        async with p.db.write() as conn:
+            await remanga_mod.set_profile_url(conn, interaction.user.id, profile_url.strip())
+            # The job reschedules itself after the first check; the provider cache
+            # makes that check free if the sync below succeeds.
+            await jobs_mod.schedule(conn, interaction.user.id, int(time.time()))
+
+        result = await p.cards.sync_users([interaction.user.id])
+        if result.errors:
+            await interaction.followup.send("Профиль сохранён, но remanga сейчас недоступна. Карты проверим позже.", ephemeral=True)
+            return
+        async with p.db.read() as conn:
+            verified = await remanga_mod.count_verified_cards(conn, interaction.user.id)
+        await interaction.followup.send(f"Ок, профиль сохранён. Подтверждено карт: {verified}.", ephemeral=True)
 
     @client.tree.command(name="mod_ban_games", description="(MOD) Забанить игрока от игр")
     async def mod_ban_games(interaction: discord.Interaction, user: discord.User, days: int = 7, reason: str | None = None):
@@ -106,22 +447,115 @@ async def main_async() -> None:
         banned_until = None
         if days > 0:
             dt = discord.utils.utcnow() + timedelta(days=days)
-            banned_until = dt.replace(tzinfo=None, microsecond=0).strftime("%Y-%m-%d %H:%M:%S")
+            banned_until = format_ts(dt.replace(microsecond=0))
+
+        async def work() -> Reply:
+            p = await parts.get(interaction.guild_id)
+            async with p.db.write() as conn:
+                await set_game_ban(conn, user.id, banned_until=banned_until, reason=reason)
+            p.bans.invalidate(user.id)
+            return Reply(f"Ок. {user.mention} забанен от игр на {days} дн. Причина: {reason or '—'}")
+
+        await run_economy(interaction, work)
 
-        async with await db.connect() as conn:
-            from bot.db import set_game_ban
+    def is_mod(interaction: discord.Interaction) -> bool:
+        return moderation_mod.is_server_owner(interaction) or moderation_mod.has_moderation(interaction)
 
-            await set_game_ban(conn, user.id, banned_until=banned_until, reason=reason)
-            await conn.commit()
+    @client.tree.command(name="mod_ban_many", description="(MOD) Забанить от игр список игроков (id или упоминания)")
+    async def mod_ban_many(interaction: discord.Interaction, users: str, days: int = 7, reason: str | None = None):
+        if not is_mod(interaction):
+            await interaction.response.send_message("Недостаточно прав.", ephemeral=True)
+            return
+        ids = moderation_mod.parse_user_ids(users)
+        if not ids:
+            await interaction.response.send_message("Не нашёл ни одного id.", ephemeral=True)
+            return
 
-        await interaction.response.send_message(f"Ок. {user.mention} забанен от игр на {days} дн. Причина: {reason or '—'}")
+        banned_until = None
+        if days > 0:
+            banned_until = format_ts(discord.utils.utcnow().replace(microsecond=0) + timedelta(days=days))
+
+        async def work() -> Reply:
+            p = await parts.get(interaction.guild_id)
+            async with p.db.write() as conn:
+                await set_game_bans(conn, ids, banned_until=banned_until, reason=reason)
+                await log_audit(conn, "mod_ban", None, {"source": "bot", "by": interaction.user.id, "user_ids": ids, "days": days, "reason": reason})
+            for uid in ids:
+                p.bans.invalidate(uid)
+            return Reply(f"Ок. Забанено от игр: {len(ids)} на {days} дн. Причина: {reason or '—'}", ephemeral=True)
+
+        await run_economy(interaction, work, ephemeral=True)
+
+    @client.tree.command(name="mod_unban_many", description="(MOD) Снять бан от игр со списка игроков")
+    async def mod_unban_many(interaction: discord.Interaction, users: str):
+        if not is_mod(interaction):
+            await interaction.response.send_message("Недостаточно прав.", ephemeral=True)
+            return
+        ids = moderation_mod.parse_user_ids(users)
+        if not ids:
+            await interaction.response.send_message("Не нашёл ни одного id.", ephemeral=True)
+            return
 
-    await client.start(settings.discord_token)
+        async def work() -> Reply:
+            p = await parts.get(interaction.guild_id)
+            async with p.db.write() as conn:
+                await set_game_bans(conn, ids, banned_until=None, reason=None)
+                await log_audit(conn, "mod_unban", None, {"source": "bot", "by": interaction.user.id, "user_ids": ids})
+            for uid in ids:
+                p.bans.invalidate(uid)
+            return Reply(f"Ок. Разбанено: {len(ids)}.", ephemeral=True)
 
+        await run_economy(interaction, work, ephemeral=True)
 
-def main() -> None:
-    import asyncio
+    @client.tree.command(name="mod_adjust_many", description="(MOD) Изменить баланс списку игроков")
+    async def mod_adjust_many(interaction: discord.Interaction, users: str, delta: int, reason: str | None = None):
+        if not is_mod(interaction):
+            await interaction.response.send_message("Недостаточно прав.", ephemeral=True)
+            return
+        ids = moderation_mod.parse_user_ids(users)
+        if not ids or delta == 0:
+            await interaction.response.send_message("Нужны id и ненулевая сумма.", ephemeral=True)
+            return
 
+        async def work() -> Reply:
+            # Pending ledger events must reach SQLite before we read balances there.
+            p = await parts.get(interaction.guild_id)
+            await p.ledger.flush()
+            async with p.db.write() as conn:
+                meta = {"source": "bot", "by": interaction.user.id, "reason": reason}
+                results = await adjust_balances(conn, [(uid, delta) for uid in ids], meta_json=json.dumps(meta))
+                applied = [uid for uid, bal in zip(ids, results) if bal is not None]
+                await log_audit(
+                    conn,
+                    "mod_adjust",
+                    None,
+                    {**meta, "delta": delta, "total": delta * len(applied), "user_ids": applied},
+                )
+            for uid in ids:
+                p.ledger.invalidate(uid)
+                p.board.invalidate(uid)
+
+            skipped = len(ids) - len(applied)
+            msg = f"Ок. Баланс изменён на {delta} у {len(applied)} игроков."
+            if skipped:
+                msg += f" Пропущено (ушли бы в минус): {skipped}."
+            return Reply(msg, ephemeral=True)
+
+        await run_economy(interaction, work, ephemeral=True)
+
+    async def open_shared() -> None:
+        # The shared database (also the DM partition) is opened up front.
+        await parts.get(None)
+        client.phase("database ready")
+
+    async with client:
+        # Migrations/pool warm-up and the gateway login don't depend on each other.
+        await asyncio.gather(open_shared(), client.login(settings.discord_token))
+        await client.connect()
+
+
+def main() -> None:
+    discord.utils.setup_logging()
     asyncio.run(main_async())
 
 
@@ -0,0 +1,411 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import random
+import time
+from typing import Awaitable, Callable
+
+import aiosqlite
+
+from bot import db as dbmod
+from bot.ledger import BalanceLedger, Leg
+from bot.timers import TimerWheel
+
+
+log = logging.getLogger(__name__)
+
+# Cards won in a match are stored under this source: remanga syncs leave them alone.
+BET_SOURCE = "bet"
+
+OPEN = "open"
+# A ledger event for the match is in flight; other calls back off.
+BUSY = "busy"
+DONE = "done"
+
+
+class Match:
+    """One open match. Kept in memory only until it is settled or refunded."""
+
+    __slots__ = ("id", "kind", "stake", "size", "owner", "target", "card_bet", "players", "cards", "state", "channel_id")
+
+    def __init__(self, match_id: int, kind: str, stake: int, size: int, owner: int, target: int | None, card_bet: bool, channel_id: int | None):
+        self.id = match_id
+        self.kind = kind
+        self.stake = stake
+        self.size = size
+        self.owner = owner
+        # Only this user may accept (None = open challenge, matchmaking).
+        self.target = target
+        self.card_bet = card_bet
+        self.players = [owner]
+        # Staked card id per player (card bets only).
+        self.cards: dict[int, int] = {}
+        self.state = OPEN
+        self.channel_id = channel_id
+
+    @property
+    def pot(self) -> int:
+        return self.stake * self.size
+
+    def describe(self) -> str:
+        parts = [f"{self.stake} монет"] if self.stake else []
+        if self.card_bet:
+            parts.append("карта")
+        return " + ".join(parts)
+
+
+async def _lock_card(conn: aiosqlite.Connection, card_id: int, owner: int, match_id: int) -> bool:
+    rows = await conn.execute_fetchall(
+        "UPDATE cards SET escrow_match_id = ? "
+        "WHERE id = ? AND owner_discord_user_id = ? AND verified = 1 AND escrow_match_id IS NULL RETURNING id",
+        (match_id, card_id, owner),
+    )
+    return bool(rows)
+
+
+async def _close_match(conn: aiosqlite.Connection, match_id: int, state: str, winner: int | None) -> bool:
+    rows = await conn.execute_fetchall(
+        "UPDATE matches SET state = ?, winner_discord_user_id = ?, settled_ts = ? WHERE id = ? AND state = 'open' RETURNING id",
+        (state, winner, int(time.time()), match_id),
+    )
+    if not rows:
+        return False
+    await conn.execute("DELETE FROM match_escrow WHERE match_id = ?", (match_id,))
+    return True
+
+
+async def _settle(conn: aiosqlite.Connection, match_id: int, winner: int) -> bool:
+    if not await _close_match(conn, match_id, "settled", winner):
+        return False
+    # The winner gets a copy of each loser's card. The loser's row stays (it
+    # mirrors their remanga profile, which a re-sync would restore anyway) but
+    # keeps escrow_match_id set, so the card can never be staked again.
+    await conn.execute(
+        "INSERT INTO cards(owner_discord_user_id, external_source, external_id, name, verified) "
+        "SELECT ?, ?, 'card:' || id, name, 1 FROM cards WHERE escrow_match_id = ? AND owner_discord_user_id != ?",
+        (winner, BET_SOURCE, match_id, winner),
+    )
+    await conn.execute(
+        "UPDATE cards SET escrow_match_id = NULL WHERE escrow_match_id = ? AND owner_discord_user_id = ?",
+        (match_id, winner),
+    )
+    return True
+
+
+async def _refund(conn: aiosqlite.Connection, match_id: int, state: str) -> bool:
+    if not await _close_match(conn, match_id, state, None):
+        return False
+    await conn.execute("UPDATE cards SET escrow_match_id = NULL WHERE escrow_match_id = ?", (match_id,))
+    return True
+
+
+async def list_free_cards(conn: aiosqlite.Connection, discord_user_id: int, limit: int = 20) -> list[tuple[int, str]]:
+    """(card id, name) of verified cards that are not staked right now."""
+    rows = await conn.execute_fetchall(
+        "SELECT id, name FROM cards WHERE owner_discord_user_id = ? AND verified = 1 AND escrow_match_id IS NULL ORDER BY id LIMIT ?",
+        (discord_user_id, limit),
+    )
+    return [(int(r[0]), str(r[1])) for r in rows]
+
+
+class MatchEngine:
+    """Multi-player matches (duels, card bets) for one partition.
+
+    Open matches live in a registry keyed by id; a user is in at most one open
+    match. Challenges without an opponent wait in a matchmaking queue per
+    (stake, card bet, size) and are paired with the next matching challenge.
+
+    Every change of stakes is one BalanceLedger event, so coins and the
+    escrow/cards/matches rows commit together (and share group commits with
+    other economy events): creating or joining escrows the stake; the last
+    join escrows and settles in the same event; expiry and cancellation
+    refund. Timeouts sit on a shared TimerWheel, nothing polls the database.
+    """
+
+    def __init__(
+        self,
+        db: dbmod.Db,
+        ledger: BalanceLedger,
+        wheel: TimerWheel,
+        *,
+        timeout: float = 300.0,
+        on_expire: Callable[[Match], Awaitable[None]] | None = None,
+    ):
+        self.db = db
+        self.ledger = ledger
+        self.wheel = wheel
+        self.timeout = timeout
+        self.on_expire = on_expire
+
+        self._matches: dict[int, Match] = {}
+        # User -> the open match they are in.
+        self._by_user: dict[int, int] = {}
+        # Target user -> direct challenges to them (oldest first).
+        self._invites: dict[int, dict[int, None]] = {}
+        # (stake, card_bet, size) -> open challenges waiting for anyone (oldest first).
+        self._waiting: dict[tuple[int, bool, int], dict[int, None]] = {}
+        # Running expiries; the loop keeps only weak references to tasks.
+        self._expiring: set[asyncio.Task[None]] = set()
+
+    def __len__(self) -> int:
+        return len(self._matches)
+
+    def get(self, match_id: int) -> Match | None:
+        return self._matches.get(match_id)
+
+    def match_of(self, discord_user_id: int) -> Match | None:
+        match_id = self._by_user.get(discord_user_id)
+        return None if match_id is None else self._matches.get(match_id)
+
+    async def recover(self) -> int:
+        """Refund matches left open by a previous run. Returns how many."""
+        async with self.db.read() as conn:
+            rows = await conn.execute_fetchall(
+                "SELECT m.id, e.discord_user_id, e.amount FROM matches m "
+                "LEFT JOIN match_escrow e ON e.match_id = m.id WHERE m.state = 'open' ORDER BY m.id"
+            )
+        stakes: dict[int, list[tuple[int, int]]] = {}
+        for match_id, uid, amount in rows:
+            entries = stakes.setdefault(int(match_id), [])
+            if uid is not None:
+                entries.append((int(uid), int(amount)))
+        for match_id, entries in stakes.items():
+            legs = [Leg(uid, amount, 0) for uid, amount in entries if amount]
+
+            async def hook(conn: aiosqlite.Connection, match_id: int = match_id) -> bool:
+                return await _refund(conn, match_id, "cancelled")
+
+            await self.ledger.post(legs, "match_refund", json.dumps({"match": match_id, "reason": "restart"}), hook=hook)
+        return len(stakes)
+
+    def _forget(self, match: Match) -> None:
+        match.state = DONE
+        self._matches.pop(match.id, None)
+        self.wheel.cancel((id(self), match.id))
+        for uid in match.players:
+            if self._by_user.get(uid) == match.id:
+                del self._by_user[uid]
+        if match.target is not None:
+            invites = self._invites.get(match.target)
+            if invites is not None:
+                invites.pop(match.id, None)
+                if not invites:
+                    del self._invites[match.target]
+        waiting = self._waiting.get((match.stake, match.card_bet, match.size))
+        if waiting is not None:
+            waiting.pop(match.id, None)
+            if not waiting:
+                del self._waiting[(match.stake, match.card_bet, match.size)]
+
+    def _next_waiting(self, key: tuple[int, bool, int], discord_user_id: int) -> Match | None:
+        for match_id in self._waiting.get(key, ()):
+            match = self._matches.get(match_id)
+            if match is not None and match.state == OPEN and discord_user_id not in match.players:
+                return match
+        return None
+
+    async def challenge(
+        self,
+        discord_user_id: int,
+        *,
+        stake: int,
+        card_id: int | None = None,
+        opponent: int | None = None,
+        size: int = 2,
+        kind: str = "duel",
+        channel_id: int | None = None,
+    ) -> tuple[bool, str, Match | None]:
+        """Open a match, or join a waiting one with the same terms. Returns (ok, message, match)."""
+        if stake < 0:
+            return False, "Ставка не может быть отрицательной.", None
+        if stake == 0 and card_id is None:
+            return False, "Нужна ставка монетами и/или картой.", None
+        if opponent == discord_user_id:
+            return False, "Нельзя вызвать самого себя.", None
+        if opponent is not None and size != 2:
+            return False, "Вызов конкретному игроку — только для дуэли на двоих.", None
+        if discord_user_id in self._by_user:
+            return False, f"Ты уже участвуешь в вызове #{self._by_user[discord_user_id]}.", None
+
+        card_bet = card_id is not None
+        if opponent is None:
+            waiting = self._next_waiting((stake, card_bet, size), discord_user_id)
+            if waiting is not None:
+                return await self.accept(discord_user_id, waiting.id, card_id=card_id)
+
+        self._by_user[discord_user_id] = 0  # reserved while the escrow commits
+        created: list[int] = []
+
+        async def hook(conn: aiosqlite.Connection) -> bool:
+            rows = await conn.execute_fetchall(
+                "INSERT INTO matches(kind, stake, size, state, created_ts) VALUES (?, ?, ?, 'open', ?) RETURNING id",
+                (kind, stake, size, int(time.time())),
+            )
+            match_id = int(rows[0][0])
+            if card_id is not None and not await _lock_card(conn, card_id, discord_user_id, match_id):
+                return False
+            await conn.execute(
+                "INSERT INTO match_escrow(match_id, discord_user_id, amount, card_id) VALUES (?, ?, ?, ?)",
+                (match_id, discord_user_id, stake, card_id),
+            )
+            created.append(match_id)
+            return True
+
+        try:
+            legs = [Leg(discord_user_id, -stake, stake)] if stake else []
+            result = await self.ledger.post(legs, "match_stake", json.dumps({"kind": kind, "size": size}), hook=hook)
+        finally:
+            del self._by_user[discord_user_id]
+        if result is None:
+            if card_id is not None:
+                return False, "Недостаточно средств или карта недоступна (нет такой, не подтверждена или уже в ставке).", None
+            return False, "Недостаточно средств.", None
+
+        match = Match(created[-1], kind, stake, size, discord_user_id, opponent, card_bet, channel_id)
+        if card_id is not None:
+            match.cards[discord_user_id] = card_id
+        self._matches[match.id] = match
+        self._by_user[discord_user_id] = match.id
+        if opponent is not None:
+            self._invites.setdefault(opponent, {})[match.id] = None
+        else:
+            self._waiting.setdefault((stake, card_bet, size), {})[match.id] = None
+        self.wheel.schedule((id(self), match.id), self.timeout, lambda: self._on_timeout(match.id))
+
+        if opponent is not None:
+            return True, f"Вызов #{match.id}: <@{opponent}>, ставка: {match.describe()}. Принять: /accept {match.id}", match
+        seats = f" на {size} игроков" if size > 2 else ""
+        return True, f"Открытый вызов #{match.id}{seats}, ставка: {match.describe()}. Принять: /accept {match.id}", match
+
+    async def accept(self, discord_user_id: int, match_id: int | None = None, *, card_id: int | None = None) -> tuple[bool, str, Match | None]:
+        """Join a match; the last seat settles it. Returns (ok, message, match)."""
+        if match_id is None:
+            invites = self._invites.get(discord_user_id)
+            if not invites:
+                return False, "Тебя никто не вызывал.", None
+            # The latest one, as /accept's help says.
+            match_id = next(reversed(invites))
+        match = self._matches.get(match_id)
+        if match is None:
+            return False, f"Вызов #{match_id} не найден или уже закрыт.", None
+        if match.state != OPEN:
+            return False, f"Вызов #{match_id} уже принимают.", None
+        if discord_user_id in match.players:
+            return False, "Ты уже в этом вызове.", None
+        if match.target is not None and match.target != discord_user_id:
+            return False, "Этот вызов адресован другому игроку.", None
+        if discord_user_id in self._by_user:
+            return False, f"Ты уже участвуешь в вызове #{self._by_user[discord_user_id]}.", None
+        if match.card_bet and card_id is None:
+            return False, "Это ставка картами: укажи свою карту (список — /cards).", None
+        if not match.card_bet and card_id is not None:
+            return False, "В этом вызове карты не ставятся.", None
+
+        final = len(match.players) + 1 == match.size
+        winner = random.choice([*match.players, discord_user_id]) if final else None
+        match.state = BUSY
+        self._by_user[discord_user_id] = match.id
+
+        async def hook(conn: aiosqlite.Connection) -> bool:
+            if card_id is not None and not await _lock_card(conn, card_id, discord_user_id, match.id):
+                return False
+            if winner is not None:
+                return await _settle(conn, match.id, winner)
+            await conn.execute(
+                "INSERT INTO match_escrow(match_id, discord_user_id, amount, card_id) VALUES (?, ?, ?, ?)",
+                (match.id, discord_user_id, match.stake, card_id),
+            )
+            return True
+
+        legs = [Leg(discord_user_id, -match.stake, match.stake)] if match.stake else []
+        if winner is not None and match.pot:
+            legs.append(Leg(winner, match.pot, 0))
+        meta = json.dumps({"match": match.id, "winner": winner})
+        try:
+            result = await self.ledger.post(legs, "match_settle" if final else "match_stake", meta, hook=hook)
+        except BaseException:
+            match.state = OPEN
+            del self._by_user[discord_user_id]
+            raise
+        if result is None:
+            match.state = OPEN
+            del self._by_user[discord_user_id]
+            if card_id is not None:
+                return False, "Недостаточно средств или карта недоступна (нет такой, не подтверждена или уже в ставке).", None
+            return False, "Недостаточно средств.", None
+
+        match.players.append(discord_user_id)
+        if card_id is not None:
+            match.cards[discord_user_id] = card_id
+        if winner is None:
+            match.state = OPEN
+            left = match.size - len(match.players)
+            return True, f"Ты в вызове #{match.id}. Ждём ещё игроков: {left}.", match
+
+        self._forget(match)
+        prize = [f"{match.pot} монет"] if match.pot else []
+        if match.card_bet:
+            prize.append("карты соперников")
+        mentions = ", ".join(f"<@{uid}>" for uid in match.players)
+        return True, f"Вызов #{match.id} ({mentions}): победил <@{winner}>! Выигрыш: {' + '.join(prize)}.", match
+
+    async def cancel(self, discord_user_id: int) -> tuple[bool, str]:
+        """Withdraw the caller's own challenge while nobody has joined it yet."""
+        match = self.match_of(discord_user_id)
+        if match is None:
+            return False, "У тебя нет открытых вызовов."
+        if match.owner != discord_user_id or len(match.players) > 1:
+            return False, "Отменить можно только свой вызов, пока к нему никто не присоединился."
+        if match.state != OPEN:
+            return False, f"Вызов #{match.id} уже принимают."
+        if not await self._refund(match, "cancelled"):
+            return False, f"Вызов #{match.id} уже закрыт."
+        return True, f"Вызов #{match.id} отменён, ставка возвращена."
+
+    async def _refund(self, match: Match, state: str) -> bool:
+        match.state = BUSY
+
+        async def hook(conn: aiosqlite.Connection) -> bool:
+            return await _refund(conn, match.id, state)
+
+        legs = [Leg(uid, match.stake, 0) for uid in match.players] if match.stake else []
+        try:
+            result = await self.ledger.post(legs, "match_refund", json.dumps({"match": match.id, "reason": state}), hook=hook)
+        except BaseException:
+            match.state = OPEN
+            raise
+        if result is None:
+            match.state = OPEN
+            return False
+        self._forget(match)
+        return True
+
+    def _on_timeout(self, match_id: int) -> None:
+        match = self._matches.get(match_id)
+        if match is None:
+            return
+        if match.state != OPEN:
+            # Someone is joining right now; look again shortly.
+            self.wheel.schedule((id(self), match_id), self.wheel.tick, lambda: self._on_timeout(match_id))
+            return
+        task = asyncio.create_task(self._expire(match), name=f"match-expire-{match_id}")
+        self._expiring.add(task)
+        task.add_done_callback(self._expiring.discard)
+
+    async def _expire(self, match: Match) -> None:
+        try:
+            if await self._refund(match, "expired") and self.on_expire is not None:
+                await self.on_expire(match)
+        except Exception:
+            log.exception("match %d: expiry failed", match.id)
+
+    def close(self) -> None:
+        """Drop timers; stakes of open matches stay escrowed and are refunded by `recover()` on the next start."""
+        for match_id in list(self._matches):
+            self.wheel.cancel((id(self), match_id))
+        self._matches.clear()
+        self._by_user.clear()
+        self._invites.clear()
+        self._waiting.clear()
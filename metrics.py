@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import contextvars
+import math
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Iterable
+
+import aiosqlite
+
+
+# Seconds. Fine at the low end (most statements are sub-millisecond), up to
+# past Discord's 3 s interaction deadline at the top.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 3.0, 5.0, 10.0)
+
+# Discord drops an interaction that is not acknowledged within this time.
+INTERACTION_DEADLINE = 3.0
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labels, key)} {_num(value)}"
+
+
+class _Series:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus `le` semantics)."""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple[str, ...], _Series] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = _Series(len(self.buckets) + 1)
+        # Per-bucket counts here; made cumulative when rendered.
+        series.counts[bisect_left(self.buckets, value)] += 1
+        series.sum += value
+        series.count += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for key, series in sorted(self._series.items()):
+            running = 0
+            for bound, n in zip((*self.buckets, math.inf), series.counts):
+                running += n
+                le = 'le="' + _num(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labels, key, le)} {running}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {_num(series.sum)}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {series.count}"
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: list[Counter | Histogram] = []
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SQL_SECONDS = REGISTRY.histogram(
+    "sqlite_statement_seconds",
+    "Wall time of one aiosqlite call, including the wait for the connection's thread.",
+    ("conn", "op"),
+)
+SQL_ERRORS = REGISTRY.counter("sqlite_statement_errors_total", "aiosqlite calls that raised.", ("conn", "op"))
+LOCK_WAIT = REGISTRY.histogram(
+    "sqlite_lock_wait_seconds",
+    "Time spent waiting for a pooled reader, the writer lock, or SQLite's file lock (BEGIN IMMEDIATE).",
+    ("lock",),
+)
+
+COMMAND_SECONDS = REGISTRY.histogram("bot_command_seconds", "Slash command handler time.", ("command", "outcome"))
+COMMAND_STATEMENTS = REGISTRY.histogram(
+    "bot_command_sql_statements",
+    "SQL statements issued by one command handler.",
+    ("command",),
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64, 128),
+)
+COMMAND_SQL_SECONDS = REGISTRY.histogram("bot_command_sql_seconds", "Time one command handler spent in SQL.", ("command",))
+COMMAND_LOCK_WAIT = REGISTRY.histogram("bot_command_lock_wait_seconds", "Time one command handler waited for DB locks.", ("command",))
+INTERACTION_LAG = REGISTRY.histogram(
+    "bot_interaction_lag_seconds",
+    "Interaction creation (Discord clock) to handler start.",
+    ("command",),
+)
+INTERACTION_DEADLINE_TOTAL = REGISTRY.counter(
+    "bot_interaction_deadline_total",
+    "Interactions by how they met Discord's 3 s deadline (ok, deferred, late, expired, unanswered).",
+    ("command", "result"),
+)
+
+PANEL_REQUEST_SECONDS = REGISTRY.histogram("panel_request_seconds", "Admin panel request time.", ("method", "route", "status"))
+
+
+class CommandTimer:
+    """Per-interaction accumulator; SQL and lock waits in the same task add to it.
+
+    Work handed to other tasks (e.g. the ledger's batched flush) is not
+    attributed to the command.
+    """
+
+    __slots__ = ("command", "started", "created", "statements", "sql_seconds", "lock_seconds")
+
+    def __init__(self, command: str, created: float):
+        self.command = command
+        self.started = time.perf_counter()
+        self.created = created
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.lock_seconds = 0.0
+
+
+_current: contextvars.ContextVar[CommandTimer | None] = contextvars.ContextVar("command_timer", default=None)
+
+
+def start_command(command: str, created: float) -> CommandTimer:
+    """Begin timing a command; `created` is the interaction's epoch timestamp."""
+    timer = CommandTimer(command, created)
+    _current.set(timer)
+    INTERACTION_LAG.observe(max(0.0, time.time() - created), command)
+    return timer
+
+
+def finish_command(timer: CommandTimer, *, ok: bool, responded: bool, deferred: bool = False, expired: bool = False) -> None:
+    """Record a finished handler.
+
+    Handlers answer as their last step (or defer first), so "answered by the
+    end of the handler" is what the deadline is checked against. `expired`
+    means Discord already rejected the response (Unknown interaction).
+    """
+    command = timer.command
+    COMMAND_SECONDS.observe(time.perf_counter() - timer.started, command, "ok" if ok else "error")
+    COMMAND_STATEMENTS.observe(timer.statements, command)
+    COMMAND_SQL_SECONDS.observe(timer.sql_seconds, command)
+    COMMAND_LOCK_WAIT.observe(timer.lock_seconds, command)
+    if expired:
+        result = "expired"
+    elif not responded:
+        result = "unanswered"
+    elif deferred:
+        result = "deferred"
+    elif time.time() - timer.created > INTERACTION_DEADLINE:
+        result = "late"
+    else:
+        result = "ok"
+    INTERACTION_DEADLINE_TOTAL.inc(command, result)
+
+
+def lock_wait(lock: str, seconds: float) -> None:
+    LOCK_WAIT.observe(seconds, lock)
+    timer = _current.get()
+    if timer is not None:
+        timer.lock_seconds += seconds
+
+
+_OPS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "PRAGMA", "CREATE", "DROP", "ALTER"})
+
+
+def _op(sql: str) -> str:
+    head = sql.lstrip()[:8].split(None, 1)
+    op = head[0].upper() if head else ""
+    return op if op in _OPS else "OTHER"
+
+
+def _timed(method: Callable[..., Awaitable[Any]], conn_label: str, fixed_op: str | None) -> Callable[..., Awaitable[Any]]:
+    async def call(*args: Any, **kwargs: Any) -> Any:
+        op = fixed_op or _op(args[0] if args else kwargs.get("sql", ""))
+        started = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        except Exception:
+            SQL_ERRORS.inc(conn_label, op)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            SQL_SECONDS.observe(elapsed, conn_label, op)
+            timer = _current.get()
+            if timer is not None:
+                timer.statements += 1
+                timer.sql_seconds += elapsed
+
+    return call
+
+
+def instrument(conn: aiosqlite.Connection, label: str) -> aiosqlite.Connection:
+    """Time every statement run through `conn` (instance-level wrappers)."""
+    for name in ("execute", "executemany", "execute_fetchall", "execute_insert", "executescript"):
+        setattr(conn, name, _timed(getattr(conn, name), label, None))
+    setattr(conn, "commit", _timed(conn.commit, label, "COMMIT"))
+    setattr(conn, "rollback", _timed(conn.rollback, label, "ROLLBACK"))
+    return conn
+
+
+async def serve(host: str, port: int) -> Any:
+    """Expose REGISTRY on http://host:port/metrics. Returns the aiohttp runner (call `cleanup()`)."""
+    from aiohttp import web
+
+    async def handle(_request: web.Request) -> web.Response:
+        return web.Response(body=REGISTRY.render().encode(), headers={"Content-Type": CONTENT_TYPE})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
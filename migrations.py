@@ -0,0 +1,307 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import aiosqlite
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    sql: str
+
+
+# The schema as it was before versioning; everything is IF NOT EXISTS, so it
+# also upgrades databases created by older builds. Cooldowns are seeded from
+# the daily claims already in economy_logs.
+INITIAL_SQL = """
+CREATE TABLE IF NOT EXISTS users (
+  discord_user_id INTEGER PRIMARY KEY,
+  remanga_profile_url TEXT,
+  created_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+CREATE TABLE IF NOT EXISTS balances (
+  discord_user_id INTEGER PRIMARY KEY,
+  balance INTEGER NOT NULL DEFAULT 0,
+  updated_at TEXT NOT NULL DEFAULT (datetime('now')),
+  FOREIGN KEY (discord_user_id) REFERENCES users(discord_user_id)
+);
+
+CREATE TABLE IF NOT EXISTS game_bans (
+  discord_user_id INTEGER PRIMARY KEY,
+  banned_until TEXT,
+  reason TEXT,
+  updated_at TEXT NOT NULL DEFAULT (datetime('now')),
+  FOREIGN KEY (discord_user_id) REFERENCES users(discord_user_id)
+);
+
+CREATE TABLE IF NOT EXISTS economy_logs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  discord_user_id INTEGER,
+  action TEXT NOT NULL,
+  amount INTEGER,
+  meta_json TEXT,
+  created_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+CREATE TABLE IF NOT EXISTS cards (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  owner_discord_user_id INTEGER NOT NULL,
+  external_source TEXT,
+  external_id TEXT,
+  name TEXT NOT NULL,
+  verified INTEGER NOT NULL DEFAULT 0,
+  created_at TEXT NOT NULL DEFAULT (datetime('now')),
+  FOREIGN KEY (owner_discord_user_id) REFERENCES users(discord_user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_cards_owner ON cards(owner_discord_user_id);
+
+-- Lightweight change feed: writers outside the bot process (the panel) append
+-- here, the bot polls by id to invalidate its caches.
+CREATE TABLE IF NOT EXISTS change_feed (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  kind TEXT NOT NULL,
+  discord_user_id INTEGER,
+  created_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+-- Last time a user did a timed action (daily, ...), as unix epoch seconds.
+CREATE TABLE IF NOT EXISTS cooldowns (
+  discord_user_id INTEGER NOT NULL,
+  action TEXT NOT NULL,
+  last_at INTEGER NOT NULL,
+  PRIMARY KEY (discord_user_id, action)
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO cooldowns(discord_user_id, action, last_at)
+SELECT discord_user_id, action, CAST(strftime('%s', MAX(created_at)) AS INTEGER)
+FROM economy_logs
+WHERE action = 'daily' AND discord_user_id IS NOT NULL
+GROUP BY discord_user_id, action;
+"""
+
+# Integer epoch copies of the timestamps we compare or sort on. ALTER TABLE
+# cannot add a column with a non-constant default, so writers fill them in.
+EPOCH_COLUMNS_SQL = """
+ALTER TABLE users ADD COLUMN created_ts INTEGER;
+UPDATE users SET created_ts = CAST(strftime('%s', created_at) AS INTEGER);
+
+ALTER TABLE economy_logs ADD COLUMN created_ts INTEGER;
+UPDATE economy_logs SET created_ts = CAST(strftime('%s', created_at) AS INTEGER);
+
+ALTER TABLE game_bans ADD COLUMN banned_until_ts INTEGER;
+UPDATE game_bans SET banned_until_ts = CAST(strftime('%s', banned_until) AS INTEGER)
+WHERE banned_until IS NOT NULL;
+"""
+
+HOT_INDEXES_SQL = """
+-- Per-user history, newest first.
+CREATE INDEX IF NOT EXISTS idx_economy_logs_user ON economy_logs(discord_user_id, id);
+-- Time-range scans per action (stats, retention).
+CREATE INDEX IF NOT EXISTS idx_economy_logs_action_ts ON economy_logs(action, created_ts);
+-- Panel user list order.
+CREATE INDEX IF NOT EXISTS idx_users_created_ts ON users(created_ts, discord_user_id);
+"""
+
+USER_FILTER_INDEXES_SQL = """
+-- Panel user list filters: balance range, active bans, linked remanga profile.
+CREATE INDEX IF NOT EXISTS idx_balances_balance ON balances(balance);
+CREATE INDEX IF NOT EXISTS idx_game_bans_until_ts ON game_bans(banned_until_ts);
+CREATE INDEX IF NOT EXISTS idx_users_remanga_created_ts ON users(created_ts, discord_user_id)
+WHERE remanga_profile_url IS NOT NULL;
+"""
+
+# Card sync upserts by (owner, source, external id); that key replaces the
+# plain owner index. The table had no writers before, but dedupe just in case.
+CARD_SYNC_SQL = """
+DELETE FROM cards
+WHERE external_id IS NOT NULL
+  AND id NOT IN (
+    SELECT MIN(id) FROM cards WHERE external_id IS NOT NULL
+    GROUP BY owner_discord_user_id, external_source, external_id
+  );
+CREATE UNIQUE INDEX IF NOT EXISTS idx_cards_owner_external ON cards(owner_discord_user_id, external_source, external_id);
+DROP INDEX IF EXISTS idx_cards_owner;
+"""
+
+# One row per linked profile: when it is next re-verified, and failure state
+# for backoff. Existing profiles are spread over the first day by user id.
+VERIFY_JOBS_SQL = """
+CREATE TABLE IF NOT EXISTS verify_jobs (
+  discord_user_id INTEGER PRIMARY KEY,
+  due_ts INTEGER NOT NULL,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  last_ok_ts INTEGER,
+  last_error TEXT,
+  FOREIGN KEY (discord_user_id) REFERENCES users(discord_user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_verify_jobs_due ON verify_jobs(due_ts);
+
+INSERT OR IGNORE INTO verify_jobs(discord_user_id, due_ts)
+SELECT discord_user_id, CAST(strftime('%s', 'now') AS INTEGER) + discord_user_id % 86400
+FROM users
+WHERE remanga_profile_url IS NOT NULL;
+"""
+
+# Per-action aggregates of economy_logs by hour and by day. `rollup_state`
+# holds the last economy_logs.id already folded in; see bot/stats.py.
+ROLLUPS_SQL = """
+CREATE TABLE IF NOT EXISTS economy_rollup_hourly (
+  bucket_ts INTEGER NOT NULL,
+  action TEXT NOT NULL,
+  n INTEGER NOT NULL,
+  total INTEGER NOT NULL,
+  volume INTEGER NOT NULL,
+  wins INTEGER NOT NULL,
+  PRIMARY KEY (bucket_ts, action)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS economy_rollup_daily (
+  bucket_ts INTEGER NOT NULL,
+  action TEXT NOT NULL,
+  n INTEGER NOT NULL,
+  total INTEGER NOT NULL,
+  volume INTEGER NOT NULL,
+  wins INTEGER NOT NULL,
+  PRIMARY KEY (bucket_ts, action)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rollup_state (
+  name TEXT PRIMARY KEY,
+  last_id INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Index of gzip JSONL files holding economy_logs rows moved out of the hot
+# table (see bot/retention.py); file names are relative to the archive dir.
+LOG_ARCHIVES_SQL = """
+CREATE TABLE IF NOT EXISTS log_archives (
+  first_id INTEGER PRIMARY KEY,
+  last_id INTEGER NOT NULL,
+  min_ts INTEGER NOT NULL,
+  max_ts INTEGER NOT NULL,
+  row_count INTEGER NOT NULL,
+  file_name TEXT NOT NULL,
+  created_ts INTEGER NOT NULL
+);
+"""
+
+# Guild dimension. A database file is one partition: all guilds ("shared"
+# storage, guild_id 0) or a single guild (db_meta 'guild_id'). Rows record
+# their guild, filled in by triggers from db_meta, so partitions can be merged
+# later without ambiguity. Keys stay per partition.
+GUILD_PARTITION_SQL = """
+CREATE TABLE IF NOT EXISTS db_meta (
+  key TEXT PRIMARY KEY,
+  value TEXT NOT NULL
+) WITHOUT ROWID;
+
+ALTER TABLE balances ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE game_bans ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE cards ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0;
+
+CREATE TRIGGER IF NOT EXISTS balances_guild_id AFTER INSERT ON balances
+WHEN NEW.guild_id = 0 AND EXISTS (SELECT 1 FROM db_meta WHERE key = 'guild_id')
+BEGIN
+  UPDATE balances SET guild_id = (SELECT CAST(value AS INTEGER) FROM db_meta WHERE key = 'guild_id')
+  WHERE discord_user_id = NEW.discord_user_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS game_bans_guild_id AFTER INSERT ON game_bans
+WHEN NEW.guild_id = 0 AND EXISTS (SELECT 1 FROM db_meta WHERE key = 'guild_id')
+BEGIN
+  UPDATE game_bans SET guild_id = (SELECT CAST(value AS INTEGER) FROM db_meta WHERE key = 'guild_id')
+  WHERE discord_user_id = NEW.discord_user_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS cards_guild_id AFTER INSERT ON cards
+WHEN NEW.guild_id = 0 AND EXISTS (SELECT 1 FROM db_meta WHERE key = 'guild_id')
+BEGIN
+  UPDATE cards SET guild_id = (SELECT CAST(value AS INTEGER) FROM db_meta WHERE key = 'guild_id')
+  WHERE id = NEW.id;
+END;
+"""
+
+# Multi-player games. Match state lives in memory (bot/matches.py); these rows
+# make stakes durable: whatever is in match_escrow belongs to an unsettled match
+# and is refunded on startup. A staked card is locked by escrow_match_id.
+MATCHES_SQL = """
+CREATE TABLE IF NOT EXISTS matches (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  kind TEXT NOT NULL,
+  stake INTEGER NOT NULL,
+  size INTEGER NOT NULL,
+  state TEXT NOT NULL,
+  winner_discord_user_id INTEGER,
+  created_ts INTEGER NOT NULL,
+  settled_ts INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_matches_open ON matches(id) WHERE state = 'open';
+
+CREATE TABLE IF NOT EXISTS match_escrow (
+  match_id INTEGER NOT NULL,
+  discord_user_id INTEGER NOT NULL,
+  amount INTEGER NOT NULL,
+  card_id INTEGER,
+  PRIMARY KEY (match_id, discord_user_id),
+  FOREIGN KEY (match_id) REFERENCES matches(id)
+) WITHOUT ROWID;
+
+ALTER TABLE cards ADD COLUMN escrow_match_id INTEGER;
+"""
+
+# Which users have rows in each log archive, so a per-user history query opens
+# only their files. Archives written before this have users_indexed = 0 and
+# are still scanned.
+LOG_ARCHIVE_USERS_SQL = """
+ALTER TABLE log_archives ADD COLUMN users_indexed INTEGER NOT NULL DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS log_archive_users (
+  discord_user_id INTEGER NOT NULL,
+  first_id INTEGER NOT NULL,
+  PRIMARY KEY (discord_user_id, first_id)
+) WITHOUT ROWID;
+"""
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "initial", INITIAL_SQL),
+    Migration(2, "epoch_columns", EPOCH_COLUMNS_SQL),
+    Migration(3, "hot_indexes", HOT_INDEXES_SQL),
+    Migration(4, "user_filter_indexes", USER_FILTER_INDEXES_SQL),
+    Migration(5, "card_sync", CARD_SYNC_SQL),
+    Migration(6, "verify_jobs", VERIFY_JOBS_SQL),
+    Migration(7, "economy_rollups", ROLLUPS_SQL),
+    Migration(8, "log_archives", LOG_ARCHIVES_SQL),
+    Migration(9, "guild_partition", GUILD_PARTITION_SQL),
+    Migration(10, "matches", MATCHES_SQL),
+    Migration(11, "log_archive_users", LOG_ARCHIVE_USERS_SQL),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+async def schema_version(conn: aiosqlite.Connection) -> int:
+    cur = await conn.execute("PRAGMA user_version")
+    row = await cur.fetchone()
+    return int(row[0]) if row else 0
+
+
+async def migrate(conn: aiosqlite.Connection) -> int:
+    """Bring the schema to LATEST_VERSION. Returns the resulting version.
+
+    The version lives in `PRAGMA user_version`. When it is current this is a
+    single PRAGMA read and no DDL runs. Each migration is applied in its own
+    transaction together with the version bump.
+    """
+    current = await schema_version(conn)
+    for m in MIGRATIONS:
+        if m.version <= current:
+            continue
+        # executescript() commits anything pending first, so the script
+        # carries its own BEGIN/COMMIT to stay atomic with the version bump.
+        await conn.executescript(f"BEGIN IMMEDIATE;\n{m.sql}\nPRAGMA user_version={m.version};\nCOMMIT;")
+        current = m.version
+    return current
@@ -1,8 +1,13 @@
 from __future__ import annotations
 
+import re
+
 import discord
 
 
+_USER_ID_RE = re.compile(r"(?<!\d)\d{15,21}(?!\d)")
+
+
 def is_server_owner(interaction: discord.Interaction) -> bool:
     if not interaction.guild:
         return False
@@ -27,3 +32,8 @@ def has_moderation(interaction: discord.Interaction) -> bool:
         return False
     perms = member.guild_permissions
     return bool(perms.manage_guild or perms.manage_messages or perms.moderate_members or perms.administrator)
+
+
+def parse_user_ids(text: str) -> list[int]:
+    """Pull Discord user ids (raw or as <@mentions>) out of free text, keeping order."""
+    return list(dict.fromkeys(int(m) for m in _USER_ID_RE.findall(text)))
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from bot.cache import BanCache, ChangeFeed
+from bot.config import Settings
+from bot.db import Db, set_partition_guild
+from bot.jobs import VerifyJobs
+from bot.leaderboard import Leaderboard
+from bot.ledger import BalanceLedger
+from bot.matches import Match, MatchEngine
+from bot.remanga import CardProvider, CardSync
+from bot.timers import TimerWheel
+
+
+@dataclass
+class Partition:
+    """One SQLite file and the services that own its data.
+
+    Each partition has its own writer, so guilds in different partitions
+    never wait on each other's write lock.
+    """
+
+    guild_id: int
+    db: Db
+    ledger: BalanceLedger
+    bans: BanCache
+    board: Leaderboard
+    feed: ChangeFeed
+    cards: CardSync
+    verify: VerifyJobs
+    matches: MatchEngine
+
+    async def close(self) -> None:
+        self.matches.close()
+        await self.feed.close()
+        await self.verify.close()
+        # Force-flush pending economy events before the pool goes away.
+        await self.ledger.close()
+        await self.db.close()
+
+
+async def open_partition(
+    settings: Settings,
+    guild_id: int,
+    path: Path,
+    provider: CardProvider,
+    *,
+    readers: int,
+    wheel: TimerWheel,
+    on_match_expire: Callable[[Match], Awaitable[None]] | None = None,
+) -> Partition:
+    db = Db(path, readers=readers)
+    await db.init()
+    await db.open()
+    if guild_id:
+        async with db.write() as conn:
+            await set_partition_guild(conn, guild_id)
+
+    ledger = BalanceLedger(
+        db,
+        flush_interval=settings.ledger_flush_ms / 1000,
+        max_batch=settings.ledger_max_batch,
+    )
+
+    board = Leaderboard(db)
+    await board.load()
+    ledger.subscribe(board.update)
+
+    bans = BanCache(db)
+    # Panel writes (bans, bulk balance adjustments) reach the bot through change_feed.
+    feed = ChangeFeed(db, poll_interval=settings.cache_poll_seconds)
+    feed.subscribe("ban", bans.invalidate)
+    feed.subscribe("balance", ledger.invalidate)
+    feed.subscribe("balance", board.invalidate)
+    await feed.poll()
+    feed.start()
+
+    cards = CardSync(db, provider)
+    verify = VerifyJobs(
+        db,
+        cards,
+        period_hours=settings.verify_period_hours,
+        active_period_hours=settings.verify_active_period_hours,
+        tick_seconds=settings.verify_tick_seconds,
+        batch_size=settings.verify_batch,
+    )
+    verify.start()
+
+    matches = MatchEngine(db, ledger, wheel, timeout=settings.match_timeout_seconds, on_expire=on_match_expire)
+    # Stakes of matches a previous run left open go back to their owners.
+    await matches.recover()
+
+    return Partition(guild_id, db, ledger, bans, board, feed, cards, verify, matches)
+
+
+class GuildPartitions:
+    """Maps guilds to partitions.
+
+    - "shared": every guild uses `database_path` (one economy for all guilds).
+    - "per_guild": each guild gets `guild_db_dir/<guild_id>.sqlite`, opened on
+      first use; DMs use `database_path`.
+
+    Partitions are opened lazily, once, and stay open until `close()`.
+    """
+
+    def __init__(self, settings: Settings, provider: CardProvider):
+        self.settings = settings
+        self.provider = provider
+        # One timer task for the match timeouts of every partition.
+        self.wheel = TimerWheel()
+        self.on_match_expire: Callable[[Match], Awaitable[None]] | None = None
+
+        self._parts: dict[int, Partition] = {}
+        self._opening: dict[int, asyncio.Task[Partition]] = {}
+
+    @property
+    def per_guild(self) -> bool:
+        return self.settings.guild_storage == "per_guild"
+
+    def key(self, guild_id: int | None) -> int:
+        return (guild_id or 0) if self.per_guild else 0
+
+    async def get(self, guild_id: int | None) -> Partition:
+        key = self.key(guild_id)
+        part = self._parts.get(key)
+        if part is not None:
+            return part
+        # Concurrent first commands in a guild share one open.
+        task = self._opening.get(key)
+        if task is None:
+            task = self._opening[key] = asyncio.create_task(self._open(key))
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._opening.pop(key, None)
+
+    async def _open(self, key: int) -> Partition:
+        if key:
+            path = self.settings.guild_db_dir / f"{key}.sqlite"
+            readers = self.settings.guild_db_readers
+        else:
+            path = self.settings.database_path
+            readers = 4
+        part = await open_partition(
+            self.settings,
+            key,
+            path,
+            self.provider,
+            readers=readers,
+            wheel=self.wheel,
+            on_match_expire=self.on_match_expire,
+        )
+        self._parts[key] = part
+        return part
+
+    def open_partitions(self) -> list[Partition]:
+        return list(self._parts.values())
+
+    async def close(self) -> None:
+        opening = list(self._opening.values())
+        for task in opening:
+            task.cancel()
+        # An open that finished despite the cancel has put its partition in
+        # _parts; wait so it is closed below rather than left behind.
+        await asyncio.gather(*opening, return_exceptions=True)
+        self._opening.clear()
+        for part in list(self._parts.values()):
+            await part.close()
+        self._parts.clear()
+        await self.wheel.close()
@@ -1,10 +1,27 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Sequence
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Sequence
+from urllib.parse import urlsplit
 
+import aiohttp
 import aiosqlite
 
+from bot import db as dbmod
+
+
+log = logging.getLogger(__name__)
+
+REMANGA_SOURCE = "remanga"
+
+# https://remanga.org/user/123456[/...]
+_PROFILE_RE = re.compile(r"^https?://(?:www\.)?remanga\.org/user/(\d+)(?:[/?#].*)?$")
+
 
 @dataclass(frozen=True)
 class Card:
@@ -13,26 +30,169 @@ class Card:
     name: str
 
 
-class CardProvider:
-    """Abstraction for where 'cards' come from.
+class RemangaError(Exception):
+    pass
 
-    We'll implement Remanga scraping once we know the page structure and what to treat as 'cards'.
-    """
+
+class CardProvider:
+    """Abstraction for where 'cards' come from."""
 
     async def fetch_cards(self, profile_url: str) -> Sequence[Card]:
         raise NotImplementedError
 
+    async def close(self) -> None:
+        pass
+
 
 class RemangaPlaceholderProvider(CardProvider):
     async def fetch_cards(self, profile_url: str) -> Sequence[Card]:
-        # TODO: implement after we have example profiles / DOM structure.
         return []
 
 
+def profile_user_id(profile_url: str) -> str | None:
+    m = _PROFILE_RE.match(profile_url.strip())
+    return m.group(1) if m else None
+
+
+def parse_cards(payload: Any) -> list[Card]:
+    """Cards from an API response: {"content": [{"id": .., "name": ..}, ...]}.
+
+    Inventory items may wrap the card itself as {"card": {...}}.
+    """
+    items = payload.get("content") if isinstance(payload, dict) else payload
+    cards: list[Card] = []
+    for item in items or ():
+        if not isinstance(item, dict):
+            continue
+        card = item.get("card") if isinstance(item.get("card"), dict) else item
+        if card.get("id") is None:
+            continue
+        name = card.get("name") or card.get("title") or ""
+        cards.append(Card(external_source=REMANGA_SOURCE, external_id=str(card["id"]), name=str(name)))
+    return cards
+
+
+@dataclass
+class _Cached:
+    cards: tuple[Card, ...]
+    etag: str | None
+    last_modified: str | None
+    fetched_at: float
+
+
+class _HostLimiter:
+    """Spaces requests to each host at least 1/rate seconds apart."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next: dict[str, float] = {}
+
+    async def wait(self, host: str) -> None:
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self._next.get(host, 0.0))
+        self._next[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class RemangaProvider(CardProvider):
+    """Fetches a profile's cards from the Remanga API.
+
+    - One shared aiohttp session (keep-alive), at most `concurrency` requests
+      in flight and at most `rate_per_host` requests per second per host.
+    - Parsed profiles are cached for `cache_ttl` seconds; after that the
+      request is conditional (ETag / Last-Modified), so an unchanged profile
+      costs a 304 and no parsing.
+
+    `base_url` is configurable so the provider can be pointed at a stub server.
+    """
+
+    def __init__(
+        self,
+        *,
+        user_agent: str,
+        base_url: str = "https://api.remanga.org",
+        cards_path: str = "/api/inventory/{user_id}/cards/",
+        concurrency: int = 8,
+        rate_per_host: float = 5.0,
+        cache_ttl: float = 600.0,
+        cache_size: int = 50_000,
+        timeout: float = 10.0,
+    ):
+        self.user_agent = user_agent
+        self.base_url = base_url.rstrip("/")
+        self.cards_path = cards_path
+        self.concurrency = concurrency
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.timeout = timeout
+
+        self._limiter = _HostLimiter(rate_per_host)
+        self._slots = asyncio.Semaphore(concurrency)
+        self._cache: OrderedDict[str, _Cached] = OrderedDict()
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"User-Agent": self.user_agent, "Accept": "application/json"},
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def fetch_cards(self, profile_url: str) -> Sequence[Card]:
+        user_id = profile_user_id(profile_url)
+        if user_id is None:
+            raise RemangaError(f"not a remanga profile url: {profile_url}")
+        url = self.base_url + self.cards_path.format(user_id=user_id)
+
+        cached = self._cache.get(url)
+        if cached is not None:
+            self._cache.move_to_end(url)
+            if time.monotonic() - cached.fetched_at < self.cache_ttl:
+                return cached.cards
+
+        headers: dict[str, str] = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        async with self._slots:
+            await self._limiter.wait(urlsplit(url).netloc)
+            async with self._get_session().get(url, headers=headers) as resp:
+                if resp.status == 304 and cached is not None:
+                    cached.fetched_at = time.monotonic()
+                    return cached.cards
+                if resp.status == 404:
+                    # Deleted or hidden profile: nothing can be verified.
+                    cards: tuple[Card, ...] = ()
+                elif resp.status == 200:
+                    cards = tuple(parse_cards(await resp.json(content_type=None)))
+                else:
+                    raise RemangaError(f"{url}: HTTP {resp.status}")
+                etag = resp.headers.get("ETag")
+                last_modified = resp.headers.get("Last-Modified")
+
+        self._cache[url] = _Cached(cards, etag, last_modified, time.monotonic())
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return cards
+
+
 async def set_profile_url(conn: aiosqlite.Connection, discord_user_id: int, profile_url: str | None) -> None:
     await conn.execute(
-        "INSERT OR IGNORE INTO users(discord_user_id) VALUES (?)",
-        (discord_user_id,),
+        "INSERT OR IGNORE INTO users(discord_user_id, created_ts) VALUES (?, ?)",
+        (discord_user_id, int(time.time())),
     )
     await conn.execute(
         "UPDATE users SET remanga_profile_url=? WHERE discord_user_id=?",
@@ -47,3 +207,133 @@ async def get_profile_url(conn: aiosqlite.Connection, discord_user_id: int) -> s
     )
     row = await cur.fetchone()
     return str(row[0]) if row and row[0] else None
+
+
+async def get_profile_urls(conn: aiosqlite.Connection, discord_user_ids: Sequence[int]) -> dict[int, str]:
+    out: dict[int, str] = {}
+    for i in range(0, len(discord_user_ids), 500):
+        chunk = discord_user_ids[i : i + 500]
+        rows = await conn.execute_fetchall(
+            f"SELECT discord_user_id, remanga_profile_url FROM users "
+            f"WHERE remanga_profile_url IS NOT NULL AND discord_user_id IN ({','.join('?' * len(chunk))})",
+            chunk,
+        )
+        out.update((int(uid), str(url)) for uid, url in rows)
+    return out
+
+
+async def count_verified_cards(conn: aiosqlite.Connection, discord_user_id: int) -> int:
+    rows = await conn.execute_fetchall(
+        "SELECT COUNT(*) FROM cards WHERE owner_discord_user_id=? AND external_source=? AND verified=1",
+        (discord_user_id, REMANGA_SOURCE),
+    )
+    return int(rows[0][0])
+
+
+async def apply_cards(conn: aiosqlite.Connection, fetched: dict[int, Sequence[Card]]) -> tuple[int, int]:
+    """Make the stored remanga cards of each user match what was fetched.
+
+    Fetched cards are upserted as verified; stored cards that are gone are
+    marked unverified (not deleted: they may be referenced by bets later).
+    Only rows that actually change are written. Returns (upserted, unverified).
+    """
+    ids = list(fetched)
+    stored: dict[tuple[int, str], tuple[str, int]] = {}
+    for i in range(0, len(ids), 500):
+        chunk = ids[i : i + 500]
+        rows = await conn.execute_fetchall(
+            f"SELECT owner_discord_user_id, external_id, name, verified FROM cards "
+            f"WHERE external_source=? AND owner_discord_user_id IN ({','.join('?' * len(chunk))})",
+            [REMANGA_SOURCE, *chunk],
+        )
+        for uid, ext_id, name, verified in rows:
+            stored[(int(uid), str(ext_id))] = (str(name), int(verified))
+
+    upserts: list[tuple[int, str, str, str]] = []
+    seen: set[tuple[int, str]] = set()
+    for uid, cards in fetched.items():
+        for card in cards:
+            key = (uid, card.external_id)
+            seen.add(key)
+            if stored.get(key) != (card.name, 1):
+                upserts.append((uid, card.external_source, card.external_id, card.name))
+    gone = [(uid, REMANGA_SOURCE, ext_id) for (uid, ext_id), (_, verified) in stored.items() if verified and (uid, ext_id) not in seen]
+
+    await conn.executemany(
+        "INSERT INTO cards(owner_discord_user_id, external_source, external_id, name, verified) VALUES (?, ?, ?, ?, 1) "
+        "ON CONFLICT(owner_discord_user_id, external_source, external_id) DO UPDATE SET name=excluded.name, verified=1",
+        upserts,
+    )
+    await conn.executemany(
+        "UPDATE cards SET verified=0 WHERE owner_discord_user_id=? AND external_source=? AND external_id=?",
+        gone,
+    )
+    return len(upserts), len(gone)
+
+
+@dataclass
+class SyncResult:
+    users: int = 0
+    upserted: int = 0
+    unverified: int = 0
+    # discord_user_id -> error text for profiles that could not be fetched.
+    errors: dict[int, str] = field(default_factory=dict)
+    # Requested users with no linked profile (sync_users only).
+    unlinked: set[int] = field(default_factory=set)
+
+
+class CardSync:
+    """Fetches linked profiles concurrently and applies them in batches.
+
+    Each batch is one write transaction, so SQLite sees a few large commits
+    instead of one per profile. Failed fetches leave the user's cards as is.
+    """
+
+    def __init__(self, db: dbmod.Db, provider: CardProvider, *, batch_size: int = 200):
+        self.db = db
+        self.provider = provider
+        self.batch_size = batch_size
+
+    async def sync_users(self, discord_user_ids: Iterable[int]) -> SyncResult:
+        ids = list(dict.fromkeys(discord_user_ids))
+        async with self.db.read() as conn:
+            urls = await get_profile_urls(conn, ids)
+        result = SyncResult(unlinked=set(ids) - urls.keys())
+        pairs = list(urls.items())
+        for i in range(0, len(pairs), self.batch_size):
+            await self._sync_batch(pairs[i : i + self.batch_size], result)
+        return result
+
+    async def sync_all(self) -> SyncResult:
+        result = SyncResult()
+        after = 0
+        while True:
+            async with self.db.read() as conn:
+                rows = await conn.execute_fetchall(
+                    "SELECT discord_user_id, remanga_profile_url FROM users "
+                    "WHERE remanga_profile_url IS NOT NULL AND discord_user_id > ? "
+                    "ORDER BY discord_user_id LIMIT ?",
+                    (after, self.batch_size),
+                )
+            if not rows:
+                return result
+            after = int(rows[-1][0])
+            await self._sync_batch([(int(uid), str(url)) for uid, url in rows], result)
+
+    async def _sync_batch(self, pairs: list[tuple[int, str]], result: SyncResult) -> None:
+        fetched = await asyncio.gather(*(self.provider.fetch_cards(url) for _, url in pairs), return_exceptions=True)
+        ok: dict[int, Sequence[Card]] = {}
+        for (uid, _), cards in zip(pairs, fetched):
+            if isinstance(cards, BaseException):
+                result.errors[uid] = str(cards) or type(cards).__name__
+            else:
+                ok[uid] = cards
+        if len(ok) < len(pairs):
+            log.warning("remanga sync: %d of %d profiles failed", len(pairs) - len(ok), len(pairs))
+
+        if ok:
+            async with self.db.write() as conn:
+                upserted, unverified = await apply_cards(conn, ok)
+            result.upserted += upserted
+            result.unverified += unverified
+        result.users += len(ok)
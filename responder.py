@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, TypeVar
+
+import discord
+
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class Reply:
+    content: str
+    ephemeral: bool = False
+    allowed_mentions: discord.AllowedMentions | None = None
+
+    def kwargs(self) -> dict[str, Any]:
+        out: dict[str, Any] = {"content": self.content, "ephemeral": self.ephemeral}
+        if self.allowed_mentions is not None:
+            out["allowed_mentions"] = self.allowed_mentions
+        return out
+
+
+class PoolFull(Exception):
+    pass
+
+
+class WorkPool:
+    """Bounded queue + fixed set of workers for economy operations.
+
+    Handlers submit the DB part of a command and await the result; at most
+    `workers` operations run at once, so a burst queues here instead of
+    piling onto the SQLite write lock. When `max_queue` operations are
+    waiting, `submit` raises PoolFull and the command is turned away.
+    Commands that don't write (/rules, /balance, /top) never come here.
+    """
+
+    def __init__(self, *, workers: int = 16, max_queue: int = 512):
+        self.workers = workers
+        self.max_queue = max_queue
+
+        self._queue: asyncio.Queue[tuple[Callable[[], Awaitable[Any]], asyncio.Future[Any], contextvars.Context]] = asyncio.Queue(max_queue)
+        self._tasks: list[asyncio.Task[None]] = []
+        self._running = 0
+        self._closed = False
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._closed = False
+        self._tasks = [asyncio.create_task(self._worker(), name=f"economy-worker-{i}") for i in range(self.workers)]
+
+    def submit(self, fn: Callable[[], Awaitable[T]]) -> asyncio.Future[T]:
+        if self._closed:
+            raise PoolFull("pool is closed")
+        fut: asyncio.Future[T] = asyncio.get_running_loop().create_future()
+        try:
+            # The caller's context goes along (per-command metrics, see bot/metrics.py).
+            self._queue.put_nowait((fn, fut, contextvars.copy_context()))
+        except asyncio.QueueFull:
+            raise PoolFull("economy queue is full") from None
+        return fut
+
+    def stats(self) -> dict[str, int]:
+        return {"workers": self.workers, "running": self._running, "queued": self._queue.qsize()}
+
+    async def _worker(self) -> None:
+        while True:
+            fn, fut, ctx = await self._queue.get()
+            self._running += 1
+            try:
+                # The operation finishes even if the waiting handler went away.
+                result = await asyncio.create_task(fn(), context=ctx)
+            except Exception as exc:
+                if not fut.done():
+                    fut.set_exception(exc)
+            else:
+                if not fut.done():
+                    fut.set_result(result)
+            finally:
+                self._running -= 1
+                self._queue.task_done()
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Stop taking work, let queued operations finish (up to `timeout`), stop the workers."""
+        self._closed = True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            log.warning("economy pool closed with %d operations queued", self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+
+FAILED = "Что-то пошло не так, попробуй ещё раз."
+
+
+async def respond(interaction: discord.Interaction, result: Awaitable[Reply], *, budget: float, ephemeral: bool = False) -> None:
+    """Answer an interaction with `result`.
+
+    If it isn't ready within `budget` seconds the interaction is deferred
+    (Discord shows "thinking…", the 3 s deadline no longer applies) and the
+    reply is delivered as a follow-up. `ephemeral` is the visibility to defer
+    with; a reply that needs the other one replaces the deferred message.
+    If `result` raises, the user gets a short notice either way and the
+    error goes on to the tree's on_error (logged, counted as failed).
+    """
+    fut = asyncio.ensure_future(result)
+    try:
+        reply = await asyncio.wait_for(asyncio.shield(fut), budget)
+    except asyncio.TimeoutError:
+        pass
+    except Exception:
+        # Without an answer Discord shows "The application did not respond".
+        if interaction.response.is_done():
+            await interaction.followup.send(FAILED, ephemeral=True)
+        else:
+            await interaction.response.send_message(FAILED, ephemeral=True)
+        raise
+    else:
+        await interaction.response.send_message(**reply.kwargs())
+        return
+
+    await interaction.response.defer(ephemeral=ephemeral, thinking=True)
+    try:
+        reply = await fut
+    except Exception:
+        # Don't leave "thinking…" up forever.
+        await interaction.followup.send(FAILED, ephemeral=True)
+        raise
+    if reply.ephemeral != ephemeral:
+        # A deferred response keeps the visibility it was deferred with.
+        await interaction.delete_original_response()
+    await interaction.followup.send(**reply.kwargs())
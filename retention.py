@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+# Allow running as a file: `python bot/retention.py`.
+# (Preferred is `python -m bot.retention` from project root.)
+if __package__ is None or __package__ == "":
+    sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from bot import db as dbmod
+from bot.stats import rolled_up_id
+
+
+log = logging.getLogger(__name__)
+
+LOG_COLUMNS = ("id", "discord_user_id", "action", "amount", "meta_json", "created_at", "created_ts")
+
+# Pages handed back to the OS per incremental_vacuum call (4 KiB each).
+VACUUM_PAGES = 2000
+
+
+def _write_archive(path: Path, rows: list[tuple[Any, ...]]) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(dict(zip(LOG_COLUMNS, row)), ensure_ascii=False))
+            f.write("\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _read_archive(path: Path) -> list[dict[str, Any]]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+async def archive_batch(db: dbmod.Db, archive_dir: Path, *, hot_days: int, max_rows: int = 50_000) -> int:
+    """Move the oldest economy_logs rows past the hot window into one archive file.
+
+    Only rows already folded into the stats rollups are moved, so the
+    statistics never lose history. The file is durable before the rows are
+    deleted; a crash in between leaves an orphan file that is not indexed and
+    is overwritten by the retry. Returns how many rows were archived.
+    """
+    cutoff = int(time.time()) - hot_days * 86400
+    async with db.read() as conn:
+        limit_id = await rolled_up_id(conn)
+        rows = await conn.execute_fetchall(
+            f"SELECT {', '.join(LOG_COLUMNS)} FROM economy_logs WHERE id <= ? ORDER BY id LIMIT ?",
+            (limit_id, max_rows),
+        )
+    # Ids grow with time, so the archivable rows are a prefix.
+    batch: list[tuple[Any, ...]] = []
+    for row in rows:
+        ts = row[6]
+        if ts is None or ts >= cutoff:
+            break
+        batch.append(tuple(row))
+    if not batch:
+        return 0
+
+    first_id, last_id = int(batch[0][0]), int(batch[-1][0])
+    timestamps = [int(r[6]) for r in batch]
+    user_ids = {int(r[1]) for r in batch if r[1] is not None}
+    file_name = f"economy_logs-{first_id:012d}-{last_id:012d}.jsonl.gz"
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    await asyncio.to_thread(_write_archive, archive_dir / file_name, batch)
+
+    async with db.write() as conn:
+        await conn.execute(
+            "INSERT OR REPLACE INTO log_archives(first_id, last_id, min_ts, max_ts, row_count, file_name, created_ts, users_indexed) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, 1)",
+            (first_id, last_id, min(timestamps), max(timestamps), len(batch), file_name, int(time.time())),
+        )
+        await conn.execute("DELETE FROM log_archive_users WHERE first_id = ?", (first_id,))
+        await conn.executemany(
+            "INSERT INTO log_archive_users(discord_user_id, first_id) VALUES (?, ?)",
+            [(uid, first_id) for uid in user_ids],
+        )
+        await conn.execute("DELETE FROM economy_logs WHERE id >= ? AND id <= ?", (first_id, last_id))
+    return len(batch)
+
+
+async def reclaim(db: dbmod.Db, *, pages: int = VACUUM_PAGES) -> int:
+    """Return free pages to the OS (needs auto_vacuum=INCREMENTAL). Returns pages left free."""
+    async with db.write() as conn:
+        rows = await conn.execute_fetchall("PRAGMA auto_vacuum")
+        if int(rows[0][0]) != 2:
+            return 0
+        await conn.execute_fetchall(f"PRAGMA incremental_vacuum({int(pages)})")
+        rows = await conn.execute_fetchall("PRAGMA freelist_count")
+    return int(rows[0][0])
+
+
+async def history(
+    db: dbmod.Db,
+    archive_dir: Path,
+    *,
+    discord_user_id: int | None = None,
+    action: str | None = None,
+    since_ts: int | None = None,
+    until_ts: int | None = None,
+    before_id: int | None = None,
+    limit: int = 100,
+) -> list[dict[str, Any]]:
+    """economy_logs rows matching the filters, newest first, hot and archived alike.
+
+    Page with `before_id` = the smallest id of the previous page. With
+    `discord_user_id` only archives holding that user's rows are opened.
+    """
+    where = ["1=1"]
+    params: list[Any] = []
+    if discord_user_id is not None:
+        where.append("discord_user_id = ?")
+        params.append(discord_user_id)
+    if action is not None:
+        where.append("action = ?")
+        params.append(action)
+    if since_ts is not None:
+        where.append("created_ts >= ?")
+        params.append(since_ts)
+    if until_ts is not None:
+        where.append("created_ts < ?")
+        params.append(until_ts)
+    if before_id is not None:
+        where.append("id < ?")
+        params.append(before_id)
+
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall(
+            f"SELECT {', '.join(LOG_COLUMNS)} FROM economy_logs WHERE {' AND '.join(where)} ORDER BY id DESC LIMIT ?",
+            [*params, limit],
+        )
+        out = [dict(zip(LOG_COLUMNS, r)) for r in rows]
+        if len(out) >= limit:
+            return out
+        archives = await conn.execute_fetchall(
+            "SELECT a.first_id, a.file_name FROM log_archives a "
+            "WHERE a.min_ts < ? AND a.max_ts >= ? AND a.first_id < ? "
+            "AND (? IS NULL OR a.users_indexed = 0 OR EXISTS ("
+            "SELECT 1 FROM log_archive_users u WHERE u.discord_user_id = ? AND u.first_id = a.first_id)) "
+            "ORDER BY a.first_id DESC",
+            (
+                until_ts if until_ts is not None else 2**62,
+                since_ts if since_ts is not None else 0,
+                before_id if before_id is not None else 2**62,
+                discord_user_id,
+                discord_user_id,
+            ),
+        )
+
+    for _, file_name in archives:
+        path = archive_dir / file_name
+        try:
+            archived = await asyncio.to_thread(_read_archive, path)
+        except FileNotFoundError:
+            log.warning("economy_logs archive is missing: %s", path)
+            continue
+        for row in reversed(archived):
+            if discord_user_id is not None and row["discord_user_id"] != discord_user_id:
+                continue
+            if action is not None and row["action"] != action:
+                continue
+            ts = row["created_ts"]
+            if since_ts is not None and ts < since_ts:
+                continue
+            if until_ts is not None and ts >= until_ts:
+                continue
+            if before_id is not None and row["id"] >= before_id:
+                continue
+            out.append(row)
+            if len(out) >= limit:
+                return out
+    return out
+
+
+class RetentionWorker:
+    """Archives economy_logs past `hot_days` every `interval` seconds.
+
+    Each pass moves whole batches (one file and one short write transaction
+    each), then lets incremental VACUUM hand the freed pages back.
+    """
+
+    def __init__(self, db: dbmod.Db, archive_dir: Path, *, hot_days: int = 90, interval: float = 3600.0, max_rows: int = 50_000):
+        self.db = db
+        self.archive_dir = archive_dir
+        self.hot_days = hot_days
+        self.interval = interval
+        self.max_rows = max_rows
+
+        self._task: asyncio.Task[None] | None = None
+
+    async def run_once(self) -> int:
+        total = 0
+        while True:
+            moved = await archive_batch(self.db, self.archive_dir, hot_days=self.hot_days, max_rows=self.max_rows)
+            total += moved
+            if moved < self.max_rows:
+                break
+        if total:
+            while await reclaim(self.db):
+                await asyncio.sleep(0)
+            log.info("economy_logs retention: archived %d rows", total)
+        return total
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name="economy-logs-retention")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                log.exception("economy_logs retention failed")
+            await asyncio.sleep(self.interval)
+
+
+async def enable_incremental_vacuum(db: dbmod.Db) -> bool:
+    """Switch an existing database to auto_vacuum=INCREMENTAL (one full VACUUM).
+
+    Returns False if it already was. Needs exclusive access for the duration.
+    """
+    conn = await db.connect()
+    try:
+        rows = await conn.execute_fetchall("PRAGMA auto_vacuum")
+        if int(rows[0][0]) == 2:
+            return False
+        await conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        await conn.execute("VACUUM")
+        return True
+    finally:
+        await conn.close()
+
+
+async def _main() -> None:
+    from bot.config import load_settings
+
+    settings = load_settings()
+    db = dbmod.Db(settings.database_path)
+    await db.init()
+    if await enable_incremental_vacuum(db):
+        print("auto_vacuum switched to INCREMENTAL")
+    await db.open()
+    try:
+        moved = await RetentionWorker(db, settings.log_archive_dir, hot_days=settings.log_hot_days).run_once()
+    finally:
+        await db.close()
+    print(f"Archived {moved} economy_logs rows to {settings.log_archive_dir}")
+
+
+def main() -> None:
+    asyncio.run(_main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator
+
+
+@dataclass
+class _Bucket:
+    tokens: float
+    updated: float
+
+
+@dataclass
+class _Lane:
+    lock: asyncio.Lock
+    pending: int = 0
+
+
+class CommandScheduler:
+    """In-process admission control for economy commands.
+
+    - Token bucket per (command, user): `limits` maps a command name to
+      (burst, per_seconds), i.e. at most `burst` uses per `per_seconds`.
+    - One lane per user: a user's economy actions run one at a time, and
+      at most `max_pending` may be in flight or waiting.
+
+    Both checks are synchronous, so a rejected command never touches the DB.
+    """
+
+    def __init__(self, limits: dict[str, tuple[int, float]], *, max_pending: int = 2):
+        self.limits = limits
+        self.max_pending = max_pending
+
+        self._buckets: dict[tuple[str, int], _Bucket] = {}
+        self._lanes: dict[int, _Lane] = {}
+        self._ops = 0
+
+    def retry_after(self, command: str, discord_user_id: int) -> float:
+        """Take a token. Returns 0 if allowed, else seconds until the next token."""
+        limit = self.limits.get(command)
+        if limit is None:
+            return 0.0
+        burst, per_seconds = limit
+        rate = burst / per_seconds
+        now = time.monotonic()
+
+        key = (command, discord_user_id)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(tokens=float(burst), updated=now)
+        else:
+            bucket.tokens = min(float(burst), bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+
+        self._ops += 1
+        if self._ops % 10_000 == 0:
+            self._sweep(now)
+
+        if bucket.tokens >= 1.0:
+            bucket.tokens -= 1.0
+            return 0.0
+        return (1.0 - bucket.tokens) / rate
+
+    def reserve(self, discord_user_id: int) -> bool:
+        """Take a slot in the user's lane. False if `max_pending` are already taken.
+
+        Synchronous, so two commands admitted in the same loop iteration
+        can't both see a free slot.
+        """
+        lane = self._lanes.get(discord_user_id)
+        if lane is None:
+            lane = self._lanes[discord_user_id] = _Lane(lock=asyncio.Lock())
+        elif lane.pending >= self.max_pending:
+            return False
+        lane.pending += 1
+        return True
+
+    def release(self, discord_user_id: int) -> None:
+        lane = self._lanes.get(discord_user_id)
+        if lane is None:
+            return
+        lane.pending -= 1
+        if lane.pending == 0:
+            del self._lanes[discord_user_id]
+
+    @asynccontextmanager
+    async def hold(self, discord_user_id: int) -> AsyncIterator[None]:
+        """Run the block in the user's lane, after their earlier actions.
+
+        The caller must hold a slot taken with `reserve`; releasing it is up
+        to whoever took it, once the whole command has finished.
+        """
+        async with self._lanes[discord_user_id].lock:
+            yield
+
+    def _sweep(self, now: float) -> None:
+        # Buckets that have refilled completely carry no state; drop them.
+        full = [
+            key
+            for key, b in self._buckets.items()
+            if key[0] not in self.limits or now - b.updated >= self.limits[key[0]][1]
+        ]
+        for key in full:
+            del self._buckets[key]
@@ -1,14 +1,31 @@
 from __future__ import annotations
 
+import asyncio
+import csv
+import hashlib
+import hmac
+import io
+import json
 import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import Any, AsyncIterator
 
-import aiosqlite
 from dotenv import load_dotenv
-from fastapi import FastAPI, Header, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
+from bot.db import Db, format_ts
+from bot.jobs import queue_stats
+from bot.live import LiveFeed, event_id, parse_event_id
+from bot import metrics
+from bot import retention as retention_mod
+from bot import stats as stats_mod
+from bot.storage import SqliteStorage
+
 
 load_dotenv()
 
@@ -18,18 +35,77 @@ if not PANEL_API_KEY:
 
 DB_PATH = Path(os.getenv("DATABASE_PATH", "./data/bot.sqlite")).resolve()
 
+# The panel reads and moderates one database. With per_guild the bot keeps each
+# guild in GUILD_DB_DIR/<id>.sqlite, and bans or adjustments made here would
+# silently miss them, so refuse to start instead.
+if os.getenv("GUILD_STORAGE", "shared").strip() == "per_guild":
+    raise RuntimeError("the panel supports only GUILD_STORAGE=shared; with per_guild every guild has its own database")
+
 # In most PaaS/containers the platform provides PORT.
 PORT = int(os.getenv("PORT", os.getenv("PANEL_PORT", "8000")))
 
 # For cloud/container use 0.0.0.0 so it's reachable from outside.
 HOST = os.getenv("PANEL_HOST", "0.0.0.0")
 
+# Read-only connections in the panel's pool (WAL lets them run alongside the bot's writer).
+DB_READERS = int(os.getenv("PANEL_DB_READERS", "4"))
+
+# Seconds between economy_logs -> rollup table folds (see bot/stats.py).
+ROLLUP_INTERVAL = float(os.getenv("PANEL_ROLLUP_SECONDS", "30"))
+
+# economy_logs retention: rows past the hot window are archived here.
+LOG_HOT_DAYS = int(os.getenv("LOG_HOT_DAYS", "90"))
+LOG_ARCHIVE_DIR = Path(os.getenv("LOG_ARCHIVE_DIR", "./data/archive")).resolve()
+
+# Seconds between polls of economy_logs/change_feed for /api/live.
+LIVE_POLL = float(os.getenv("PANEL_LIVE_POLL_SECONDS", "1"))
+
+# Comment sent on an idle /api/live stream so proxies keep it open.
+LIVE_HEARTBEAT = 15.0
+
+# Seconds a /api/live token can be used to open (or reopen) a stream.
+LIVE_TOKEN_TTL = 60
+
 STATIC_DIR = Path(__file__).parent / "static"
 
-app = FastAPI(title="Bot Admin Panel")
+db = Db(DB_PATH, readers=DB_READERS)
+# The bot writes only this SQLite file, so the panel reads and moderates it too.
+storage = SqliteStorage(db, LOG_ARCHIVE_DIR)
+rollups = stats_mod.RollupWorker(db, interval=ROLLUP_INTERVAL)
+retention = retention_mod.RetentionWorker(db, LOG_ARCHIVE_DIR, hot_days=LOG_HOT_DAYS)
+live = LiveFeed(db, interval=LIVE_POLL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    await storage.open()
+    await live.load()
+    rollups.start()
+    retention.start()
+    live.start()
+    try:
+        yield
+    finally:
+        await live.close()
+        await retention.close()
+        await rollups.close()
+        await storage.close()
+
+
+app = FastAPI(title="Bot Admin Panel", lifespan=lifespan)
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 
 
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Route template, not the raw path, to keep label cardinality bounded.
+    route = getattr(request.scope.get("route"), "path", "other")
+    metrics.PANEL_REQUEST_SECONDS.observe(time.perf_counter() - started, request.method, route, str(response.status_code))
+    return response
+
+
 def require_key(x_api_key: str | None) -> None:
     if x_api_key != PANEL_API_KEY:
         raise HTTPException(status_code=401, detail="invalid api key")
@@ -42,55 +118,300 @@ async def index():
 
 @app.get("/api/health")
 async def health():
-    return {"ok": True, "db": str(DB_PATH)}
+    return {"ok": True, "db": str(DB_PATH), "pool": db.stats(), "live_clients": len(live)}
 
 
-@app.get("/api/users")
-async def list_users(x_api_key: str | None = Header(default=None), limit: int = 50):
+@app.get("/api/metrics")
+async def prometheus_metrics():
+    """Panel request and SQLite timings in Prometheus text format (no key, like /api/health)."""
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/api/jobs/verify")
+async def verify_jobs(x_api_key: str | None = Header(default=None)):
+    """Remanga re-verification queue as seen in SQLite (the bot runs the jobs)."""
     require_key(x_api_key)
-    if limit < 1 or limit > 200:
+    async with db.read() as conn:
+        return await queue_stats(conn)
+
+
+@app.get("/api/leaderboard")
+async def leaderboard(
+    x_api_key: str | None = Header(default=None),
+    limit: int = 50,
+    offset: int = 0,
+    user_id: int | None = None,
+):
+    require_key(x_api_key)
+    if limit < 1 or limit > 200 or offset < 0:
+        raise HTTPException(status_code=400, detail="limit/offset out of range")
+    items = [{"rank": rank, "discord_user_id": uid, "balance": bal} for rank, uid, bal in await storage.top(limit, offset)]
+    out: dict[str, Any] = {"items": items, "total": await storage.holders()}
+    if user_id is not None:
+        mine = await storage.rank(user_id)
+        out["user"] = None if mine is None else {"rank": mine[0], "discord_user_id": user_id, "balance": mine[1]}
+    return out
+
+
+def stats_window(hours: int, until_ts: int | None) -> tuple[int, int]:
+    if hours < 1 or hours > 24 * 366:
+        raise HTTPException(status_code=400, detail="hours out of range")
+    until = int(time.time()) + 1 if until_ts is None else until_ts
+    return until - hours * 3600, until
+
+
+@app.get("/api/stats/summary")
+async def stats_summary(x_api_key: str | None = Header(default=None), hours: int = 24):
+    require_key(x_api_key)
+    since, _ = stats_window(hours, None)
+    async with db.read() as conn:
+        return await stats_mod.summary(conn, since)
+
+
+@app.get("/api/stats/series")
+async def stats_series(
+    x_api_key: str | None = Header(default=None),
+    bucket: str = "hour",
+    hours: int = 48,
+    until_ts: int | None = None,
+    action: str | None = None,
+):
+    require_key(x_api_key)
+    if bucket not in stats_mod.BUCKETS:
+        raise HTTPException(status_code=400, detail="bucket must be hour or day")
+    since, until = stats_window(hours, until_ts)
+    since -= since % stats_mod.BUCKETS[bucket][1]
+    async with db.read() as conn:
+        points = await stats_mod.series(conn, bucket, since, until, action)
+        supply = await stats_mod.supply_series(conn, bucket, since, until)
+    return {"bucket": bucket, "since_ts": since, "until_ts": until, "points": points, "supply": supply}
+
+
+@app.get("/api/logs")
+async def economy_logs(
+    x_api_key: str | None = Header(default=None),
+    user_id: int | None = None,
+    action: str | None = None,
+    since_ts: int | None = None,
+    until_ts: int | None = None,
+    before_id: int | None = None,
+    limit: int = 100,
+):
+    """Economy history for disputes; reads archived rows too."""
+    require_key(x_api_key)
+    if limit < 1 or limit > 1000:
         raise HTTPException(status_code=400, detail="limit out of range")
+    items = await storage.history(
+        discord_user_id=user_id,
+        action=action,
+        since_ts=since_ts,
+        until_ts=until_ts,
+        before_id=before_id,
+        limit=limit,
+    )
+    next_before = items[-1]["id"] if len(items) >= limit else None
+    return {"items": items, "next_before_id": next_before}
 
-    async with aiosqlite.connect(str(DB_PATH)) as conn:
-        cur = await conn.execute(
-            "SELECT u.discord_user_id, u.remanga_profile_url, b.balance FROM users u "
-            "LEFT JOIN balances b ON b.discord_user_id=u.discord_user_id "
-            "ORDER BY u.created_at DESC LIMIT ?",
-            (limit,),
-        )
-        rows = await cur.fetchall()
 
-    return {
-        "items": [
-            {"discord_user_id": int(r[0]), "remanga_profile_url": r[1], "balance": int(r[2] or 0)}
-            for r in rows
-        ]
-    }
+def sse(event: str, kind: str, payload: dict[str, Any]) -> str:
+    return f"id: {event}\nevent: {kind}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
 
 
-@app.post("/api/user/{user_id}/ban")
-async def ban_user(user_id: int, body: dict, x_api_key: str | None = Header(default=None)):
+def sign_live_token(expires: int) -> str:
+    sig = hmac.new(PANEL_API_KEY.encode(), f"live:{expires}".encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{sig}"
+
+
+def require_live_token(token: str | None) -> None:
+    try:
+        expires = int((token or "").split(".", 1)[0])
+    except ValueError:
+        raise HTTPException(status_code=401, detail="invalid stream token") from None
+    if expires < time.time() or not hmac.compare_digest(token or "", sign_live_token(expires)):
+        raise HTTPException(status_code=401, detail="invalid stream token")
+
+
+@app.post("/api/live/token")
+async def live_token(x_api_key: str | None = Header(default=None)):
+    """Short-lived token for /api/live, so the API key itself never goes in a URL."""
     require_key(x_api_key)
-    days = int(body.get("days", 7))
-    reason = body.get("reason")
+    expires = int(time.time()) + LIVE_TOKEN_TTL
+    return {"token": sign_live_token(expires), "expires_ts": expires}
+
+
+@app.get("/api/live")
+async def live_events(
+    request: Request,
+    x_api_key: str | None = Header(default=None),
+    last_event_id: str | None = Header(default=None),
+    token: str | None = None,
+    after: str | None = None,
+):
+    """Server-sent events: economy log rows, bans and balance changes as they commit.
+
+    EventSource can't set headers, so it authenticates with `?token=` from
+    /api/live/token (the key in a URL would end up in access logs). On
+    reconnect the browser sends Last-Event-ID and gets the missed events
+    first; a client that opens a new stream passes it as `?after=`. A `gap`
+    event means some were skipped and the view should reload.
+    """
+    if x_api_key is not None:
+        require_key(x_api_key)
+    else:
+        require_live_token(token)
+    after_mark = parse_event_id(last_event_id or after)
+    sub, mark = live.subscribe()
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            yield "retry: 3000\n\n"
+            if after_mark is None:
+                # Gives the browser a Last-Event-ID even if nothing happens before a reconnect.
+                yield sse(event_id(*mark), "hello", {})
+            else:
+                missed, complete = await live.replay(after_mark, mark)
+                if not complete:
+                    yield "event: gap\ndata: {}\n\n"
+                for event in missed:
+                    yield sse(*event)
+            while True:
+                if sub.dropped and sub.queue.empty():
+                    # Fell too far behind; the browser reconnects and resumes from its last id.
+                    return
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), LIVE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
+                    continue
+                yield sse(*event)
+        finally:
+            live.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+EXPORT_CHUNK = 1000
+
+
+def parse_cursor(cursor: str | None) -> tuple[int, int] | None:
+    """Cursor is "<created_ts>:<discord_user_id>" of the last row already seen."""
+    if not cursor:
+        return None
+    try:
+        ts, uid = cursor.split(":", 1)
+        return int(ts), int(uid)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bad cursor") from None
+
+
+def next_cursor(items: list[dict[str, Any]], limit: int) -> str | None:
+    if len(items) < limit:
+        return None
+    last = items[-1]
+    return f"{last['created_ts']}:{last['discord_user_id']}"
 
+
+@app.get("/api/users")
+async def list_users(
+    x_api_key: str | None = Header(default=None),
+    limit: int = 50,
+    cursor: str | None = None,
+    min_balance: int | None = None,
+    max_balance: int | None = None,
+    banned: bool = False,
+    has_remanga: bool = False,
+):
+    require_key(x_api_key)
+    if limit < 1 or limit > 200:
+        raise HTTPException(status_code=400, detail="limit out of range")
+    after = parse_cursor(cursor)
+
+    items = await storage.list_users(
+        after,
+        limit,
+        min_balance=min_balance,
+        max_balance=max_balance,
+        banned=banned,
+        has_remanga=has_remanga,
+    )
+    return {"items": items, "next_cursor": next_cursor(items, limit)}
+
+
+@app.get("/api/users/export")
+async def export_users(
+    x_api_key: str | None = Header(default=None),
+    format: str = "ndjson",
+    min_balance: int | None = None,
+    max_balance: int | None = None,
+    banned: bool = False,
+    has_remanga: bool = False,
+):
+    """Stream every matching user as NDJSON or CSV, walking the keyset in chunks."""
+    require_key(x_api_key)
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+
+    async def chunks() -> AsyncIterator[str]:
+        columns = ["discord_user_id", "remanga_profile_url", "balance", "created_ts"]
+        if format == "csv":
+            yield ",".join(columns) + "\n"
+        after: tuple[int, int] | None = None
+        while True:
+            items = await storage.list_users(
+                after,
+                EXPORT_CHUNK,
+                min_balance=min_balance,
+                max_balance=max_balance,
+                banned=banned,
+                has_remanga=has_remanga,
+            )
+            if not items:
+                return
+            if format == "csv":
+                buf = io.StringIO()
+                writer = csv.DictWriter(buf, fieldnames=columns, lineterminator="\n")
+                writer.writerows(items)
+                yield buf.getvalue()
+            else:
+                yield "".join(json.dumps(item) + "\n" for item in items)
+            if len(items) < EXPORT_CHUNK:
+                return
+            after = (items[-1]["created_ts"], items[-1]["discord_user_id"])
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        chunks(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'},
+    )
+
+
+def ban_until_from_days(value: Any) -> str | None:
+    try:
+        days = int(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="days must be an integer") from None
     if days < 0 or days > 3650:
         raise HTTPException(status_code=400, detail="days out of range")
+    if days == 0:
+        return None
+    return format_ts(datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=days))
 
-    banned_until = None
-    if days > 0:
-        async with aiosqlite.connect(":memory:") as tmp:
-            cur = await tmp.execute("SELECT datetime('now', ?)", (f"+{days} days",))
-            row = await cur.fetchone()
-            banned_until = row[0]
-
-    async with aiosqlite.connect(str(DB_PATH)) as conn:
-        await conn.execute(
-            "INSERT INTO game_bans(discord_user_id, banned_until, reason) VALUES (?, ?, ?) "
-            "ON CONFLICT(discord_user_id) DO UPDATE SET banned_until=excluded.banned_until, reason=excluded.reason, updated_at=datetime('now')",
-            (user_id, banned_until, reason),
-        )
-        await conn.commit()
+
+@app.post("/api/user/{user_id}/ban")
+async def ban_user(user_id: int, body: dict, x_api_key: str | None = Header(default=None)):
+    require_key(x_api_key)
+    reason = body.get("reason")
+    banned_until = ban_until_from_days(body.get("days", 7))
+
+    # Also appends to change_feed, so the bot drops its cached ban.
+    await storage.set_game_bans([user_id], banned_until=banned_until, reason=reason)
 
     return {"ok": True, "discord_user_id": user_id, "banned_until": banned_until, "reason": reason}
 
@@ -98,16 +419,115 @@ async def ban_user(user_id: int, body: dict, x_api_key: str | None = Header(defa
 @app.post("/api/user/{user_id}/unban")
 async def unban_user(user_id: int, x_api_key: str | None = Header(default=None)):
     require_key(x_api_key)
-    async with aiosqlite.connect(str(DB_PATH)) as conn:
-        await conn.execute(
-            "INSERT INTO game_bans(discord_user_id, banned_until, reason) VALUES (?, NULL, NULL) "
-            "ON CONFLICT(discord_user_id) DO UPDATE SET banned_until=NULL, reason=NULL, updated_at=datetime('now')",
-            (user_id,),
-        )
-        await conn.commit()
+    await storage.set_game_bans([user_id], banned_until=None, reason=None)
     return {"ok": True}
 
 
+@app.get("/api/user/{user_id}/cards")
+async def user_cards(user_id: int, x_api_key: str | None = Header(default=None), limit: int = 100):
+    require_key(x_api_key)
+    if limit < 1 or limit > 1000:
+        raise HTTPException(status_code=400, detail="limit out of range")
+    return {"items": await storage.list_cards(user_id, limit)}
+
+
+MAX_BULK = 10_000
+
+
+async def read_bulk(request: Request) -> tuple[list[tuple[int, int | None]], dict[str, Any]]:
+    """Parse a bulk request into ([(user_id, delta or None)], options).
+
+    Either JSON {"user_ids": [...]} / {"adjustments": [{"discord_user_id", "delta"}]}
+    plus options, or a `text/csv` body of "user_id[,delta]" lines with the
+    options in the query string.
+    """
+    rows: list[tuple[int, int | None]] = []
+    try:
+        if request.headers.get("content-type", "").startswith("text/csv"):
+            options: dict[str, Any] = dict(request.query_params)
+            text = (await request.body()).decode("utf-8-sig")
+            for rec in csv.reader(io.StringIO(text)):
+                if not rec or not rec[0].strip() or not rec[0].strip().isdigit():
+                    continue  # blank line or header
+                delta = int(rec[1]) if len(rec) > 1 and rec[1].strip() else None
+                rows.append((int(rec[0]), delta))
+        else:
+            options = await request.json()
+            rows += [(int(uid), None) for uid in options.get("user_ids", [])]
+            rows += [(int(a["discord_user_id"]), int(a["delta"])) for a in options.get("adjustments", [])]
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="bad bulk payload") from None
+
+    if not rows:
+        raise HTTPException(status_code=400, detail="no users given")
+    if len(rows) > MAX_BULK:
+        raise HTTPException(status_code=400, detail=f"at most {MAX_BULK} users per batch")
+    return rows, options
+
+
+@app.post("/api/users/bulk/ban")
+async def bulk_ban(request: Request, x_api_key: str | None = Header(default=None)):
+    require_key(x_api_key)
+    rows, options = await read_bulk(request)
+    banned_until = ban_until_from_days(options.get("days", 7))
+    reason = options.get("reason")
+    ids = list(dict.fromkeys(uid for uid, _ in rows))
+
+    audit_id = await storage.set_game_bans(
+        ids,
+        banned_until=banned_until,
+        reason=reason,
+        audit=("mod_ban", {"source": "panel", "user_ids": ids, "banned_until": banned_until, "reason": reason}),
+    )
+
+    return {
+        "ok": True,
+        "audit_log_id": audit_id,
+        "results": [{"discord_user_id": uid, "ok": True, "banned_until": banned_until} for uid in ids],
+    }
+
+
+@app.post("/api/users/bulk/unban")
+async def bulk_unban(request: Request, x_api_key: str | None = Header(default=None)):
+    require_key(x_api_key)
+    rows, _ = await read_bulk(request)
+    ids = list(dict.fromkeys(uid for uid, _ in rows))
+
+    audit_id = await storage.set_game_bans(
+        ids,
+        banned_until=None,
+        reason=None,
+        audit=("mod_unban", {"source": "panel", "user_ids": ids}),
+    )
+
+    return {"ok": True, "audit_log_id": audit_id, "results": [{"discord_user_id": uid, "ok": True} for uid in ids]}
+
+
+@app.post("/api/users/bulk/adjust")
+async def bulk_adjust(request: Request, x_api_key: str | None = Header(default=None)):
+    """Change balances; rows without their own delta use the "delta" option."""
+    require_key(x_api_key)
+    rows, options = await read_bulk(request)
+    default_delta = options.get("delta")
+    try:
+        adjustments = [(uid, delta if delta is not None else int(default_delta)) for uid, delta in rows]
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="delta is required") from None
+
+    balances, audit_id = await storage.adjust_balances(
+        adjustments,
+        audit=("mod_adjust", {"source": "panel", "reason": options.get("reason")}),
+    )
+
+    results = [
+        {"discord_user_id": uid, "ok": True, "delta": delta, "balance": bal}
+        if bal is not None
+        else {"discord_user_id": uid, "ok": False, "delta": delta, "error": "insufficient balance"}
+        for (uid, delta), bal in zip(adjustments, balances)
+    ]
+    return {"ok": True, "audit_log_id": audit_id, "results": results}
+
+
 def main() -> None:
     import uvicorn
 
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any
+
+import aiosqlite
+
+from bot import db as dbmod
+
+
+log = logging.getLogger(__name__)
+
+# bucket name -> (rollup table, bucket width in seconds)
+BUCKETS: dict[str, tuple[str, int]] = {
+    "hour": ("economy_rollup_hourly", 3600),
+    "day": ("economy_rollup_daily", 86400),
+}
+
+
+async def rollup(conn: aiosqlite.Connection, *, max_rows: int = 50_000) -> int:
+    """Fold economy_logs rows past the high-water mark into the rollup tables.
+
+    Call inside `Db.write()`: the fold and the new mark commit together, so a
+    row is never counted twice. At most `max_rows` ids are folded per call to
+    keep the write lock short. Returns how many ids are still waiting.
+
+    Per (bucket, action): n rows, total = SUM(amount) (net coins created),
+    volume = SUM(|amount|) (coins moved), wins = rows with amount > 0.
+    """
+    rows = await conn.execute_fetchall("SELECT last_id FROM rollup_state WHERE name = 'economy'")
+    last_id = int(rows[0][0]) if rows else 0
+    rows = await conn.execute_fetchall("SELECT COALESCE(MAX(id), 0) FROM economy_logs")
+    max_id = int(rows[0][0])
+    upto = min(max_id, last_id + max_rows)
+    if upto <= last_id:
+        return 0
+
+    for table, width in BUCKETS.values():
+        await conn.execute(
+            f"INSERT INTO {table}(bucket_ts, action, n, total, volume, wins) "
+            f"SELECT ts - ts % {width}, action, COUNT(*), SUM(amount), SUM(ABS(amount)), SUM(amount > 0) "
+            "FROM ("
+            "  SELECT COALESCE(created_ts, CAST(strftime('%s', created_at) AS INTEGER)) AS ts, action, COALESCE(amount, 0) AS amount"
+            "  FROM economy_logs WHERE id > ? AND id <= ?"
+            ") WHERE true GROUP BY 1, 2 "
+            "ON CONFLICT(bucket_ts, action) DO UPDATE SET "
+            "n = n + excluded.n, total = total + excluded.total, volume = volume + excluded.volume, wins = wins + excluded.wins",
+            (last_id, upto),
+        )
+    await conn.execute(
+        "INSERT INTO rollup_state(name, last_id) VALUES ('economy', ?) "
+        "ON CONFLICT(name) DO UPDATE SET last_id = excluded.last_id",
+        (upto,),
+    )
+    return max_id - upto
+
+
+async def rolled_up_id(conn: aiosqlite.Connection) -> int:
+    """Last economy_logs.id included in the rollups."""
+    rows = await conn.execute_fetchall("SELECT last_id FROM rollup_state WHERE name = 'economy'")
+    return int(rows[0][0]) if rows else 0
+
+
+def _edge(total: int, volume: int) -> float | None:
+    # House edge of a game: what the players lost, as a share of what they staked.
+    return round(-total / volume, 4) if volume else None
+
+
+async def series(conn: aiosqlite.Connection, bucket: str, since_ts: int, until_ts: int, action: str | None = None) -> list[dict[str, Any]]:
+    table, _ = BUCKETS[bucket]
+    sql = f"SELECT bucket_ts, action, n, total, volume, wins FROM {table} WHERE bucket_ts >= ? AND bucket_ts < ?"
+    params: list[Any] = [since_ts, until_ts]
+    if action is not None:
+        sql += " AND action = ?"
+        params.append(action)
+    rows = await conn.execute_fetchall(sql + " ORDER BY bucket_ts, action", params)
+    out: list[dict[str, Any]] = []
+    for bucket_ts, act, n, total, volume, wins in rows:
+        point: dict[str, Any] = {
+            "bucket_ts": int(bucket_ts),
+            "action": act,
+            "n": int(n),
+            "total": int(total),
+            "volume": int(volume),
+            "wins": int(wins),
+        }
+        if act == "coinflip":
+            point["edge"] = _edge(int(total), int(volume))
+        out.append(point)
+    return out
+
+
+async def supply_series(conn: aiosqlite.Connection, bucket: str, since_ts: int, until_ts: int) -> list[dict[str, int]]:
+    """Coins held by all users at the end of each bucket.
+
+    Anchored on the current SUM(balance) and walked back through the rollups,
+    so balances that predate the logs are accounted for.
+    """
+    table, _ = BUCKETS[bucket]
+    rows = await conn.execute_fetchall("SELECT COALESCE(SUM(balance), 0) FROM balances")
+    current = int(rows[0][0])
+    rows = await conn.execute_fetchall(
+        "SELECT COALESCE(SUM(amount), 0) FROM economy_logs WHERE id > ?",
+        (await rolled_up_id(conn),),
+    )
+    running = current - int(rows[0][0])
+
+    rows = await conn.execute_fetchall(
+        f"SELECT bucket_ts, SUM(total) FROM {table} WHERE bucket_ts >= ? GROUP BY bucket_ts ORDER BY bucket_ts DESC",
+        (since_ts,),
+    )
+    out: list[dict[str, int]] = []
+    for bucket_ts, net in rows:
+        if bucket_ts < until_ts:
+            out.append({"bucket_ts": int(bucket_ts), "supply": running})
+        running -= int(net)
+    out.reverse()
+    return out
+
+
+async def summary(conn: aiosqlite.Connection, since_ts: int) -> dict[str, Any]:
+    rows = await conn.execute_fetchall(
+        "SELECT action, SUM(n), SUM(total), SUM(volume), SUM(wins) FROM economy_rollup_hourly "
+        "WHERE bucket_ts >= ? GROUP BY action ORDER BY action",
+        (since_ts - since_ts % 3600,),
+    )
+    actions = {
+        act: {"n": int(n), "total": int(total), "volume": int(volume), "wins": int(wins)}
+        for act, n, total, volume, wins in rows
+    }
+    flips = actions.get("coinflip")
+    rows = await conn.execute_fetchall("SELECT COALESCE(SUM(balance), 0), COUNT(*) FROM balances")
+    return {
+        "since_ts": since_ts,
+        "actions": actions,
+        "coinflip_edge": _edge(flips["total"], flips["volume"]) if flips else None,
+        "supply": int(rows[0][0]),
+        "holders": int(rows[0][1]),
+        "rolled_up_id": await rolled_up_id(conn),
+    }
+
+
+class RollupWorker:
+    """Keeps the rollups current by calling `rollup` every `interval` seconds.
+
+    A backlog (first run, downtime) is worked off in `max_rows` chunks, one
+    short write transaction each.
+    """
+
+    def __init__(self, db: dbmod.Db, *, interval: float = 30.0, max_rows: int = 50_000):
+        self.db = db
+        self.interval = interval
+        self.max_rows = max_rows
+
+        self._task: asyncio.Task[None] | None = None
+
+    async def run_once(self) -> int:
+        async with self.db.write() as conn:
+            return await rollup(conn, max_rows=self.max_rows)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name="economy-rollups")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self) -> None:
+        while True:
+            try:
+                started = time.perf_counter()
+                backlog = await self.run_once()
+                if backlog:
+                    log.info("economy rollups: %d ids behind (%.0f ms/chunk)", backlog, (time.perf_counter() - started) * 1000)
+                    await asyncio.sleep(0)
+                    continue
+            except Exception:
+                log.exception("economy rollup failed")
+            await asyncio.sleep(self.interval)
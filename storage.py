@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import json
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Sequence
+
+from bot import db as dbmod
+from bot import retention as retention_mod
+from bot.leaderboard import Leaderboard
+
+
+LOG_COLUMNS = retention_mod.LOG_COLUMNS
+
+# (action, meta) of the economy_logs audit row written with a moderation batch.
+Audit = tuple[str, dict[str, Any]]
+
+
+class Storage(ABC):
+    """Users, balances, bans, cards and economy logs, whatever holds them.
+
+    Moderation batches take an optional `audit` entry that is written in the
+    same transaction as the change, so a batch and its log row can't diverge.
+    """
+
+    name: str
+
+    @abstractmethod
+    async def open(self) -> None: ...
+
+    @abstractmethod
+    async def close(self) -> None: ...
+
+    # users
+
+    @abstractmethod
+    async def list_users(
+        self,
+        after: tuple[int, int] | None,
+        limit: int,
+        *,
+        min_balance: int | None = None,
+        max_balance: int | None = None,
+        banned: bool = False,
+        has_remanga: bool = False,
+    ) -> list[dict[str, Any]]:
+        """One keyset page of users, newest first, ordered by (created_ts, id)."""
+
+    # balances
+
+    @abstractmethod
+    async def adjust_balances(self, adjustments: Sequence[tuple[int, int]], *, audit: Audit | None = None) -> tuple[list[int | None], int | None]:
+        """`db.adjust_balances` semantics. Returns (balance per adjustment, audit log id).
+
+        Each applied change gets its own log row with the audit action. The
+        audit row lists them under "adjustments" and their sum under "total".
+        """
+
+    @abstractmethod
+    async def top(self, limit: int, offset: int = 0) -> list[tuple[int, int, int]]:
+        """[(rank, discord_user_id, balance)], richest first, ranks starting at 1."""
+
+    @abstractmethod
+    async def rank(self, discord_user_id: int) -> tuple[int, int] | None:
+        """(rank, balance), or None without a balance row."""
+
+    @abstractmethod
+    async def holders(self) -> int:
+        """Number of balance rows."""
+
+    # bans
+
+    @abstractmethod
+    async def set_game_bans(
+        self,
+        discord_user_ids: Sequence[int],
+        banned_until: str | None,
+        reason: str | None,
+        *,
+        audit: Audit | None = None,
+    ) -> int | None:
+        """Ban (or with banned_until=None, unban) every id. Returns the audit log id."""
+
+    # cards
+
+    @abstractmethod
+    async def list_cards(self, discord_user_id: int, limit: int = 100) -> list[dict[str, Any]]:
+        """The user's cards, oldest first."""
+
+    # logs
+
+    @abstractmethod
+    async def history(
+        self,
+        *,
+        discord_user_id: int | None = None,
+        action: str | None = None,
+        since_ts: int | None = None,
+        until_ts: int | None = None,
+        before_id: int | None = None,
+        limit: int = 100,
+    ) -> list[dict[str, Any]]:
+        """economy_logs rows matching the filters, newest first (see `retention.history`)."""
+
+
+def _card(row: Sequence[Any]) -> dict[str, Any]:
+    card_id, name, source, external_id, verified, escrow_match_id = row
+    return {
+        "id": int(card_id),
+        "name": name,
+        "external_source": source,
+        "external_id": external_id,
+        "verified": bool(verified),
+        "escrow_match_id": escrow_match_id,
+    }
+
+
+def _user(row: Sequence[Any]) -> dict[str, Any]:
+    return {
+        "discord_user_id": int(row[0]),
+        "remanga_profile_url": row[1],
+        "balance": int(row[2] or 0),
+        "created_ts": int(row[3] or 0),
+    }
+
+
+class SqliteStorage(Storage):
+    """The bot's SQLite file, through `Db`'s reader pool and single writer.
+
+    Leaderboard queries go through an in-memory `Leaderboard` that follows
+    the log ids; history includes the gzip archive.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, db: dbmod.Db, archive_dir: Path):
+        self.db = db
+        self.archive_dir = archive_dir
+        self.board = Leaderboard(db)
+
+    async def open(self) -> None:
+        # Migrations are version-gated, so this is a no-op once the bot has run them.
+        await self.db.init()
+        await self.db.open()
+        await self.board.load()
+
+    async def close(self) -> None:
+        await self.db.close()
+
+    async def list_users(
+        self,
+        after: tuple[int, int] | None,
+        limit: int,
+        *,
+        min_balance: int | None = None,
+        max_balance: int | None = None,
+        banned: bool = False,
+        has_remanga: bool = False,
+    ) -> list[dict[str, Any]]:
+        # Page cost by filter (EXPLAIN QUERY PLAN):
+        # - none / has_remanga: walks idx_users_created_ts (or its partial
+        #   remanga twin) in page order and stops after `limit` rows.
+        # - banned: same walk, probing game_bans per user, so it reads more
+        #   rows the rarer active bans are.
+        # - min/max_balance: reads every matching balance through
+        #   idx_balances_balance and sorts them (temp b-tree), so it costs
+        #   more the more users match.
+        # The balance and ban filters live in other tables than the sort
+        # key, so no single index serves them in page order.
+        where: list[str] = []
+        params: list[Any] = []
+        if after is not None:
+            where.append("(u.created_ts, u.discord_user_id) < (?, ?)")
+            params += after
+        if min_balance is not None:
+            where.append("b.balance >= ?")
+            params.append(min_balance)
+        if max_balance is not None:
+            where.append("b.balance <= ?")
+            params.append(max_balance)
+        if banned:
+            where.append(
+                "EXISTS (SELECT 1 FROM game_bans g WHERE g.discord_user_id=u.discord_user_id AND g.banned_until_ts > ?)"
+            )
+            params.append(int(time.time()))
+        if has_remanga:
+            where.append("u.remanga_profile_url IS NOT NULL")
+
+        sql = (
+            "SELECT u.discord_user_id, u.remanga_profile_url, b.balance, u.created_ts FROM users u "
+            "LEFT JOIN balances b ON b.discord_user_id=u.discord_user_id "
+            + ("WHERE " + " AND ".join(where) + " " if where else "")
+            + "ORDER BY u.created_ts DESC, u.discord_user_id DESC LIMIT ?"
+        )
+        async with self.db.read() as conn:
+            rows = await conn.execute_fetchall(sql, (*params, limit))
+        return [_user(r) for r in rows]
+
+    async def adjust_balances(self, adjustments: Sequence[tuple[int, int]], *, audit: Audit | None = None) -> tuple[list[int | None], int | None]:
+        audit_id = None
+        action, meta = audit if audit is not None else ("mod_adjust", {})
+        async with self.db.write() as conn:
+            balances = await dbmod.adjust_balances(conn, adjustments, action=action, meta_json=json.dumps(meta) if meta else None)
+            if audit is not None:
+                applied = [(uid, delta) for (uid, delta), bal in zip(adjustments, balances) if bal is not None]
+                audit_id = await dbmod.log_audit(conn, action, None, {**meta, "total": sum(d for _, d in applied), "adjustments": applied})
+        for (uid, _), bal in zip(adjustments, balances):
+            if bal is not None:
+                self.board.invalidate(uid)
+        return balances, audit_id
+
+    async def top(self, limit: int, offset: int = 0) -> list[tuple[int, int, int]]:
+        # The bot owns most balance writes; pick them up from the log ids.
+        await self.board.catch_up()
+        return await self.board.top(limit, offset)
+
+    async def rank(self, discord_user_id: int) -> tuple[int, int] | None:
+        await self.board.catch_up()
+        return await self.board.rank(discord_user_id)
+
+    async def holders(self) -> int:
+        return len(self.board)
+
+    async def set_game_bans(
+        self,
+        discord_user_ids: Sequence[int],
+        banned_until: str | None,
+        reason: str | None,
+        *,
+        audit: Audit | None = None,
+    ) -> int | None:
+        async with self.db.write() as conn:
+            # Also appends to change_feed, so the bot drops its cached bans.
+            await dbmod.set_game_bans(conn, discord_user_ids, banned_until=banned_until, reason=reason)
+            if audit is None:
+                return None
+            action, meta = audit
+            return await dbmod.log_audit(conn, action, None, meta)
+
+    async def list_cards(self, discord_user_id: int, limit: int = 100) -> list[dict[str, Any]]:
+        async with self.db.read() as conn:
+            rows = await conn.execute_fetchall(
+                "SELECT id, name, external_source, external_id, verified, escrow_match_id FROM cards "
+                "WHERE owner_discord_user_id = ? ORDER BY id LIMIT ?",
+                (discord_user_id, limit),
+            )
+        return [_card(r) for r in rows]
+
+    async def history(
+        self,
+        *,
+        discord_user_id: int | None = None,
+        action: str | None = None,
+        since_ts: int | None = None,
+        until_ts: int | None = None,
+        before_id: int | None = None,
+        limit: int = 100,
+    ) -> list[dict[str, Any]]:
+        return await retention_mod.history(
+            self.db,
+            self.archive_dir,
+            discord_user_id=discord_user_id,
+            action=action,
+            since_ts=since_ts,
+            until_ts=until_ts,
+            before_id=before_id,
+            limit=limit,
+        )
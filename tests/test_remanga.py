@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import asyncio
+import time
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from bot.remanga import Card, RemangaError, RemangaProvider
+
+
+def profile(user_id: int) -> str:
+    return f"https://remanga.org/user/{user_id}/about"
+
+
+class StubRemanga:
+    """Inventory endpoint that serves ETag / Last-Modified and records every request."""
+
+    def __init__(self) -> None:
+        self.requests: list[tuple[str, dict[str, str], float]] = []
+        self.status: dict[str, int] = {}
+        self.delay = 0.0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        self.app = web.Application()
+        self.app.router.add_get("/api/inventory/{user_id}/cards/", self.cards)
+
+    async def cards(self, request: web.Request) -> web.StreamResponse:
+        user_id = request.match_info["user_id"]
+        self.requests.append((user_id, dict(request.headers), time.monotonic()))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+
+        status = self.status.get(user_id, 200)
+        if status != 200:
+            return web.Response(status=status)
+        etag = f'"v-{user_id}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304)
+        payload = {"content": [{"card": {"id": int(user_id) * 10, "name": f"card {user_id}"}}]}
+        return web.json_response(payload, headers={"ETag": etag, "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"})
+
+
+class RemangaProviderTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.stub = StubRemanga()
+        self.server = TestServer(self.stub.app)
+        await self.server.start_server()
+        self.providers: list[RemangaProvider] = []
+
+    async def asyncTearDown(self) -> None:
+        for provider in self.providers:
+            await provider.close()
+        await self.server.close()
+
+    def provider(self, **kwargs) -> RemangaProvider:
+        kwargs.setdefault("rate_per_host", 0)
+        provider = RemangaProvider(user_agent="test", base_url=str(self.server.make_url("/")), **kwargs)
+        self.providers.append(provider)
+        return provider
+
+    async def test_parses_cards(self) -> None:
+        cards = await self.provider().fetch_cards(profile(7))
+        self.assertEqual(list(cards), [Card("remanga", "70", "card 7")])
+
+    async def test_cached_within_ttl(self) -> None:
+        provider = self.provider(cache_ttl=60)
+        first = await provider.fetch_cards(profile(7))
+        second = await provider.fetch_cards(profile(7))
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.stub.requests), 1)
+
+    async def test_revalidates_with_etag_after_ttl(self) -> None:
+        provider = self.provider(cache_ttl=0)
+        first = await provider.fetch_cards(profile(7))
+        second = await provider.fetch_cards(profile(7))
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.stub.requests), 2)
+        _, headers, _ = self.stub.requests[1]
+        self.assertEqual(headers.get("If-None-Match"), '"v-7"')
+        self.assertEqual(headers.get("If-Modified-Since"), "Wed, 01 Jan 2025 00:00:00 GMT")
+
+    async def test_cache_size_evicts_oldest(self) -> None:
+        provider = self.provider(cache_ttl=60, cache_size=1)
+        await provider.fetch_cards(profile(1))
+        await provider.fetch_cards(profile(2))
+        await provider.fetch_cards(profile(1))
+        self.assertEqual([r[0] for r in self.stub.requests], ["1", "2", "1"])
+        # An evicted profile is fetched unconditionally.
+        self.assertNotIn("If-None-Match", self.stub.requests[2][1])
+
+    async def test_missing_profile_has_no_cards(self) -> None:
+        self.stub.status["7"] = 404
+        self.assertEqual(tuple(await self.provider().fetch_cards(profile(7))), ())
+
+    async def test_server_error_raises(self) -> None:
+        self.stub.status["7"] = 500
+        with self.assertRaises(RemangaError):
+            await self.provider().fetch_cards(profile(7))
+
+    async def test_rejects_foreign_url(self) -> None:
+        with self.assertRaises(RemangaError):
+            await self.provider().fetch_cards("https://example.com/user/7")
+        self.assertEqual(self.stub.requests, [])
+
+    async def test_rate_per_host(self) -> None:
+        provider = self.provider(rate_per_host=20)
+        await asyncio.gather(*(provider.fetch_cards(profile(uid)) for uid in range(1, 6)))
+        times = sorted(t for _, _, t in self.stub.requests)
+        # Five requests at most 20/s: the last one starts >= 4 intervals after the first.
+        self.assertGreaterEqual(times[-1] - times[0], 4 * 0.05 - 0.01)
+
+    async def test_concurrency_limit(self) -> None:
+        self.stub.delay = 0.05
+        provider = self.provider(concurrency=2)
+        await asyncio.gather(*(provider.fetch_cards(profile(uid)) for uid in range(1, 7)))
+        self.assertEqual(len(self.stub.requests), 6)
+        self.assertEqual(self.stub.max_in_flight, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
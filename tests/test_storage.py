@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import json
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from bot.db import Db, format_ts
+from bot.storage import SqliteStorage, Storage
+
+
+class SqliteStorageTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = Db(Path(self.tmp.name) / "bot.sqlite", readers=2)
+        self.storage = SqliteStorage(self.db, Path(self.tmp.name) / "archive")
+        await self.storage.open()
+
+    async def asyncTearDown(self) -> None:
+        await self.storage.close()
+        self.tmp.cleanup()
+
+    async def add_card(self, discord_user_id: int, name: str) -> None:
+        async with self.db.write() as conn:
+            await conn.execute("INSERT INTO cards(owner_discord_user_id, name) VALUES (?, ?)", (discord_user_id, name))
+
+    async def test_adjust_logs_each_change_and_the_audit(self) -> None:
+        balances, audit_id = await self.storage.adjust_balances(
+            [(1, 50), (2, 30), (1, -20), (2, -100)],
+            audit=("mod_adjust_many", {"moderator": 9}),
+        )
+        self.assertEqual(balances, [50, 30, 30, None])
+        self.assertIsNotNone(audit_id)
+
+        logs = await self.storage.history(action="mod_adjust_many")
+        per_user = sorted((r["discord_user_id"], r["amount"]) for r in logs if r["discord_user_id"] is not None)
+        self.assertEqual(per_user, [(1, -20), (1, 50), (2, 30)])
+        (audit,) = [r for r in logs if r["id"] == audit_id]
+        self.assertIsNone(audit["amount"])
+        meta = json.loads(audit["meta_json"])
+        self.assertEqual(meta["total"], 60)
+        self.assertEqual(meta["moderator"], 9)
+
+    async def test_leaderboard(self) -> None:
+        await self.storage.adjust_balances([(1, 10), (2, 30), (3, 20)])
+        self.assertEqual(await self.storage.top(2), [(1, 2, 30), (2, 3, 20)])
+        self.assertEqual(await self.storage.top(2, 2), [(3, 1, 10)])
+        self.assertEqual(await self.storage.rank(3), (2, 20))
+        self.assertIsNone(await self.storage.rank(99))
+        self.assertEqual(await self.storage.holders(), 3)
+
+    async def test_bans_filter_users(self) -> None:
+        await self.storage.adjust_balances([(1, 5), (2, 500), (3, 50)])
+        until = format_ts(datetime.now(timezone.utc) + timedelta(hours=1))
+        audit_id = await self.storage.set_game_bans([2, 3], until, "spam", audit=("mod_ban", {"ids": [2, 3]}))
+        self.assertIsNotNone(audit_id)
+        await self.storage.set_game_bans([3], None, None)
+
+        banned = await self.storage.list_users(None, 10, banned=True)
+        self.assertEqual([u["discord_user_id"] for u in banned], [2])
+        rich = await self.storage.list_users(None, 10, min_balance=10, max_balance=100)
+        self.assertEqual([u["discord_user_id"] for u in rich], [3])
+        self.assertEqual(rich[0]["balance"], 50)
+
+    async def test_list_users_pages(self) -> None:
+        await self.storage.adjust_balances([(uid, 1) for uid in range(1, 6)])
+        seen: list[int] = []
+        after = None
+        while True:
+            page = await self.storage.list_users(after, 2)
+            if not page:
+                break
+            seen += [u["discord_user_id"] for u in page]
+            after = (page[-1]["created_ts"], page[-1]["discord_user_id"])
+        self.assertEqual(sorted(seen), [1, 2, 3, 4, 5])
+        self.assertEqual(len(seen), 5)
+
+    async def test_history_pages_newest_first(self) -> None:
+        for uid in (1, 2, 1, 1):
+            await self.storage.adjust_balances([(uid, 1)])
+        first = await self.storage.history(discord_user_id=1, limit=2)
+        rest = await self.storage.history(discord_user_id=1, before_id=first[-1]["id"], limit=2)
+        ids = [r["id"] for r in first + rest]
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(ids, sorted(ids, reverse=True))
+
+    async def test_list_cards(self) -> None:
+        await self.storage.adjust_balances([(1, 1)])
+        await self.add_card(1, "b")
+        await self.add_card(1, "a")
+        cards = await self.storage.list_cards(1)
+        self.assertEqual([c["name"] for c in cards], ["b", "a"])
+        self.assertEqual(await self.storage.list_cards(2), [])
+
+
+class StorageInterfaceTest(unittest.TestCase):
+    def test_partial_backend_cannot_be_created(self) -> None:
+        class Partial(Storage):
+            async def open(self) -> None:
+                pass
+
+        with self.assertRaises(TypeError):
+            Partial()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+from typing import Callable, Hashable
+
+
+log = logging.getLogger(__name__)
+
+
+class _Timer:
+    __slots__ = ("rounds", "callback")
+
+    def __init__(self, rounds: int, callback: Callable[[], None]):
+        self.rounds = rounds
+        self.callback = callback
+
+
+class TimerWheel:
+    """Hashed timing wheel: many timeouts, one task.
+
+    Timers land in one of `slots` buckets, `tick` seconds apart; a timer
+    further out than one revolution waits `rounds` laps. Scheduling and
+    cancelling are O(1) dict operations, and each tick only looks at one
+    bucket. Precision is one tick, which is plenty for minute-scale
+    timeouts. Callbacks are plain functions run on the wheel's task; start a
+    task from them for async work.
+    """
+
+    def __init__(self, *, tick: float = 1.0, slots: int = 512):
+        self.tick = tick
+        self._slots: list[dict[Hashable, _Timer]] = [{} for _ in range(slots)]
+        self._where: dict[Hashable, int] = {}
+        self._cursor = 0
+        self._task: asyncio.Task[None] | None = None
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def schedule(self, key: Hashable, delay: float, callback: Callable[[], None]) -> None:
+        """Call `callback` in about `delay` seconds; replaces an existing timer for `key`."""
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        n = len(self._slots)
+        slot = (self._cursor + ticks) % n
+        self._slots[slot][key] = _Timer((ticks - 1) // n, callback)
+        self._where[key] = slot
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name="timer-wheel")
+
+    def cancel(self, key: Hashable) -> bool:
+        slot = self._where.pop(key, None)
+        if slot is None:
+            return False
+        del self._slots[slot][key]
+        return True
+
+    def _advance(self) -> None:
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        bucket = self._slots[self._cursor]
+        due: list[_Timer] = []
+        for key, timer in list(bucket.items()):
+            if timer.rounds:
+                timer.rounds -= 1
+                continue
+            del bucket[key]
+            del self._where[key]
+            due.append(timer)
+        for timer in due:
+            try:
+                timer.callback()
+            except Exception:
+                log.exception("timer callback failed")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_at = loop.time()
+        while True:
+            next_at += self.tick
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+            self._advance()